@@ -1,15 +1,114 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+import threading
+import time
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config.database import AsyncReadSessionLocal, get_read_db, get_async_read_db
+from app.controllers import DriverController
 
 # Configurações
 SECRET_KEY = "sua-chave-secreta-muito-segura-aqui-mude-em-producao"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Cache dos tokens já verificados (evita decodificar/validar o JWT a cada request)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+# Por quanto tempo um driver desativado ainda pode usar um token já emitido
+IDENTIDADE_CACHE_TTL = float(os.getenv("IDENTIDADE_CACHE_TTL", "30"))
+
+# Operadores da frota (importação em lote, despacho): emails separados por vírgula
+ADMIN_EMAILS = frozenset(
+    email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()
+)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+oauth2_scheme_opcional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Driver autenticado, derivado das claims do token e da identidade em cache"""
+    id: int
+    email: str
+
+    @property
+    def admin(self) -> bool:
+        return self.email.lower() in ADMIN_EMAILS
+
+
+class _CacheClaims:
+    """Cache LRU com TTL de claims verificadas, indexado pela assinatura do token"""
+
+    def __init__(self, tamanho: int, ttl: float):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, token: str) -> dict | None:
+        chave = token.rpartition(".")[2]
+        agora = time.time()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            token_cacheado, claims, expira_em = item
+            # Mesma assinatura com outro token não deve acontecer, mas conferir não custa
+            if token_cacheado != token or expira_em <= agora:
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return claims
+
+    def adicionar(self, token: str, claims: dict):
+        chave = token.rpartition(".")[2]
+        # Nunca guardar além da expiração do próprio token
+        expira_em = min(time.time() + self.ttl, claims.get("exp", float("inf")))
+        with self._lock:
+            self._itens[chave] = (token, claims, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
+
+
+class _CacheIdentidades:
+    """Cache LRU com TTL curto de email -> Principal (None para driver inexistente ou
+    desativado), para não consultar o banco a cada request autenticado"""
+
+    def __init__(self, tamanho: int, ttl: float):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, email: str):
+        """(True, Principal | None) se em cache; (False, None) se precisa consultar"""
+        with self._lock:
+            item = self._itens.get(email)
+            if item is None or item[1] <= time.time():
+                return False, None
+            self._itens.move_to_end(email)
+            return True, item[0]
+
+    def adicionar(self, email: str, principal: Optional["Principal"]):
+        with self._lock:
+            self._itens[email] = (principal, time.time() + self.ttl)
+            self._itens.move_to_end(email)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
+
+
+_cache_claims = _CacheClaims(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+_cache_identidades = _CacheIdentidades(TOKEN_CACHE_SIZE, IDENTIDADE_CACHE_TTL)
+
 
 def criar_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Criar JWT access token"""
@@ -22,18 +121,116 @@ def criar_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verificar_token(token: str = Depends(oauth2_scheme)) -> str:
-    """Verificar JWT token e retornar email"""
-    credentials_exception = HTTPException(
+
+def _credenciais_invalidas():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def obter_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """Verificar JWT token (uma vez por token, com cache) e retornar as claims"""
+    return _verificar_token(token)
+
+
+def obter_claims_stream(
+    token_cabecalho: Optional[str] = Depends(oauth2_scheme_opcional),
+    token: Optional[str] = Query(None, description="JWT para clientes que não enviam cabeçalhos (EventSource)")
+) -> dict:
+    """Como obter_claims, aceitando também ?token= (o EventSource do navegador não envia Authorization)"""
+    if not (token_cabecalho or token):
+        raise _credenciais_invalidas()
+    return _verificar_token(token_cabecalho or token)
+
+
+def _verificar_token(token: str) -> dict:
+    claims = _cache_claims.obter(token)
+    if claims is not None:
+        return claims
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
-        raise credentials_exception
-    return email
+        raise _credenciais_invalidas()
+    if claims.get("sub") is None:
+        raise _credenciais_invalidas()
+    _cache_claims.adicionar(token, claims)
+    return claims
+
+
+def verificar_token(claims: dict = Depends(obter_claims)) -> str:
+    """Verificar JWT token e retornar email"""
+    return claims["sub"]
+
+
+def _driver_nao_encontrado():
+    return HTTPException(status_code=404, detail="Driver não encontrado")
+
+
+def _principal(identidade) -> Optional[Principal]:
+    # is_active nulo (linhas antigas) conta como ativo, como no cadastro
+    if not identidade or identidade.is_active is False:
+        return None
+    return Principal(id=identidade.id, email=identidade.email)
+
+
+def _exigir(principal: Optional[Principal], claims: dict) -> Principal:
+    # Claim "id" de outro driver (email reaproveitado) também invalida o token
+    if principal is None or claims.get("id", principal.id) != principal.id:
+        raise _credenciais_invalidas()
+    return principal
+
+
+def current_principal(claims: dict = Depends(obter_claims), db: Session = Depends(get_read_db)) -> Principal:
+    """Driver logado (id + email), conferindo que ainda existe e está ativo (consulta em
+    cache por IDENTIDADE_CACHE_TTL segundos)"""
+    em_cache, principal = _cache_identidades.obter(claims["sub"])
+    if not em_cache:
+        identidade = DriverController.buscar_identidade_por_email(db, email=claims["sub"])
+        principal = _principal(identidade)
+        _cache_identidades.adicionar(claims["sub"], principal)
+    return _exigir(principal, claims)
+
+
+async def _principal_async(claims: dict, leitura: AsyncSession) -> Optional[Principal]:
+    em_cache, principal = _cache_identidades.obter(claims["sub"])
+    if not em_cache:
+        identidade = await DriverController.buscar_identidade_por_email_async(leitura, email=claims["sub"])
+        principal = _principal(identidade)
+        _cache_identidades.adicionar(claims["sub"], principal)
+    return principal
+
+
+async def current_principal_async(
+    claims: dict = Depends(obter_claims),
+    leitura: AsyncSession = Depends(get_async_read_db)
+) -> Principal:
+    """Versão async de current_principal (para rotas async def)"""
+    return _exigir(await _principal_async(claims, leitura), claims)
+
+
+async def current_principal_stream_async(claims: dict = Depends(obter_claims_stream)) -> Principal:
+    """current_principal_async com o token do cabeçalho ou de ?token= (streams). A
+    sessão é aberta aqui e fechada antes da resposta: a de uma dependência com yield
+    só fecharia no fim do stream, prendendo uma conexão por assinante"""
+    em_cache, principal = _cache_identidades.obter(claims["sub"])
+    if not em_cache:
+        async with AsyncReadSessionLocal() as leitura:
+            principal = await _principal_async(claims, leitura)
+    return _exigir(principal, claims)
+
+
+async def current_admin_async(principal: Principal = Depends(current_principal_async)) -> Principal:
+    """Principal de um operador (ADMIN_EMAILS); 403 para os demais drivers"""
+    if not principal.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Restrito a operadores")
+    return principal
+
+
+def current_driver(principal: Principal = Depends(current_principal), db: Session = Depends(get_read_db)):
+    """Driver logado carregado uma única vez por request (compartilhado entre dependências)"""
+    driver = DriverController.buscar_driver_por_id(db, principal.id)
+    if not driver:
+        raise _driver_nao_encontrado()
+    return driver
@@ -1,20 +1,150 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import re
+import threading
+import time
 
 # Configurar banco de dados
-# Usando SQLite por padrão, mas pode ser alterado para PostgreSQL ou MySQL
+# Usando SQLite por padrão, mas pode ser alterado para PostgreSQL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tmax.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Os upserts (INSERT ... ON CONFLICT DO UPDATE) e os UPDATE/DELETE ... RETURNING dos
+# serviços só existem nestes dialetos: outro banco falha na subida, não no primeiro upload
+DIALETOS = ("sqlite", "postgresql")
+_dialeto = DATABASE_URL.partition("://")[0].split("+")[0]
+if {"postgres": "postgresql"}.get(_dialeto, _dialeto) not in DIALETOS:
+    raise ValueError(f"DATABASE_URL: banco {_dialeto!r} não suportado (use um de {DIALETOS})")
+
+# Perfil de produção do SQLite: WAL + pragmas + pools separados de leitura/escrita
+# (SQLITE_PROFILE=simples mantém um único pool sem pragmas)
+SQLITE_PRODUCAO = IS_SQLITE and os.getenv("SQLITE_PROFILE", "producao") == "producao"
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "8"))
+SQLITE_WRITER_TIMEOUT = float(os.getenv("SQLITE_WRITER_TIMEOUT", "30"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", str(64 * 1024)))
+
+# Drivers async equivalentes aos drivers síncronos
+_DRIVERS_ASYNC = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def _url_async(url: str) -> str:
+    """Converter a URL síncrona para o driver async correspondente"""
+    esquema, separador, resto = url.partition("://")
+    esquema = _DRIVERS_ASYNC.get(esquema.split("+")[0], esquema)
+    return f"{esquema}{separador}{resto}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _url_async(DATABASE_URL))
+
+
+class _EsperaPools:
+    """Tempo de espera por conexão em cada pool (checkout)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dados = {}
+
+    def registrar(self, nome: str, espera: float):
+        with self._lock:
+            pool = self._dados.setdefault(nome, {"checkouts": 0, "espera_total": 0.0, "espera_max": 0.0})
+            pool["checkouts"] += 1
+            pool["espera_total"] += espera
+            pool["espera_max"] = max(pool["espera_max"], espera)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {nome: dict(valores) for nome, valores in self._dados.items()}
+
+
+_esperas = _EsperaPools()
 
-# Criar engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    echo=False
-)
+
+def _pool_cronometrado(base, nome: str):
+    """Subclasse do pool que mede quanto cada checkout esperou na fila"""
+
+    class PoolCronometrado(base):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                _esperas.registrar(nome, time.perf_counter() - inicio)
+
+    PoolCronometrado.__name__ = f"{base.__name__}Cronometrado"
+    return PoolCronometrado
+
+
+def _aplicar_pragmas(somente_leitura: bool):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if somente_leitura:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return on_connect
+
+
+def _criar_engine(url: str, nome: str, somente_leitura: bool = False, assincrono: bool = False):
+    kwargs = {"echo": False}
+    if IS_SQLITE and not assincrono:
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if SQLITE_PRODUCAO:
+        # Escrita: uma única conexão; os demais escritores esperam na fila do pool
+        tamanho = SQLITE_READERS if somente_leitura else 1
+        kwargs.update(
+            poolclass=_pool_cronometrado(AsyncAdaptedQueuePool if assincrono else QueuePool, nome),
+            pool_size=tamanho,
+            max_overflow=0,
+            pool_timeout=SQLITE_WRITER_TIMEOUT,
+        )
+    novo = create_async_engine(url, **kwargs) if assincrono else create_engine(url, **kwargs)
+    if SQLITE_PRODUCAO:
+        alvo = novo.sync_engine if assincrono else novo
+        event.listen(alvo, "connect", _aplicar_pragmas(somente_leitura))
+    return novo
+
+
+# Criar engine (escrita)
+engine = _criar_engine(DATABASE_URL, "escrita")
+
+# Engine async, usado pelas rotas async def (não bloqueia o event loop)
+async_engine = _criar_engine(ASYNC_DATABASE_URL, "escrita_async", assincrono=True)
+
+# Engines de leitura: várias conexões em paralelo (WAL permite leitores concorrentes)
+if SQLITE_PRODUCAO:
+    read_engine = _criar_engine(DATABASE_URL, "leitura", somente_leitura=True)
+    async_read_engine = _criar_engine(ASYNC_DATABASE_URL, "leitura_async", somente_leitura=True, assincrono=True)
+else:
+    read_engine = engine
+    async_read_engine = async_engine
 
 # Criar session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# expire_on_commit=False: em async não há lazy load, então os objetos
+# continuam utilizáveis depois do commit
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 # Criar base para os modelos
 Base = declarative_base()
@@ -27,3 +157,112 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Dependency para rotas somente leitura (pool de leitores)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """Dependency para obter a sessão async do banco de dados (rotas async def)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """Dependency async somente leitura (pool de leitores)"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+class RegistroDuplicado(Exception):
+    """Violação de UNIQUE numa escrita; campo é a coluna duplicada"""
+
+    def __init__(self, campo: str):
+        super().__init__(campo)
+        self.campo = campo
+
+
+def campo_duplicado(erro: IntegrityError, colunas) -> str | None:
+    """Descobrir qual coluna UNIQUE foi violada pela mensagem do driver
+    (SQLite: "drivers.email", PostgreSQL: nome da constraint/índice)"""
+    mensagem = str(erro.orig).splitlines()[0].lower()
+    if "unique" not in mensagem and "duplicate" not in mensagem:
+        return None
+    for coluna in colunas:
+        if re.search(rf"(?<![a-z0-9]){coluna}(?![a-z0-9])", mensagem):
+            return coluna
+    return None
+
+
+def _colunas_unicas(stmt) -> list[str]:
+    tabela = stmt.table
+    return [coluna.key for coluna in tabela.columns if coluna.unique]
+
+
+def executar_escrita(db, stmt):
+    """Executar um INSERT/UPDATE/DELETE ... RETURNING e commitar (1 statement, 1 round-trip).
+    Retorna a linha devolvida pelo RETURNING (ou None); UNIQUE violado vira RegistroDuplicado"""
+    try:
+        linha = db.execute(stmt).first()
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        campo = campo_duplicado(e, _colunas_unicas(stmt))
+        if campo is None:
+            raise
+        raise RegistroDuplicado(campo) from e
+    return linha
+
+
+async def executar_escrita_async(db: AsyncSession, stmt):
+    """Versão async de executar_escrita"""
+    try:
+        linha = (await db.execute(stmt)).first()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        campo = campo_duplicado(e, _colunas_unicas(stmt))
+        if campo is None:
+            raise
+        raise RegistroDuplicado(campo) from e
+    return linha
+
+
+def estatisticas_pools() -> dict:
+    """Espera por conexão e ocupação atual de cada pool"""
+    pools = {
+        "escrita": engine.pool,
+        "escrita_async": async_engine.pool,
+        "leitura": read_engine.pool,
+        "leitura_async": async_read_engine.pool,
+    }
+    esperas = _esperas.snapshot()
+    return {
+        nome: {
+            **esperas.get(nome, {"checkouts": 0, "espera_total": 0.0, "espera_max": 0.0}),
+            "em_uso": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "status": pool.status(),
+        }
+        for nome, pool in pools.items()
+    }
+
+
+def descartar_conexoes_herdadas():
+    """Depois do fork de um worker: não reutilizar conexões abertas pelo processo pai
+    (os engines async nunca conectam no pai, então só os síncronos importam)"""
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+
+
+async def dispose_async():
+    """Fechar as conexões dos engines async (shutdown)"""
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
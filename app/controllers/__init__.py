@@ -1,4 +1,7 @@
 from .usuario_controller import UsuarioController
 from .driver_controller import DriverController, MotorcycleController
+from .posicao_controller import PosicaoController
+from .delivery_controller import DeliveryController
+from .geofence_controller import GeofenceController
 
-__all__ = ["UsuarioController", "DriverController", "MotorcycleController"]
+__all__ = ["UsuarioController", "DriverController", "MotorcycleController", "PosicaoController", "DeliveryController", "GeofenceController"]
@@ -0,0 +1,113 @@
+from datetime import datetime
+from sqlalchemy import bindparam, exists, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.models.delivery import Delivery, STATUS_EM_ANDAMENTO, TRANSICOES
+from app.models.driver import Driver
+from app.models.geofence import Geofence
+from app.models.schemas import DeliveryCreate
+
+
+class DeliveryController:
+    
+    @staticmethod
+    async def criar_entrega_async(db: AsyncSession, entrega: DeliveryCreate, cercas: list[dict] = ()):
+        """INSERT ... RETURNING de uma entrega aberta e, na mesma transação, das zonas
+        dela ({kind, shape, lat, lon, radius_m, polygon})"""
+        agora = datetime.utcnow()
+        stmt = insert(Delivery).values(**entrega.model_dump(), status="open", created_at=agora, updated_at=agora)
+        criada = (await db.execute(stmt.returning(*Delivery.__table__.columns))).first()
+        if cercas:
+            conexao = await db.connection()
+            await conexao.execute(insert(Geofence), [
+                {**cerca, "delivery_id": criada.id, "active": True, "created_at": agora, "updated_at": agora}
+                for cerca in cercas
+            ])
+        await db.commit()
+        return criada
+    
+    @staticmethod
+    async def buscar_entrega_async(db: AsyncSession, delivery_id: int):
+        stmt = select(*Delivery.__table__.columns).where(Delivery.id == delivery_id)
+        return (await db.execute(stmt)).first()
+    
+    @staticmethod
+    async def mudar_status_async(db: AsyncSession, delivery_id: int, status: str, driver_id: int | None = None):
+        """UPDATE ... RETURNING do status, só a partir de um status de TRANSICOES[status]
+        (e, com driver_id, só na entrega desse driver); None se nada mudou"""
+        stmt = (
+            update(Delivery)
+            .where(Delivery.id == delivery_id, Delivery.status.in_(TRANSICOES[status]))
+            .values(status=status, updated_at=datetime.utcnow())
+        )
+        if driver_id is not None:
+            stmt = stmt.where(Delivery.driver_id == driver_id)
+        alterada = (await db.execute(stmt.returning(*Delivery.__table__.columns))).first()
+        await db.commit()
+        return alterada
+    
+    @staticmethod
+    async def listar_abertas_async(db: AsyncSession, limite: int):
+        """(id, pickup_lat, pickup_lon, vehicle_type) das entregas abertas, mais antigas
+        primeiro (coberto por ix_deliveries_status_created_at)"""
+        stmt = (
+            select(Delivery.id, Delivery.pickup_lat, Delivery.pickup_lon, Delivery.vehicle_type)
+            .where(Delivery.status == "open")
+            .order_by(Delivery.created_at, Delivery.id)
+            .limit(limite)
+        )
+        return (await db.execute(stmt)).all()
+    
+    @staticmethod
+    async def listar_em_andamento_do_driver_async(db: AsyncSession, driver_id: int):
+        """Entregas atribuídas ou coletadas do driver (ix_deliveries_driver_id_status)"""
+        stmt = (
+            select(*Delivery.__table__.columns)
+            .where(Delivery.driver_id == driver_id, Delivery.status.in_(STATUS_EM_ANDAMENTO))
+            .order_by(Delivery.id)
+        )
+        return (await db.execute(stmt)).all()
+    
+    @staticmethod
+    async def listar_drivers_ocupados_async(db: AsyncSession) -> set[int]:
+        """Drivers com entrega atribuída ou coletada"""
+        stmt = select(Delivery.driver_id).where(Delivery.status.in_(STATUS_EM_ANDAMENTO)).distinct()
+        return set((await db.execute(stmt)).scalars())
+    
+    @staticmethod
+    async def atribuir_async(db: AsyncSession, pares: dict[int, int]) -> list:
+        """Atribuir {delivery_id: driver_id} numa transação e devolver os pares
+        (id, driver_id) efetivamente gravados.
+
+        Cada UPDATE só muda uma entrega ainda aberta para um driver ativo sem outra
+        entrega em andamento: um despacho concorrente (outro worker, POST
+        /deliveries/dispatch) não atribui a mesma entrega nem o mesmo driver duas vezes.
+        """
+        if not pares:
+            return []
+        agora = datetime.utcnow()
+        ocupada = aliased(Delivery)
+        # executemany: um statement preparado (e cacheado) para o lote inteiro
+        stmt = (
+            update(Delivery)
+            .where(
+                Delivery.id == bindparam("e"),
+                Delivery.status == "open",
+                # is_active nulo (linhas antigas) conta como ativo, como na autenticação
+                exists().where(Driver.id == bindparam("d"), Driver.is_active.is_not(False)),
+                # IN expandido não funciona em executemany
+                ~exists().where(
+                    ocupada.driver_id == bindparam("d"), or_(*(ocupada.status == s for s in STATUS_EM_ANDAMENTO))
+                ),
+            )
+            .values(driver_id=bindparam("d"), status="assigned", assigned_at=agora, updated_at=agora)
+        )
+        conexao = await db.connection()
+        await conexao.execute(stmt, [{"e": e, "d": d} for e, d in pares.items()])
+        # assigned_at == agora identifica as linhas gravadas por este lote
+        atribuidas = (await conexao.execute(
+            select(Delivery.id, Delivery.driver_id)
+            .where(Delivery.id.in_(list(pares)), Delivery.status == "assigned", Delivery.assigned_at == agora)
+        )).all()
+        await db.commit()
+        return atribuidas
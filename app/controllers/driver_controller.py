@@ -1,146 +1,267 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only, undefer_group
+from app.config.database import executar_escrita, executar_escrita_async
 from app.models.driver import Driver, Motorcycle
 from app.models.schemas import DriverCreate, DriverUpdate, MotorcycleCreate, MotorcycleUpdate
-from passlib.context import CryptContext
+from app.services.hashing import gerar_hash, verificar_hash
+from app.services.paginacao import aplicar_cursor, montar_pagina, LIMITE_PADRAO
+
+# Ordem estável da listagem de drivers (coberta por ix_drivers_created_at_id)
+_ORDEM_DRIVERS = (Driver.created_at, Driver.id)
+
+
+def _com_campos(query, modelo, campos: tuple[str, ...] | None):
+    """Restringir o SELECT às colunas pedidas; sem campos carrega tudo, inclusive as adiadas"""
+    if campos is None:
+        return query.options(undefer_group("imagens"))
+    return query.options(load_only(*[getattr(modelo, campo) for campo in campos]))
+
+
+def _valores(dados) -> dict:
+    """Campos preenchidos de um schema de update (vazios são ignorados)"""
+    return {campo: valor for campo, valor in dados.model_dump().items() if valor}
+
+
+def _na_versao(stmt, modelo, versoes):
+    """Restringir o UPDATE às versões (updated_at) aceitas pelo If-Match"""
+    return stmt if versoes is None else stmt.where(modelo.updated_at.in_(versoes))
+
+
+def _retornando(stmt, modelo):
+    """RETURNING com todas as colunas (inclusive as adiadas), sem sincronizar a sessão"""
+    return stmt.returning(*modelo.__table__.columns).execution_options(synchronize_session=False)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class DriverController:
     
     @staticmethod
-    def hash_senha(senha: str) -> str:
-        return pwd_context.hash(senha)
+    async def hash_senha(senha: str) -> str:
+        return await gerar_hash(senha)
     
     @staticmethod
-    def verificar_senha(senha_plana: str, senha_hash: str) -> bool:
-        return pwd_context.verify(senha_plana, senha_hash)
+    async def verificar_senha(senha_plana: str, senha_hash: str) -> bool:
+        return await verificar_hash(senha_plana, senha_hash)
     
     @staticmethod
-    def criar_driver(db: Session, driver: DriverCreate):
-        db_driver = Driver(
+    def _insert_driver(driver: DriverCreate, senha_hash: str):
+        # senha_hash vem de hash_senha, calculado fora da thread do banco
+        return _retornando(insert(Driver).values(
             nome=driver.nome,
             email=driver.email,
             cpf=driver.cpf,
             phone=driver.phone,
-            password=DriverController.hash_senha(driver.password)
-        )
-        db.add(db_driver)
-        db.commit()
-        db.refresh(db_driver)
-        return db_driver
+            password=senha_hash
+        ), Driver)
+    
+    @staticmethod
+    def criar_driver(db: Session, driver: DriverCreate, senha_hash: str):
+        """INSERT ... RETURNING; email/CPF duplicado levanta RegistroDuplicado"""
+        return executar_escrita(db, DriverController._insert_driver(driver, senha_hash))
+    
+    @staticmethod
+    async def criar_driver_async(db: AsyncSession, driver: DriverCreate, senha_hash: str):
+        return await executar_escrita_async(db, DriverController._insert_driver(driver, senha_hash))
     
     @staticmethod
-    def buscar_driver_por_email(db: Session, email: str):
-        return db.query(Driver).filter(Driver.email == email).first()
+    def buscar_driver_por_email(db: Session, email: str, campos: tuple[str, ...] | None = None):
+        query = _com_campos(db.query(Driver), Driver, campos)
+        return query.filter(Driver.email == email).first()
     
     @staticmethod
-    def buscar_driver_por_id(db: Session, driver_id: int):
-        return db.query(Driver).filter(Driver.id == driver_id).first()
+    def buscar_driver_por_id(db: Session, driver_id: int, campos: tuple[str, ...] | None = None):
+        query = _com_campos(db.query(Driver), Driver, campos)
+        return query.filter(Driver.id == driver_id).first()
+    
+    @staticmethod
+    def buscar_versao_driver(db: Session, driver_id: int):
+        """Só (id, updated_at), pela chave primária: validadores de GET condicional"""
+        return db.execute(select(Driver.id, Driver.updated_at).where(Driver.id == driver_id)).first()
+    
+    @staticmethod
+    async def buscar_driver_por_email_async(db: AsyncSession, email: str, campos: tuple[str, ...] | None = None):
+        query = _com_campos(select(Driver), Driver, campos)
+        return (await db.execute(query.where(Driver.email == email))).scalars().first()
+    
+    @staticmethod
+    async def buscar_driver_por_id_async(db: AsyncSession, driver_id: int, campos: tuple[str, ...] | None = None):
+        query = _com_campos(select(Driver), Driver, campos)
+        return (await db.execute(query.where(Driver.id == driver_id))).scalars().first()
+    
+    @staticmethod
+    def buscar_identidade_por_email(db: Session, email: str):
+        """Buscar só (id, email, is_active), para checagens de permissão"""
+        return db.query(Driver.id, Driver.email, Driver.is_active).filter(Driver.email == email).first()
+    
+    @staticmethod
+    def buscar_identidade_por_id(db: Session, driver_id: int):
+        """Buscar só (id, email, is_active), para checagens de permissão"""
+        return db.query(Driver.id, Driver.email, Driver.is_active).filter(Driver.id == driver_id).first()
+    
+    @staticmethod
+    async def buscar_identidade_por_email_async(db: AsyncSession, email: str):
+        """Buscar só (id, email, is_active), para checagens de permissão"""
+        stmt = select(Driver.id, Driver.email, Driver.is_active).where(Driver.email == email)
+        return (await db.execute(stmt)).first()
     
     @staticmethod
     def buscar_driver_por_cpf(db: Session, cpf: str):
         return db.query(Driver).filter(Driver.cpf == cpf).first()
     
     @staticmethod
-    def listar_drivers(db: Session):
-        return db.query(Driver).filter(Driver.is_active == True).all()
-    
-    @staticmethod
-    def atualizar_driver(db: Session, driver_id: int, driver_update: DriverUpdate):
-        driver = db.query(Driver).filter(Driver.id == driver_id).first()
-        if not driver:
-            return None
-        
-        if driver_update.nome:
-            driver.nome = driver_update.nome
-        if driver_update.email:
-            driver.email = driver_update.email
-        if driver_update.phone:
-            driver.phone = driver_update.phone
-        if driver_update.address_proof:
-            driver.address_proof = driver_update.address_proof
-        if driver_update.profile_image:
-            driver.profile_image = driver_update.profile_image
-        if driver_update.rg_images:
-            driver.rg_images = driver_update.rg_images
-        
-        db.commit()
-        db.refresh(driver)
-        return driver
+    async def buscar_driver_por_cpf_async(db: AsyncSession, cpf: str):
+        """Retorna só (id,), suficiente para checar duplicidade"""
+        return (await db.execute(select(Driver.id).where(Driver.cpf == cpf))).first()
+    
+    @staticmethod
+    async def buscar_duplicados_async(db: AsyncSession, emails: list[str], cpfs: list[str]) -> tuple[set, set]:
+        """Emails e CPFs já cadastrados, em uma única consulta por lote"""
+        resultado = await db.execute(
+            select(Driver.email, Driver.cpf).where(or_(Driver.email.in_(emails), Driver.cpf.in_(cpfs)))
+        )
+        emails_existentes, cpfs_existentes = set(), set()
+        for email, cpf in resultado:
+            emails_existentes.add(email)
+            cpfs_existentes.add(cpf)
+        return emails_existentes, cpfs_existentes
+    
+    @staticmethod
+    async def criar_drivers_em_lote_async(db: AsyncSession, linhas: list[dict]) -> list[int]:
+        """INSERT em lote (executemany) numa transação; retorna os ids na ordem das linhas"""
+        resultado = await db.execute(
+            insert(Driver).returning(Driver.id, sort_by_parameter_order=True), linhas
+        )
+        ids = list(resultado.scalars())
+        await db.commit()
+        return ids
+    
+    @staticmethod
+    def listar_drivers(
+        db: Session,
+        limit: int = LIMITE_PADRAO,
+        cursor: str | None = None,
+        is_active: bool | None = None,
+        campos: tuple[str, ...] | None = None,
+    ) -> tuple[list[Driver], str | None]:
+        """Listar drivers paginando por (created_at, id); retorna (itens, next_cursor)"""
+        if campos is not None:
+            # A chave do cursor sai do último item, então precisa estar carregada
+            campos = tuple(sorted(set(campos) | {"created_at", "id"}))
+        query = _com_campos(db.query(Driver), Driver, campos)
+        if is_active is not None:
+            query = query.filter(Driver.is_active == is_active)
+        query = aplicar_cursor(query, _ORDEM_DRIVERS, cursor, limit)
+        return montar_pagina(query.all(), _ORDEM_DRIVERS, limit)
+    
+    @staticmethod
+    def atualizar_driver(db: Session, driver_id: int, driver_update: DriverUpdate, versoes=None):
+        """UPDATE ... RETURNING (None se o driver não existe ou, com versoes, se o
+        updated_at atual não é nenhuma delas)"""
+        valores = _valores(driver_update)
+        if not valores:
+            driver = DriverController.buscar_driver_por_id(db, driver_id)
+            return driver if driver and (versoes is None or driver.updated_at in versoes) else None
+        stmt = _na_versao(update(Driver).where(Driver.id == driver_id), Driver, versoes).values(**valores)
+        return executar_escrita(db, _retornando(stmt, Driver))
+    
+    @staticmethod
+    async def atualizar_driver_async(db: AsyncSession, driver_id: int, driver_update: DriverUpdate, versoes=None):
+        valores = _valores(driver_update)
+        if not valores:
+            driver = await DriverController.buscar_driver_por_id_async(db, driver_id)
+            return driver if driver and (versoes is None or driver.updated_at in versoes) else None
+        stmt = _na_versao(update(Driver).where(Driver.id == driver_id), Driver, versoes).values(**valores)
+        return await executar_escrita_async(db, _retornando(stmt, Driver))
+    
+    @staticmethod
+    async def gravar_imagens_async(db: AsyncSession, driver_id: int, **imagens):
+        """UPDATE ... RETURNING de profile_image/rg_images; só para os uploads, que
+        cuidam das referências dos blobs na mesma transação"""
+        stmt = update(Driver).where(Driver.id == driver_id).values(**imagens)
+        return await executar_escrita_async(db, _retornando(stmt, Driver))
     
     @staticmethod
     def deletar_driver(db: Session, driver_id: int):
-        driver = db.query(Driver).filter(Driver.id == driver_id).first()
-        if not driver:
-            return None
-        
-        driver.is_active = False
-        db.commit()
-        return driver
+        """Soft delete num único UPDATE; retorna (id,) ou None"""
+        stmt = update(Driver).where(Driver.id == driver_id).values(is_active=False)
+        return executar_escrita(db, stmt.returning(Driver.id).execution_options(synchronize_session=False))
 
 
 class MotorcycleController:
     
     @staticmethod
-    def criar_motorcycle(db: Session, motorcycle: MotorcycleCreate):
-        db_motorcycle = Motorcycle(
+    def _insert_motorcycle(motorcycle: MotorcycleCreate, image: str | None = None):
+        return _retornando(insert(Motorcycle).values(
             driver_id=motorcycle.driver_id,
             brand=motorcycle.brand,
             model=motorcycle.model,
             year=motorcycle.year,
-            plate=motorcycle.plate
-        )
-        db.add(db_motorcycle)
-        db.commit()
-        db.refresh(db_motorcycle)
-        return db_motorcycle
+            plate=motorcycle.plate,
+            image=image
+        ), Motorcycle)
     
     @staticmethod
-    def buscar_motorcycle_por_driver(db: Session, driver_id: int):
-        return db.query(Motorcycle).filter(Motorcycle.driver_id == driver_id).first()
+    def criar_motorcycle(db: Session, motorcycle: MotorcycleCreate, image: str | None = None):
+        """INSERT ... RETURNING; placa duplicada levanta RegistroDuplicado"""
+        return executar_escrita(db, MotorcycleController._insert_motorcycle(motorcycle, image))
+    
+    @staticmethod
+    async def criar_motorcycle_async(db: AsyncSession, motorcycle: MotorcycleCreate, image: str | None = None):
+        return await executar_escrita_async(db, MotorcycleController._insert_motorcycle(motorcycle, image))
+    
+    @staticmethod
+    def buscar_motorcycle_por_driver(db: Session, driver_id: int, campos: tuple[str, ...] | None = None):
+        query = _com_campos(db.query(Motorcycle), Motorcycle, campos)
+        return query.filter(Motorcycle.driver_id == driver_id).first()
+    
+    @staticmethod
+    def buscar_versao_motorcycle_por_driver(db: Session, driver_id: int):
+        """Só (id, updated_at), pelo índice de driver_id: validadores de GET condicional"""
+        stmt = select(Motorcycle.id, Motorcycle.updated_at).where(Motorcycle.driver_id == driver_id)
+        return db.execute(stmt).first()
+    
+    @staticmethod
+    async def buscar_motorcycle_por_driver_async(
+        db: AsyncSession, driver_id: int, campos: tuple[str, ...] | None = None
+    ):
+        query = _com_campos(select(Motorcycle), Motorcycle, campos)
+        return (await db.execute(query.where(Motorcycle.driver_id == driver_id))).scalars().first()
     
     @staticmethod
     def buscar_motorcycle_por_id(db: Session, motorcycle_id: int):
         return db.query(Motorcycle).filter(Motorcycle.id == motorcycle_id).first()
     
     @staticmethod
-    def atualizar_motorcycle(db: Session, motorcycle_id: int, motorcycle_update: MotorcycleUpdate):
-        motorcycle = db.query(Motorcycle).filter(Motorcycle.id == motorcycle_id).first()
-        if not motorcycle:
-            return None
-        
-        if motorcycle_update.brand:
-            motorcycle.brand = motorcycle_update.brand
-        if motorcycle_update.model:
-            motorcycle.model = motorcycle_update.model
-        if motorcycle_update.year:
-            motorcycle.year = motorcycle_update.year
-        if motorcycle_update.plate:
-            motorcycle.plate = motorcycle_update.plate
-        if motorcycle_update.image:
-            motorcycle.image = motorcycle_update.image
-        
-        db.commit()
-        db.refresh(motorcycle)
-        return motorcycle
+    def atualizar_motorcycle(
+        db: Session, motorcycle_id: int, motorcycle_update: MotorcycleUpdate, driver_id: int | None = None,
+        versoes=None
+    ):
+        """UPDATE ... RETURNING; com driver_id só atualiza se a moto for desse driver,
+        com versoes só se o updated_at atual for uma delas (If-Match)"""
+        valores = _valores(motorcycle_update)
+        stmt = _na_versao(update(Motorcycle).where(Motorcycle.id == motorcycle_id), Motorcycle, versoes)
+        if driver_id is not None:
+            stmt = stmt.where(Motorcycle.driver_id == driver_id)
+        if not valores:
+            # Nada a gravar: o UPDATE só confirma a existência (e a posse) e devolve a linha
+            valores = {"updated_at": Motorcycle.updated_at}
+        return executar_escrita(db, _retornando(stmt.values(**valores), Motorcycle))
+    
+    @staticmethod
+    async def atualizar_motorcycle_async(db: AsyncSession, motorcycle_id: int, motorcycle_update: MotorcycleUpdate):
+        valores = _valores(motorcycle_update) or {"updated_at": Motorcycle.updated_at}
+        stmt = update(Motorcycle).where(Motorcycle.id == motorcycle_id).values(**valores)
+        return await executar_escrita_async(db, _retornando(stmt, Motorcycle))
+    
+    @staticmethod
+    async def gravar_imagem_async(db: AsyncSession, motorcycle_id: int, image: str):
+        """UPDATE ... RETURNING da imagem (só pelo upload, como gravar_imagens_async)"""
+        stmt = update(Motorcycle).where(Motorcycle.id == motorcycle_id).values(image=image)
+        return await executar_escrita_async(db, _retornando(stmt, Motorcycle))
     
     @staticmethod
     def deletar_motorcycle(db: Session, motorcycle_id: int):
-        motorcycle = db.query(Motorcycle).filter(Motorcycle.id == motorcycle_id).first()
-        if not motorcycle:
-            return None
-        
-        motorcycle.is_active = False
-        db.commit()
-        return motorcycle
-    
-    @staticmethod
-    def atualizar_imagem_moto(db: Session, motorcycle_id: int, image_base64: str):
-        motorcycle = db.query(Motorcycle).filter(Motorcycle.id == motorcycle_id).first()
-        if not motorcycle:
-            return None
-        
-        motorcycle.image = image_base64
-        db.commit()
-        db.refresh(motorcycle)
-        return motorcycle
+        """Soft delete num único UPDATE; retorna (id,) ou None"""
+        stmt = update(Motorcycle).where(Motorcycle.id == motorcycle_id).values(is_active=False)
+        return executar_escrita(db, stmt.returning(Motorcycle.id).execution_options(synchronize_session=False))
+
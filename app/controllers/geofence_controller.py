@@ -0,0 +1,83 @@
+from datetime import datetime
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import executar_escrita_async
+from app.models.delivery import Delivery, STATUS_EM_ANDAMENTO
+from app.models.geofence import Geofence, GeofenceEvent
+
+# Zona como o motor de cercas a lê: colunas da cerca + driver e status da entrega
+_COLUNAS_ZONA = (
+    *Geofence.__table__.columns, Delivery.driver_id, Delivery.status,
+    Delivery.updated_at.label("delivery_updated_at"),
+)
+_LOTE_IDS = 500  # ids por IN (limite de parâmetros do SQLite)
+
+
+class GeofenceController:
+    
+    @staticmethod
+    async def criar_cerca_async(db: AsyncSession, delivery_id: int, cerca: dict):
+        """INSERT ... RETURNING de uma zona ({kind, shape, lat, lon, radius_m, polygon})"""
+        agora = datetime.utcnow()
+        stmt = insert(Geofence).values(**cerca, delivery_id=delivery_id, active=True, created_at=agora, updated_at=agora)
+        return await executar_escrita_async(db, stmt.returning(*Geofence.__table__.columns))
+    
+    @staticmethod
+    async def listar_cercas_da_entrega_async(db: AsyncSession, delivery_id: int):
+        stmt = select(*Geofence.__table__.columns).where(Geofence.delivery_id == delivery_id).order_by(Geofence.id)
+        return (await db.execute(stmt)).all()
+    
+    @staticmethod
+    async def listar_zonas_async(db: AsyncSession, desde: datetime | None = None):
+        """Zonas com o driver e o status da entrega. Sem desde: as que valem agora
+        (ativas, sem entrega ou de entrega em andamento); com desde: as alteradas
+        depois dele, ou cuja entrega mudou (o chamador decide o que sai da memória)"""
+        base = select(*_COLUNAS_ZONA).outerjoin(Delivery, Delivery.id == Geofence.delivery_id)
+        if desde is None:
+            # Pelas entregas em andamento (índice de status) e as zonas sem entrega
+            em_andamento = (
+                select(*_COLUNAS_ZONA).select_from(Delivery).join(Geofence, Geofence.delivery_id == Delivery.id)
+                .where(Delivery.status.in_(STATUS_EM_ANDAMENTO), Geofence.active.is_(True))
+            )
+            sem_entrega = base.where(Geofence.delivery_id.is_(None), Geofence.active.is_(True))
+            return (await db.execute(em_andamento)).all() + (await db.execute(sem_entrega)).all()
+        # Duas consultas, cada uma pelo seu índice de updated_at
+        alteradas = (await db.execute(base.where(Geofence.updated_at > desde))).all()
+        das_entregas = (await db.execute(base.where(Delivery.updated_at > desde))).all()
+        return list({linha.id: linha for linha in alteradas + das_entregas}.values())
+    
+    @staticmethod
+    async def ultimos_eventos_async(db: AsyncSession, cerca_ids: list[int]):
+        """(geofence_id, driver_id, event, occurred_at) do último evento de cada par
+        zona/driver das zonas dadas"""
+        ultimos = []
+        for inicio in range(0, len(cerca_ids), _LOTE_IDS):
+            lote = cerca_ids[inicio:inicio + _LOTE_IDS]
+            maximos = (
+                select(func.max(GeofenceEvent.id))
+                .where(GeofenceEvent.geofence_id.in_(lote))
+                .group_by(GeofenceEvent.geofence_id, GeofenceEvent.driver_id)
+            )
+            stmt = select(
+                GeofenceEvent.geofence_id, GeofenceEvent.driver_id, GeofenceEvent.event, GeofenceEvent.occurred_at
+            ).where(GeofenceEvent.id.in_(maximos))
+            ultimos += (await db.execute(stmt)).all()
+        return ultimos
+    
+    @staticmethod
+    async def gravar_eventos_async(db: AsyncSession, eventos: list[dict]):
+        """Eventos numa transação (executemany)"""
+        conexao = await db.connection()
+        await conexao.execute(insert(GeofenceEvent), eventos)
+        await db.commit()
+    
+    @staticmethod
+    async def listar_eventos_da_entrega_async(db: AsyncSession, delivery_id: int, limite: int):
+        """Eventos da entrega, mais antigos primeiro (ix_geofence_events_delivery_id_occurred_at)"""
+        stmt = (
+            select(*GeofenceEvent.__table__.columns)
+            .where(GeofenceEvent.delivery_id == delivery_id)
+            .order_by(GeofenceEvent.occurred_at, GeofenceEvent.id)
+            .limit(limite)
+        )
+        return (await db.execute(stmt)).all()
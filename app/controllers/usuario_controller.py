@@ -1,31 +1,58 @@
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.config.database import executar_escrita, executar_escrita_async
 from app.models.usuario import Usuario
 from app.models.schemas import UsuarioCreate, UsuarioUpdate
-from passlib.context import CryptContext
+from app.services.hashing import gerar_hash, verificar_hash
+from app.services.paginacao import aplicar_cursor, montar_pagina, LIMITE_PADRAO
 
-# Configurar hash de senha
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# id é sequencial, então a ordem por id é a ordem de criação (e usa a PK como índice)
+_ORDEM_USUARIOS = (Usuario.id,)
+
+
+def _insert_usuario(usuario_data: UsuarioCreate, senha_hash: str):
+    return insert(Usuario).values(
+        nome=usuario_data.nome,
+        email=usuario_data.email,
+        senha=senha_hash
+    ).returning(*Usuario.__table__.columns)
+
+
+def _update_usuario(usuario_id: int, usuario_data: UsuarioUpdate, senha_hash: str | None):
+    """UPDATE ... RETURNING só com os campos preenchidos (None se não há o que gravar)"""
+    valores = {}
+    if usuario_data.nome:
+        valores["nome"] = usuario_data.nome
+    if usuario_data.email:
+        valores["email"] = usuario_data.email
+    if senha_hash:
+        valores["senha"] = senha_hash
+    if not valores:
+        return None
+    return (
+        update(Usuario).where(Usuario.id == usuario_id).values(**valores)
+        .returning(*Usuario.__table__.columns).execution_options(synchronize_session=False)
+    )
 
 
 class UsuarioController:
     """Controlador para operações relacionadas a usuários"""
     
     @staticmethod
-    def criar_usuario(db: Session, usuario_data: UsuarioCreate) -> Usuario:
-        """Criar um novo usuário"""
-        # Hash da senha
-        hashed_password = pwd_context.hash(usuario_data.senha)
-        
-        db_usuario = Usuario(
-            nome=usuario_data.nome,
-            email=usuario_data.email,
-            senha=hashed_password
-        )
-        
-        db.add(db_usuario)
-        db.commit()
-        db.refresh(db_usuario)
-        return db_usuario
+    async def hash_senha(senha: str) -> str:
+        """Gerar hash da senha no pool de hashing"""
+        return await gerar_hash(senha)
+    
+    @staticmethod
+    def criar_usuario(db: Session, usuario_data: UsuarioCreate, senha_hash: str) -> Usuario:
+        """Criar um novo usuário (INSERT ... RETURNING); email duplicado levanta RegistroDuplicado"""
+        return executar_escrita(db, _insert_usuario(usuario_data, senha_hash))
+    
+    @staticmethod
+    async def criar_usuario_async(db: AsyncSession, usuario_data: UsuarioCreate, senha_hash: str) -> Usuario:
+        """Criar um novo usuário (sessão async)"""
+        return await executar_escrita_async(db, _insert_usuario(usuario_data, senha_hash))
     
     @staticmethod
     def obter_usuario_por_id(db: Session, usuario_id: int) -> Usuario | None:
@@ -38,42 +65,48 @@ class UsuarioController:
         return db.query(Usuario).filter(Usuario.email == email).first()
     
     @staticmethod
-    def listar_usuarios(db: Session, skip: int = 0, limit: int = 10) -> list[Usuario]:
-        """Listar todos os usuários com paginação"""
-        return db.query(Usuario).offset(skip).limit(limit).all()
+    async def obter_usuario_por_email_async(db: AsyncSession, email: str) -> Usuario | None:
+        """Obter usuário por email (sessão async)"""
+        return (await db.execute(select(Usuario).where(Usuario.email == email))).scalars().first()
+    
+    @staticmethod
+    def listar_usuarios(
+        db: Session, limit: int = LIMITE_PADRAO, cursor: str | None = None, skip: int = 0
+    ) -> tuple[list[Usuario], str | None]:
+        """Listar usuários paginando por cursor; retorna (itens, next_cursor). skip é o
+        parâmetro antigo, ainda aceito na primeira página"""
+        query = aplicar_cursor(db.query(Usuario), _ORDEM_USUARIOS, cursor, limit)
+        if skip and not cursor:
+            query = query.offset(skip)
+        return montar_pagina(query.all(), _ORDEM_USUARIOS, limit)
+    
+    @staticmethod
+    def atualizar_usuario(
+        db: Session, usuario_id: int, usuario_data: UsuarioUpdate, senha_hash: str | None = None
+    ) -> Usuario | None:
+        """Atualizar um usuário (senha_hash é o hash de usuario_data.senha)"""
+        stmt = _update_usuario(usuario_id, usuario_data, senha_hash)
+        if stmt is None:
+            return UsuarioController.obter_usuario_por_id(db, usuario_id)
+        return executar_escrita(db, stmt)
     
     @staticmethod
-    def atualizar_usuario(db: Session, usuario_id: int, usuario_data: UsuarioUpdate) -> Usuario | None:
-        """Atualizar um usuário"""
-        db_usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
-        
-        if not db_usuario:
-            return None
-        
-        if usuario_data.nome:
-            db_usuario.nome = usuario_data.nome
-        if usuario_data.email:
-            db_usuario.email = usuario_data.email
-        if usuario_data.senha:
-            db_usuario.senha = pwd_context.hash(usuario_data.senha)
-        
-        db.commit()
-        db.refresh(db_usuario)
-        return db_usuario
+    async def atualizar_usuario_async(
+        db: AsyncSession, usuario_id: int, usuario_data: UsuarioUpdate, senha_hash: str | None = None
+    ) -> Usuario | None:
+        """Atualizar um usuário (sessão async)"""
+        stmt = _update_usuario(usuario_id, usuario_data, senha_hash)
+        if stmt is None:
+            return await db.get(Usuario, usuario_id)
+        return await executar_escrita_async(db, stmt)
     
     @staticmethod
     def deletar_usuario(db: Session, usuario_id: int) -> bool:
-        """Deletar um usuário"""
-        db_usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
-        
-        if not db_usuario:
-            return False
-        
-        db.delete(db_usuario)
-        db.commit()
-        return True
+        """Deletar um usuário (um único DELETE ... RETURNING)"""
+        stmt = delete(Usuario).where(Usuario.id == usuario_id).returning(Usuario.id)
+        return executar_escrita(db, stmt.execution_options(synchronize_session=False)) is not None
     
     @staticmethod
-    def verificar_senha(senha: str, hashed_password: str) -> bool:
+    async def verificar_senha(senha: str, hashed_password: str) -> bool:
         """Verificar se a senha está correta"""
-        return pwd_context.verify(senha, hashed_password)
+        return await verificar_hash(senha, hashed_password)
@@ -0,0 +1,71 @@
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, select
+
+# Migrações versionadas: cada módulo vNNNN_<nome>.py define DESCRICAO e aplicar(conexao).
+# A versão aplicada fica em schema_version; cada migração roda numa transação própria.
+_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _metadata,
+    Column("versao", Integer, primary_key=True),
+    Column("descricao", String(200), nullable=False),
+    Column("aplicada_em", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+_NOME_RE = re.compile(r"^v(\d{4})_\w+$")
+
+
+class EsquemaDesatualizado(RuntimeError):
+    """Banco numa versão anterior à esperada pelo código"""
+
+
+def migracoes() -> list[tuple[int, object]]:
+    """(versão, módulo) de todas as migrações do pacote, em ordem"""
+    encontradas = []
+    for info in pkgutil.iter_modules(__path__):
+        casamento = _NOME_RE.match(info.name)
+        if casamento:
+            encontradas.append((int(casamento.group(1)), importlib.import_module(f"{__name__}.{info.name}")))
+    return sorted(encontradas, key=lambda item: item[0])
+
+
+def versao_esperada() -> int:
+    todas = migracoes()
+    return todas[-1][0] if todas else 0
+
+
+def versao_atual(engine) -> int:
+    """Versão aplicada no banco (0 se schema_version ainda não existe)"""
+    with engine.connect() as conexao:
+        if not engine.dialect.has_table(conexao, schema_version.name):
+            return 0
+        return conexao.execute(select(func.max(schema_version.c.versao))).scalar() or 0
+
+
+def migrar(engine, alvo: int | None = None, log=print) -> list[int]:
+    """Aplicar as migrações pendentes até alvo (padrão: a última); retorna as aplicadas"""
+    _metadata.create_all(engine)
+    atual = versao_atual(engine)
+    aplicadas = []
+    for versao, modulo in migracoes():
+        if versao <= atual or (alvo is not None and versao > alvo):
+            continue
+        log(f"Aplicando {versao:04d}: {modulo.DESCRICAO}")
+        with engine.begin() as conexao:
+            modulo.aplicar(conexao)
+            conexao.execute(insert(schema_version).values(versao=versao, descricao=modulo.DESCRICAO))
+        aplicadas.append(versao)
+    return aplicadas
+
+
+def verificar(engine):
+    """Checagem barata para a inicialização: um SELECT na schema_version"""
+    atual, esperada = versao_atual(engine), versao_esperada()
+    if atual < esperada:
+        raise EsquemaDesatualizado(
+            f"Banco na versão {atual}, código espera {esperada}: rode `python migracoes.py upgrade`"
+        )
+    return atual
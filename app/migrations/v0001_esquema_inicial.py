@@ -0,0 +1,64 @@
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, MetaData, String, Table
+
+DESCRICAO = "Esquema inicial (usuarios, drivers, motorcycles, blobs)"
+
+# Cópia congelada do esquema que create_all gerava; bancos existentes só ganham
+# o que faltar (tabelas e índices com checkfirst)
+metadata = MetaData()
+
+Table(
+    "usuarios", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("nome", String(100), nullable=False),
+    Column("email", String(150), unique=True, index=True, nullable=False),
+    Column("senha", String(200), nullable=False),
+)
+
+Table(
+    "drivers", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("nome", String(100), nullable=False),
+    Column("email", String(150), unique=True, index=True, nullable=False),
+    Column("cpf", String(14), unique=True, nullable=False),
+    Column("phone", String(20), nullable=False),
+    Column("password", String(200), nullable=False),
+    Column("profile_image", String(64), nullable=True),
+    Column("rg_images", String(200), nullable=True),
+    Column("address_proof", String(500), nullable=True),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+    Index("ix_drivers_created_at_id", "created_at", "id"),
+    Index("ix_drivers_is_active_created_at_id", "is_active", "created_at", "id"),
+)
+
+Table(
+    "motorcycles", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("driver_id", Integer, nullable=False),
+    Column("brand", String(100), nullable=True),
+    Column("model", String(100), nullable=True),
+    Column("year", String(4), nullable=True),
+    Column("plate", String(20), unique=True, nullable=True),
+    Column("image", String(64), nullable=True),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "blobs", metadata,
+    Column("hash", String(64), primary_key=True),
+    Column("tamanho", Integer, nullable=False),
+    Column("content_type", String(100), nullable=False),
+    Column("refs", Integer, nullable=False),
+    Column("created_at", DateTime),
+)
+
+
+def aplicar(conexao):
+    metadata.create_all(conexao, checkfirst=True)
+    # create_all não cria índices em tabelas que já existiam
+    for tabela in metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(conexao, checkfirst=True)
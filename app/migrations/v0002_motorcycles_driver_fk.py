@@ -0,0 +1,49 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, text
+
+DESCRICAO = "Índice e chave estrangeira em motorcycles.driver_id"
+
+_COLUNAS = "id, driver_id, brand, model, year, plate, image, is_active, created_at, updated_at"
+
+# SQLite não tem ALTER TABLE ... ADD CONSTRAINT: a tabela é recriada com a FK
+metadata = MetaData()
+Table("drivers", metadata, Column("id", Integer, primary_key=True))  # só para resolver a FK
+motorcycles_nova = Table(
+    "motorcycles_nova", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("driver_id", Integer, ForeignKey("drivers.id", name="fk_motorcycles_driver_id"), nullable=False),
+    Column("brand", String(100), nullable=True),
+    Column("model", String(100), nullable=True),
+    Column("year", String(4), nullable=True),
+    Column("plate", String(20), unique=True, nullable=True),
+    Column("image", String(64), nullable=True),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+
+def _checar_orfas(conexao):
+    """Motos apontando para drivers inexistentes impediriam a FK"""
+    orfas = conexao.execute(text(
+        "SELECT m.id FROM motorcycles m LEFT JOIN drivers d ON d.id = m.driver_id WHERE d.id IS NULL"
+    )).scalars().all()
+    if orfas:
+        raise RuntimeError(
+            f"Motocicletas sem driver (ids {orfas[:20]}): corrija ou remova antes de migrar"
+        )
+
+
+def aplicar(conexao):
+    _checar_orfas(conexao)
+    if conexao.dialect.name == "sqlite":
+        motorcycles_nova.create(conexao)
+        conexao.execute(text(f"INSERT INTO motorcycles_nova ({_COLUNAS}) SELECT {_COLUNAS} FROM motorcycles"))
+        conexao.execute(text("DROP TABLE motorcycles"))
+        conexao.execute(text("ALTER TABLE motorcycles_nova RENAME TO motorcycles"))
+        conexao.execute(text("CREATE INDEX ix_motorcycles_id ON motorcycles (id)"))
+    else:
+        conexao.execute(text(
+            "ALTER TABLE motorcycles ADD CONSTRAINT fk_motorcycles_driver_id "
+            "FOREIGN KEY (driver_id) REFERENCES drivers (id)"
+        ))
+    conexao.execute(text("CREATE INDEX ix_motorcycles_driver_id ON motorcycles (driver_id)"))
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, text
+
+DESCRICAO = "Posições dos drivers (driver_positions) e índice em drivers.updated_at"
+
+metadata = MetaData()
+Table("drivers", metadata, Column("id", Integer, primary_key=True))  # só para resolver a FK
+driver_positions = Table(
+    "driver_positions", metadata,
+    Column("driver_id", Integer, ForeignKey("drivers.id", name="fk_driver_positions_driver_id"), primary_key=True),
+    Column("lat", Float, nullable=False),
+    Column("lon", Float, nullable=False),
+    Column("vehicle_type", String(20), nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Index("ix_driver_positions_updated_at", "updated_at"),
+)
+
+
+def aplicar(conexao):
+    driver_positions.create(conexao)
+    conexao.execute(text("CREATE INDEX ix_drivers_updated_at ON drivers (updated_at)"))
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, Table
+
+DESCRICAO = "Histórico de pings de GPS (driver_locations)"
+
+metadata = MetaData()
+driver_locations = Table(
+    "driver_locations", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("driver_id", Integer, nullable=False),
+    Column("lat", Float, nullable=False),
+    Column("lon", Float, nullable=False),
+    Column("speed", Float),
+    Column("heading", Float),
+    Column("accuracy", Float),
+    Column("recorded_at", DateTime, nullable=False),
+    Index("ix_driver_locations_driver_id_recorded_at", "driver_id", "recorded_at"),
+)
+
+
+def aplicar(conexao):
+    driver_locations.create(conexao)
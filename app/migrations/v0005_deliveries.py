@@ -0,0 +1,26 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table
+
+DESCRICAO = "Entregas (deliveries) para o despacho em lote"
+
+metadata = MetaData()
+Table("drivers", metadata, Column("id", Integer, primary_key=True))  # só para resolver a FK
+deliveries = Table(
+    "deliveries", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("pickup_lat", Float, nullable=False),
+    Column("pickup_lon", Float, nullable=False),
+    Column("dropoff_lat", Float, nullable=False),
+    Column("dropoff_lon", Float, nullable=False),
+    Column("vehicle_type", String(20)),
+    Column("status", String(20), nullable=False),
+    Column("driver_id", Integer, ForeignKey("drivers.id", name="fk_deliveries_driver_id")),
+    Column("assigned_at", DateTime),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime),
+    Index("ix_deliveries_status_created_at", "status", "created_at"),
+    Index("ix_deliveries_driver_id_status", "driver_id", "status"),
+)
+
+
+def aplicar(conexao):
+    deliveries.create(conexao)
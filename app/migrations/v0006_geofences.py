@@ -0,0 +1,49 @@
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text
+)
+
+DESCRICAO = "Zonas por entrega (geofences), eventos de entrada/saída e índice de deliveries.updated_at"
+
+metadata = MetaData()
+deliveries = Table(
+    "deliveries", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("updated_at", DateTime),
+)
+geofences = Table(
+    "geofences", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("delivery_id", Integer, ForeignKey("deliveries.id", name="fk_geofences_delivery_id")),
+    Column("kind", String(20), nullable=False),
+    Column("shape", String(10), nullable=False),
+    Column("lat", Float),
+    Column("lon", Float),
+    Column("radius_m", Float),
+    Column("polygon", Text),
+    Column("active", Boolean, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime),
+    Index("ix_geofences_delivery_id", "delivery_id"),
+    Index("ix_geofences_updated_at", "updated_at"),
+)
+geofence_events = Table(
+    "geofence_events", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("geofence_id", Integer, ForeignKey("geofences.id", name="fk_geofence_events_geofence_id"), nullable=False),
+    Column("delivery_id", Integer),
+    Column("driver_id", Integer, nullable=False),
+    Column("event", String(10), nullable=False),
+    Column("lat", Float, nullable=False),
+    Column("lon", Float, nullable=False),
+    Column("occurred_at", DateTime, nullable=False),
+    Index("ix_geofence_events_delivery_id_occurred_at", "delivery_id", "occurred_at"),
+    Index("ix_geofence_events_geofence_id_driver_id", "geofence_id", "driver_id"),
+)
+# Sincronização das zonas: entregas que mudaram de status desde a última leitura
+ix_deliveries_updated_at = Index("ix_deliveries_updated_at", deliveries.c.updated_at)
+
+
+def aplicar(conexao):
+    geofences.create(conexao)
+    geofence_events.create(conexao)
+    ix_deliveries_updated_at.create(conexao)
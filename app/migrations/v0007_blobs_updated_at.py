@@ -0,0 +1,9 @@
+from sqlalchemy import text
+
+DESCRICAO = "blobs.updated_at (última mudança de refs) e índice da limpeza de órfãos"
+
+
+def aplicar(conexao):
+    conexao.execute(text("ALTER TABLE blobs ADD COLUMN updated_at TIMESTAMP"))
+    conexao.execute(text("UPDATE blobs SET updated_at = created_at"))
+    conexao.execute(text("CREATE INDEX ix_blobs_refs_updated_at ON blobs (refs, updated_at)"))
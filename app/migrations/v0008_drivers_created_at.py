@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import DateTime, column, func, literal, table, update
+
+DESCRICAO = "drivers.created_at preenchido nas linhas antigas (chave do cursor da listagem)"
+
+# Só as colunas usadas: o tipo DateTime grava no mesmo formato do ORM, que é o que o
+# cursor compara
+drivers = table("drivers", column("created_at", DateTime), column("updated_at", DateTime))
+
+
+def aplicar(conexao):
+    # Sem created_at, a chave do cursor tem um nulo e a página seguinte não decodifica
+    conexao.execute(
+        update(drivers)
+        .where(drivers.c.created_at.is_(None))
+        .values(created_at=func.coalesce(drivers.c.updated_at, literal(datetime.utcnow(), DateTime)))
+    )
@@ -1,5 +1,8 @@
 from .usuario import Usuario
-from .driver import Driver, Motorcycle
+from .driver import Driver, Motorcycle, DriverPosition, DriverLocation
+from .blob import Blob
+from .delivery import Delivery
+from .geofence import Geofence, GeofenceEvent
 from .schemas import UsuarioCreate, UsuarioUpdate, Usuario as UsuarioSchema
 
-__all__ = ["Usuario", "Driver", "Motorcycle", "UsuarioCreate", "UsuarioUpdate", "UsuarioSchema"]
+__all__ = ["Usuario", "Driver", "Motorcycle", "DriverPosition", "DriverLocation", "Blob", "Delivery", "Geofence", "GeofenceEvent", "UsuarioCreate", "UsuarioUpdate", "UsuarioSchema"]
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from app.config.database import Base
+from datetime import datetime
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    # SHA-256 (hex) do conteúdo; o arquivo fica em BLOB_DIR/<hash[:2]>/<hash>
+    hash = Column(String(64), primary_key=True)
+    tamanho = Column(Integer, nullable=False)
+    content_type = Column(String(100), nullable=False, default="application/octet-stream")
+    
+    # Número de colunas (drivers/motorcycles) apontando para este blob
+    refs = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Última mudança de refs: a limpeza só apaga órfãos sem referência há BLOBS_CARENCIA_S
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_blobs_refs_updated_at", "refs", "updated_at"),
+    )
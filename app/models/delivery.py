@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index, ForeignKey
+from app.config.database import Base
+from datetime import datetime
+
+# Ciclo de vida: open -> assigned (despacho) -> picked_up -> delivered; cancelled antes de entregue
+STATUS_ENTREGA = ("open", "assigned", "picked_up", "delivered", "cancelled")
+# Entregas que ocupam o driver (ele não entra no próximo despacho)
+STATUS_EM_ANDAMENTO = ("assigned", "picked_up")
+# Status novo -> status de onde se pode chegar nele (POST /deliveries/{id}/status)
+TRANSICOES = {
+    "picked_up": ("assigned",),
+    "delivered": ("picked_up",),
+    "cancelled": ("open", "assigned", "picked_up"),
+}
+# Os que o próprio driver atribuído pode aplicar; os demais só operadores
+STATUS_DO_DRIVER = ("picked_up", "delivered")
+
+
+class Delivery(Base):
+    """Entrega com coleta e destino, atribuída em lote pelo despacho (ver app/services/despacho.py)"""
+    __tablename__ = "deliveries"
+
+    id = Column(Integer, primary_key=True)
+    pickup_lat = Column(Float, nullable=False)
+    pickup_lon = Column(Float, nullable=False)
+    dropoff_lat = Column(Float, nullable=False)
+    dropoff_lon = Column(Float, nullable=False)
+    vehicle_type = Column(String(20), nullable=True)  # None: qualquer veículo
+    status = Column(String(20), nullable=False, default="open")
+    driver_id = Column(Integer, ForeignKey("drivers.id", name="fk_deliveries_driver_id"), nullable=True)
+    assigned_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Fila do despacho (status='open' por created_at), entregas em andamento por driver
+    # e sincronização das zonas (geofences) das entregas que mudaram
+    __table_args__ = (
+        Index("ix_deliveries_status_created_at", "status", "created_at"),
+        Index("ix_deliveries_driver_id_status", "driver_id", "status"),
+        Index("ix_deliveries_updated_at", "updated_at"),
+    )
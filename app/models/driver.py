@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Boolean, Float, Index, ForeignKey
+from sqlalchemy.orm import deferred
 from app.config.database import Base
 from datetime import datetime
 
@@ -12,11 +13,12 @@ class Driver(Base):
     phone = Column(String(20), nullable=False)
     password = Column(String(200), nullable=False)
     
-    # Imagem de perfil armazenada como base64 ou URL
-    profile_image = Column(String(5000), nullable=True)
+    # Colunas de imagem ficam no grupo "imagens", carregado só quando pedido
+    # Imagem de perfil: hash SHA-256 do blob (ver app/services/blobs.py)
+    profile_image = deferred(Column(String(64), nullable=True), group="imagens")
     
     # RG
-    rg_images = Column(String(10000), nullable=True)  # JSON com URLs/base64
+    rg_images = deferred(Column(String(200), nullable=True), group="imagens")  # JSON com a lista de hashes
     
     # Endereço
     address_proof = Column(String(500), nullable=True)
@@ -26,12 +28,20 @@ class Driver(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Índices da listagem paginada por (created_at, id), com e sem filtro de status;
+    # updated_at: sincronização incremental do índice de posições entre workers
+    __table_args__ = (
+        Index("ix_drivers_created_at_id", "created_at", "id"),
+        Index("ix_drivers_is_active_created_at_id", "is_active", "created_at", "id"),
+        Index("ix_drivers_updated_at", "updated_at"),
+    )
+
 
 class Motorcycle(Base):
     __tablename__ = "motorcycles"
 
     id = Column(Integer, primary_key=True, index=True)
-    driver_id = Column(Integer, nullable=False)
+    driver_id = Column(Integer, ForeignKey("drivers.id", name="fk_motorcycles_driver_id"), nullable=False, index=True)
     
     # Informações da moto
     brand = Column(String(100), nullable=True)
@@ -39,10 +49,45 @@ class Motorcycle(Base):
     year = Column(String(4), nullable=True)
     plate = Column(String(20), unique=True, nullable=True)
     
-    # Imagem da moto armazenada como base64 ou URL
-    image = Column(String(5000), nullable=True)
+    # Imagem da moto: hash SHA-256 do blob (carregada só quando pedida)
+    image = deferred(Column(String(64), nullable=True), group="imagens")
     
     # Status
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DriverPosition(Base):
+    """Última posição conhecida de cada driver (ver app/services/posicoes.py)"""
+    __tablename__ = "driver_positions"
+
+    driver_id = Column(
+        Integer, ForeignKey("drivers.id", name="fk_driver_positions_driver_id"), primary_key=True
+    )
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    vehicle_type = Column(String(20), nullable=False, default="moto")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
+
+
+class DriverLocation(Base):
+    """Histórico de pings de GPS, gravado em lote (ver app/services/localizacao.py).
+
+    Sem FK em driver_id: é uma tabela só de inserção, com milhares de linhas por
+    transação, e o driver_id vem do token.
+    """
+    __tablename__ = "driver_locations"
+
+    id = Column(Integer, primary_key=True)
+    driver_id = Column(Integer, nullable=False)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    speed = Column(Float)  # m/s
+    heading = Column(Float)  # graus
+    accuracy = Column(Float)  # metros
+    recorded_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_driver_locations_driver_id_recorded_at", "driver_id", "recorded_at"),
+    )
@@ -0,0 +1,50 @@
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
+from app.config.database import Base
+from datetime import datetime
+
+FORMAS_CERCA = ("circle", "polygon")
+EVENTOS_CERCA = ("enter", "exit", "dwell")
+
+
+class Geofence(Base):
+    """Zona de uma entrega (coleta, destino ou outra) para detectar chegada e saída
+    do driver (ver app/services/cercas.py); sem entrega, vale para qualquer driver"""
+    __tablename__ = "geofences"
+
+    id = Column(Integer, primary_key=True)
+    delivery_id = Column(Integer, ForeignKey("deliveries.id", name="fk_geofences_delivery_id"), nullable=True)
+    kind = Column(String(20), nullable=False)  # pickup, dropoff ou livre
+    shape = Column(String(10), nullable=False)  # circle ou polygon
+    lat = Column(Float, nullable=True)  # centro (circle)
+    lon = Column(Float, nullable=True)
+    radius_m = Column(Float, nullable=True)
+    polygon = Column(Text, nullable=True)  # JSON [[lat, lon], ...] (polygon)
+    active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Sincronização incremental das zonas em memória
+    __table_args__ = (
+        Index("ix_geofences_delivery_id", "delivery_id"),
+        Index("ix_geofences_updated_at", "updated_at"),
+    )
+
+
+class GeofenceEvent(Base):
+    """Entrada, saída ou permanência de um driver numa zona"""
+    __tablename__ = "geofence_events"
+
+    id = Column(Integer, primary_key=True)
+    geofence_id = Column(Integer, ForeignKey("geofences.id", name="fk_geofence_events_geofence_id"), nullable=False)
+    delivery_id = Column(Integer, nullable=True)
+    driver_id = Column(Integer, nullable=False)
+    event = Column(String(10), nullable=False)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    occurred_at = Column(DateTime, nullable=False)
+
+    # Histórico de uma entrega e último evento de cada (zona, driver) ao retomar o estado
+    __table_args__ = (
+        Index("ix_geofence_events_delivery_id_occurred_at", "delivery_id", "occurred_at"),
+        Index("ix_geofence_events_geofence_id_driver_id", "geofence_id", "driver_id"),
+    )
@@ -1,6 +1,10 @@
-from pydantic import BaseModel
+from pydantic import (
+    BaseModel, BeforeValidator, ConfigDict, Field, RootModel, create_model, field_validator, model_validator
+)
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+import json
+from typing import Annotated, Optional
 
 # ===== USUARIO =====
 class UsuarioBase(BaseModel):
@@ -36,12 +40,15 @@ class DriverUpdate(BaseModel):
     email: str | None = None
     phone: str | None = None
     address_proof: str | None = None
-    profile_image: str | None = None
-    rg_images: str | None = None
+    # profile_image e rg_images só mudam pelos uploads (que contam as referências dos blobs)
+
+# is_active nulo (linhas antigas) conta como ativo, como na autenticação; no tipo
+# (e não num field_validator) para valer também nos schemas parciais de ?fields=
+AtivoLegado = Annotated[bool, BeforeValidator(lambda valor: True if valor is None else valor)]
 
 class Driver(DriverBase):
     id: int
-    is_active: bool
+    is_active: AtivoLegado
     created_at: datetime
     updated_at: datetime
     profile_image: str | None = None
@@ -78,7 +85,7 @@ class MotorcycleUpdate(BaseModel):
     model: str | None = None
     year: str | None = None
     plate: str | None = None
-    image: str | None = None
+    # image só muda pelo upload (POST /driver/vehicle)
 
 class Motorcycle(MotorcycleBase):
     id: int
@@ -91,6 +98,168 @@ class Motorcycle(MotorcycleBase):
     class Config:
         from_attributes = True
 
+# ===== PAGINAÇÃO =====
+class ListaUsuarios(RootModel[list[Usuario]]):
+    """GET /usuarios/ continua devolvendo uma lista; o cursor vai no cabeçalho X-Next-Cursor"""
+
+class PaginaDrivers(BaseModel):
+    items: list[Driver]
+    next_cursor: str | None = None
+
+# ===== POSIÇÕES =====
+class DriverPositionUpdate(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    vehicle_type: str = Field("moto", min_length=1, max_length=20, pattern="^[a-z_]+$")
+
+class DriverPosition(BaseModel):
+    driver_id: int
+    lat: float
+    lon: float
+    vehicle_type: str
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class LocationPing(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    recorded_at: Optional[datetime] = None  # omitido: hora do recebimento
+    speed: Optional[float] = Field(None, ge=0)  # m/s
+    heading: Optional[float] = Field(None, ge=0, le=360)  # graus
+    accuracy: Optional[float] = Field(None, ge=0)  # metros
+
+class DriverProximo(DriverPosition):
+    distance_m: float
+
+class DriversProximos(BaseModel):
+    items: list[DriverProximo]
+
+# ===== ENTREGAS =====
+class DeliveryCreate(BaseModel):
+    pickup_lat: float = Field(ge=-90, le=90)
+    pickup_lon: float = Field(ge=-180, le=180)
+    dropoff_lat: float = Field(ge=-90, le=90)
+    dropoff_lon: float = Field(ge=-180, le=180)
+    vehicle_type: Optional[str] = Field(None, min_length=1, max_length=20, pattern="^[a-z_]+$")
+
+class Delivery(DeliveryCreate):
+    id: int
+    status: str
+    driver_id: Optional[int] = None
+    assigned_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class DeliveryStatusUpdate(BaseModel):
+    status: str = Field(pattern="^(picked_up|delivered|cancelled)$")
+
+class Atribuicao(BaseModel):
+    delivery_id: int
+    driver_id: int
+    distance_m: float
+
+class ResultadoDespacho(BaseModel):
+    assignments: list[Atribuicao]
+    open_deliveries: int
+    available_drivers: int
+    seconds: float
+
+# ===== CERCAS (GEOFENCES) =====
+class CercaCreate(BaseModel):
+    """Círculo (lat, lon, radius_m) ou polígono ([[lat, lon], ...], sem repetir o primeiro vértice)"""
+    kind: str = Field("custom", min_length=1, max_length=20, pattern="^[a-z_]+$")
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
+    radius_m: Optional[float] = Field(None, gt=0, le=5000)
+    polygon: Optional[list[tuple[float, float]]] = Field(None, min_length=3, max_length=100)
+
+    @model_validator(mode="after")
+    def _uma_forma(self):
+        circulo = self.lat is not None and self.lon is not None and self.radius_m is not None
+        if circulo == (self.polygon is not None):
+            raise ValueError("Informe lat, lon e radius_m (círculo) ou polygon")
+        for lat, lon in self.polygon or ():
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError("Vértice fora das coordenadas válidas")
+        return self
+
+class Cerca(BaseModel):
+    id: int
+    delivery_id: Optional[int] = None
+    kind: str
+    shape: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    radius_m: Optional[float] = None
+    polygon: Optional[list[tuple[float, float]]] = None
+    active: bool
+    created_at: datetime
+
+    @field_validator("polygon", mode="before")
+    @classmethod
+    def _polygon_json(cls, valor):
+        return json.loads(valor) if isinstance(valor, str) else valor
+
+    class Config:
+        from_attributes = True
+
+class EventoCerca(BaseModel):
+    id: int
+    geofence_id: int
+    delivery_id: Optional[int] = None
+    driver_id: int
+    event: str  # enter, exit ou dwell
+    lat: float
+    lon: float
+    occurred_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# ===== ROTAS =====
+class PontoRota(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+
+class ParadaRota(PontoRota):
+    id: str = Field(min_length=1, max_length=64)
+    after: Optional[str] = None  # id da parada que precisa vir antes (ex.: a coleta)
+
+class OtimizarRota(BaseModel):
+    start: Optional[PontoRota] = None  # omitido: posição atual do driver
+    stops: Optional[list[ParadaRota]] = None  # omitido: entregas em andamento do driver
+    time_budget_ms: Optional[float] = Field(None, gt=0)
+
+class ParadaOrdenada(ParadaRota):
+    distance_m: float  # desde a parada anterior
+
+class RotaOtimizada(BaseModel):
+    stops: list[ParadaOrdenada]
+    total_distance_m: float
+    initial_distance_m: float  # vizinho mais próximo, antes das melhorias
+    improvements: int
+    seconds: float
+
+# ===== ETA =====
+class PontoEta(BaseModel):
+    lat: float
+    lon: float
+    snap_m: float  # distância até o nó mais próximo do grafo
+
+class DestinoEta(PontoEta):
+    eta_s: Optional[float]  # None: inalcançável ou longe demais do grafo
+
+class EstimativaEta(BaseModel):
+    origin: PontoEta
+    destinations: list[DestinoEta]
+    computed: int  # pares fora do cache
+    seconds: float
+
 # ===== TOKENS =====
 class Token(BaseModel):
     access_token: str
@@ -98,3 +267,18 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: str | None = None
+
+# ===== FIELDSETS PARCIAIS =====
+@lru_cache(maxsize=256)
+def schema_parcial(schema: type[BaseModel], campos: tuple[str, ...]) -> type[BaseModel]:
+    """Criar (e cachear) um schema só com os campos pedidos em ?fields="""
+    definicoes = {
+        nome: (info.annotation, info)
+        for nome, info in schema.model_fields.items()
+        if nome in campos
+    }
+    return create_model(
+        f"{schema.__name__}Parcial",
+        __config__=ConfigDict(from_attributes=True),
+        **definicoes,
+    )
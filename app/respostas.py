@@ -0,0 +1,22 @@
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+import pydantic_core
+
+
+class RespostaJSON(JSONResponse):
+    """JSON serializado pelo núcleo do pydantic (Rust), direto para bytes.
+
+    Um BaseModel vai para bytes sem passar por dict nem pelo json da stdlib;
+    demais conteúdos (dicts já convertidos pelo FastAPI) usam o mesmo serializador.
+    """
+
+    def render(self, content) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return pydantic_core.to_json(content)
+
+
+def resposta_modelo(obj, schema: type[BaseModel], status_code: int = 200) -> RespostaJSON:
+    """Validar obj (ORM ou dict) no schema e responder sem o caminho dict + json.dumps
+    do response_model (que continua declarado na rota para o OpenAPI)"""
+    return RespostaJSON(schema.model_validate(obj), status_code=status_code)
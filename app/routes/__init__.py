@@ -1,5 +1,10 @@
 from .usuario_routes import router as usuario_router
 from .auth_routes import router as auth_router
 from .driver_routes import router as driver_router
+from .blob_routes import router as blob_router
+from .drivers_routes import router as drivers_router
+from .deliveries_routes import router as deliveries_router
+from .rotas_routes import router as rotas_router
+from .eta_routes import router as eta_router
 
-__all__ = ["usuario_router", "auth_router", "driver_router"]
+__all__ = ["usuario_router", "auth_router", "driver_router", "blob_router", "drivers_router", "deliveries_router", "rotas_router", "eta_router"]
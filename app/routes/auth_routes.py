@@ -1,19 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from app.config.database import get_db
+from app.config.database import get_async_db, get_async_read_db
 from app.models.schemas import (
     DriverCreate, DriverUpdate, Driver as DriverSchema,
     DriverLogin, DriverRegisterRequest, Token
 )
 from app.controllers import DriverController
-from app.auth import criar_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, verificar_token
+from app.auth import criar_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.services.consultas import orcamento
+from app.services.hashing import FilaHashCheia
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+def _hashing_indisponivel():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Serviço temporariamente sobrecarregado, tente novamente",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", response_model=DriverSchema)
-def registrar_driver(driver_data: DriverRegisterRequest, db: Session = Depends(get_db)):
+@orcamento(1)
+async def registrar_driver(
+    driver_data: DriverRegisterRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
     """Registrar um novo driver (motorista)"""
     
     # Validar senhas
@@ -23,22 +37,6 @@ def registrar_driver(driver_data: DriverRegisterRequest, db: Session = Depends(g
             detail="As senhas não coincidem"
         )
     
-    # Verificar se email já existe
-    db_driver_email = DriverController.buscar_driver_por_email(db, email=driver_data.email)
-    if db_driver_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email já registrado"
-        )
-    
-    # Verificar se CPF já existe
-    db_driver_cpf = DriverController.buscar_driver_por_cpf(db, cpf=driver_data.cpf)
-    if db_driver_cpf:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="CPF já registrado"
-        )
-    
     # Criar driver
     driver_create = DriverCreate(
         nome=driver_data.name,
@@ -48,15 +46,25 @@ def registrar_driver(driver_data: DriverRegisterRequest, db: Session = Depends(g
         password=driver_data.password
     )
     
-    return DriverController.criar_driver(db=db, driver=driver_create)
+    # Hash no pool de processos, fora do event loop e do threadpool
+    try:
+        senha_hash = await DriverController.hash_senha(driver_data.password)
+    except FilaHashCheia:
+        raise _hashing_indisponivel()
+    
+    # Email/CPF duplicado é detectado pelo próprio INSERT (UNIQUE) e vira 400
+    return await DriverController.criar_driver_async(db=db, driver=driver_create, senha_hash=senha_hash)
 
 
 @router.post("/login", response_model=Token)
-def login_driver(credentials: DriverLogin, db: Session = Depends(get_db)):
+@orcamento(1)
+async def login_driver(credentials: DriverLogin, db: AsyncSession = Depends(get_async_read_db)):
     """Fazer login do driver"""
     
     # Buscar driver por email
-    driver = DriverController.buscar_driver_por_email(db, email=credentials.email)
+    driver = await DriverController.buscar_driver_por_email_async(
+        db, email=credentials.email, campos=("email", "password")
+    )
     if not driver:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,7 +73,11 @@ def login_driver(credentials: DriverLogin, db: Session = Depends(get_db)):
         )
     
     # Verificar senha
-    if not DriverController.verificar_senha(credentials.password, driver.password):
+    try:
+        senha_valida = await DriverController.verificar_senha(credentials.password, driver.password)
+    except FilaHashCheia:
+        raise _hashing_indisponivel()
+    if not senha_valida:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou senha incorretos",
@@ -75,7 +87,7 @@ def login_driver(credentials: DriverLogin, db: Session = Depends(get_db)):
     # Criar token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = criar_access_token(
-        data={"sub": driver.email}, expires_delta=access_token_expires
+        data={"sub": driver.email, "id": driver.id}, expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
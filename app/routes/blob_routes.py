@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.config.database import get_read_db
+from app.services import blobs
+
+router = APIRouter(prefix="/blobs", tags=["blobs"])
+
+# Conteúdo endereçado por hash nunca muda: pode ficar em cache indefinidamente
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _parse_range(header: str, tamanho: int) -> tuple[int, int] | None:
+    """Interpretar um header Range de intervalo único; None se inválido"""
+    unidade, _, intervalo = header.partition("=")
+    if unidade.strip() != "bytes":
+        return None
+    inicio_str, _, fim_str = intervalo.strip().partition("-")
+    try:
+        if not inicio_str:
+            # bytes=-N: os últimos N bytes
+            sufixo = int(fim_str)
+            if sufixo <= 0:
+                return None
+            return max(tamanho - sufixo, 0), tamanho - 1
+        inicio = int(inicio_str)
+        fim = int(fim_str) if fim_str else tamanho - 1
+    except ValueError:
+        return None
+    if inicio > fim:
+        return None
+    return inicio, min(fim, tamanho - 1)
+
+
+@router.get("/{hash_blob}")
+def obter_blob(hash_blob: str, request: Request, db: Session = Depends(get_read_db)):
+    """Servir um blob com ETag forte e suporte a Range"""
+    blob = blobs.obter(db, hash_blob)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    etag = f'"{blob.hash}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    tamanho = blob.tamanho
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # Múltiplos intervalos não são suportados: responder com o arquivo inteiro
+    if range_header and "," not in range_header and (not if_range or if_range.strip() == etag):
+        intervalo = _parse_range(range_header, tamanho)
+        if intervalo is None or intervalo[0] >= tamanho:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{tamanho}"},
+            )
+        inicio, fim = intervalo
+        headers["Content-Range"] = f"bytes {inicio}-{fim}/{tamanho}"
+        headers["Content-Length"] = str(fim - inicio + 1)
+        return StreamingResponse(
+            blobs.ler_intervalo(blob.hash, inicio, fim),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=blob.content_type,
+            headers=headers,
+        )
+
+    headers["Content-Length"] = str(tamanho)
+    return StreamingResponse(
+        blobs.ler_intervalo(blob.hash, 0, tamanho - 1),
+        media_type=blob.content_type,
+        headers=headers,
+    )
@@ -0,0 +1,137 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import get_async_db, get_async_read_db
+from app.models.delivery import STATUS_DO_DRIVER
+from app.models.schemas import (
+    Cerca, CercaCreate, Delivery, DeliveryCreate, DeliveryStatusUpdate, EventoCerca, ResultadoDespacho
+)
+from app.controllers import DeliveryController, GeofenceController
+from app.auth import Principal, current_admin_async, current_principal_async
+from app.respostas import RespostaJSON, resposta_modelo
+from app.services import cercas, despacho
+from app.services.consultas import orcamento
+
+# Entregas e despacho em lote (ver app/services/despacho.py). Abrir, despachar e
+# cancelar são dos operadores (ADMIN_EMAILS), assim como criar zonas; coleta e
+# entrega, do driver atribuído, que também vê a entrega, as zonas e os eventos dela
+router = APIRouter(prefix="/deliveries", tags=["deliveries"])
+
+
+async def _entrega_do_driver_ou_operador(db: AsyncSession, delivery_id: int, principal: Principal):
+    """A entrega, se o principal for o driver atribuído a ela ou um operador"""
+    entrega = await DeliveryController.buscar_entrega_async(db, delivery_id)
+    if entrega is None:
+        raise HTTPException(status_code=404, detail="Entrega não encontrada")
+    if not principal.admin and entrega.driver_id != principal.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Entrega atribuída a outro driver")
+    return entrega
+
+
+@router.post("", response_model=Delivery, status_code=status.HTTP_201_CREATED)
+@orcamento(3)
+async def criar_entrega(
+    entrega: DeliveryCreate,
+    principal: Principal = Depends(current_admin_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Abrir uma entrega (com zonas de chegada na coleta e no destino); o próximo
+    despacho atribui um driver"""
+    criada = await DeliveryController.criar_entrega_async(db, entrega, cercas.cercas_da_entrega(entrega))
+    return resposta_modelo(criada, Delivery, status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/dispatch", response_model=ResultadoDespacho)
+@orcamento(5)
+async def despachar_agora(principal: Principal = Depends(current_admin_async)):
+    """Rodar uma rodada de despacho agora, sem esperar a janela"""
+    return RespostaJSON(await despacho.despachar())
+
+
+@router.get("/{delivery_id}", response_model=Delivery)
+@orcamento(3)
+async def obter_entrega(
+    delivery_id: int,
+    principal: Principal = Depends(current_principal_async),
+    leitura: AsyncSession = Depends(get_async_read_db)
+):
+    """Status e driver atribuído (driver atribuído ou operadores)"""
+    entrega = await _entrega_do_driver_ou_operador(leitura, delivery_id, principal)
+    return resposta_modelo(entrega, Delivery)
+
+
+@router.post("/{delivery_id}/status", response_model=Delivery)
+@orcamento(3)
+async def mudar_status(
+    delivery_id: int,
+    mudanca: DeliveryStatusUpdate,
+    principal: Principal = Depends(current_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Avançar a entrega: assigned -> picked_up -> delivered (driver atribuído) ou
+    cancelled antes de entregue (operadores). Entregue ou cancelada, o driver volta
+    para o próximo despacho"""
+    if not principal.admin and mudanca.status not in STATUS_DO_DRIVER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Restrito a operadores")
+    driver_id = None if principal.admin else principal.id
+    alterada = await DeliveryController.mudar_status_async(db, delivery_id, mudanca.status, driver_id)
+    if alterada is not None:
+        return resposta_modelo(alterada, Delivery)
+    # Nada mudou: descobrir o motivo só no caminho de erro
+    entrega = await DeliveryController.buscar_entrega_async(db, delivery_id)
+    if entrega is None:
+        raise HTTPException(status_code=404, detail="Entrega não encontrada")
+    if driver_id is not None and entrega.driver_id != driver_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Entrega atribuída a outro driver")
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Transição inválida: {entrega.status} -> {mudanca.status}"
+    )
+
+
+@router.post("/{delivery_id}/geofences", response_model=Cerca, status_code=status.HTTP_201_CREATED)
+@orcamento(4)
+async def criar_cerca(
+    delivery_id: int,
+    cerca: CercaCreate,
+    principal: Principal = Depends(current_admin_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Registrar mais uma zona (círculo ou polígono) para a entrega"""
+    if await DeliveryController.buscar_entrega_async(db, delivery_id) is None:
+        raise HTTPException(status_code=404, detail="Entrega não encontrada")
+    valores = {
+        "kind": cerca.kind, "shape": "circle" if cerca.polygon is None else "polygon",
+        "lat": cerca.lat, "lon": cerca.lon, "radius_m": cerca.radius_m,
+        "polygon": None if cerca.polygon is None else json.dumps(cerca.polygon),
+    }
+    criada = await GeofenceController.criar_cerca_async(db, delivery_id, valores)
+    return resposta_modelo(criada, Cerca, status_code=status.HTTP_201_CREATED)
+
+
+@router.get("/{delivery_id}/geofences", response_model=list[Cerca])
+@orcamento(3)
+async def listar_cercas(
+    delivery_id: int,
+    principal: Principal = Depends(current_principal_async),
+    leitura: AsyncSession = Depends(get_async_read_db)
+):
+    """Zonas da entrega (driver atribuído ou operadores)"""
+    await _entrega_do_driver_ou_operador(leitura, delivery_id, principal)
+    zonas = await GeofenceController.listar_cercas_da_entrega_async(leitura, delivery_id)
+    return RespostaJSON([Cerca.model_validate(zona) for zona in zonas])
+
+
+@router.get("/{delivery_id}/geofence-events", response_model=list[EventoCerca])
+@orcamento(3)
+async def listar_eventos_cercas(
+    delivery_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    principal: Principal = Depends(current_principal_async),
+    leitura: AsyncSession = Depends(get_async_read_db)
+):
+    """Chegadas, saídas e permanências do driver nas zonas da entrega, em ordem
+    (driver atribuído ou operadores)"""
+    await _entrega_do_driver_ou_operador(leitura, delivery_id, principal)
+    eventos = await GeofenceController.listar_eventos_da_entrega_async(leitura, delivery_id, limit)
+    return RespostaJSON([EventoCerca.model_validate(evento) for evento in eventos])
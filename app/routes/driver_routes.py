@@ -1,198 +1,456 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.config.database import get_db
+from app.config.database import get_db, get_read_db, get_async_db, get_async_read_db
 from app.models.schemas import (
-    DriverUpdate, Driver as DriverSchema,
-    MotorcycleCreate, MotorcycleUpdate, Motorcycle as MotorcycleSchema
+    DriverUpdate, Driver as DriverSchema, PaginaDrivers,
+    MotorcycleCreate, MotorcycleUpdate, Motorcycle as MotorcycleSchema,
+    DriverPositionUpdate, DriverPosition as DriverPositionSchema, LocationPing, schema_parcial
 )
-from app.controllers import DriverController, MotorcycleController
-from app.auth import verificar_token
-import base64
-from io import BytesIO
+from app.controllers import DriverController, MotorcycleController, PosicaoController
+from app.respostas import RespostaJSON, resposta_modelo
+from app.auth import Principal, current_principal, current_principal_async
+from app.services import blobs, condicional, imagens, derivados, localizacao, posicoes
+from app.services.consultas import orcamento
+from app.services.paginacao import CursorInvalido, LIMITE_PADRAO, LIMITE_MAXIMO
+from datetime import datetime
+import json
 
 router = APIRouter(prefix="/driver", tags=["driver"])
 
+FIELDS_DESCRICAO = "Campos separados por vírgula (ex.: id,nome,email); omitido retorna todos"
+
+
+def _campos(fields: str | None, schema) -> tuple[str, ...] | None:
+    """Interpretar ?fields=a,b,c e validar contra o schema"""
+    if not fields:
+        return None
+    campos = tuple(sorted({campo.strip() for campo in fields.split(",") if campo.strip()}))
+    invalidos = [campo for campo in campos if campo not in schema.model_fields]
+    if invalidos or not campos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos inválidos: {', '.join(invalidos) or fields}"
+        )
+    return campos
+
+
+def _resposta(obj, schema, campos: tuple[str, ...] | None):
+    """Serializar no schema completo ou, com campos, só no subconjunto pedido"""
+    return resposta_modelo(obj, schema if campos is None else schema_parcial(schema, campos))
+
+
+def _ler_condicional(request: Request, prefixo: str, buscar_versao, buscar, schema,
+                     campos: tuple[str, ...] | None, nao_encontrado: str):
+    """GET com ETag/Last-Modified. Com If-None-Match/If-Modified-Since consulta só
+    (id, updated_at) e responde 304 sem carregar o registro"""
+    if condicional.tem_condicao(request):
+        versao = buscar_versao()
+        if not versao:
+            raise HTTPException(status_code=404, detail=nao_encontrado)
+        etag = condicional.etag(prefixo, versao.id, versao.updated_at, campos)
+        if condicional.nao_modificado(request, etag, versao.updated_at):
+            return condicional.resposta_304(etag, versao.updated_at)
+
+    # id e updated_at sempre carregados: são os validadores
+    obj = buscar(tuple(sorted({*campos, "id", "updated_at"})) if campos else None)
+    if not obj:
+        raise HTTPException(status_code=404, detail=nao_encontrado)
+    resposta = _resposta(obj, schema, campos)
+    resposta.headers.update(
+        condicional.cabecalhos(condicional.etag(prefixo, obj.id, obj.updated_at, campos), obj.updated_at)
+    )
+    return resposta
+
+
+def _com_etag(resposta: Response, prefixo: str, obj) -> Response:
+    """Validadores da nova versão depois de um PUT"""
+    etag = condicional.etag(prefixo, obj.id, obj.updated_at)
+    resposta.headers.update(condicional.cabecalhos(etag, obj.updated_at))
+    return resposta
+
+
+def _precondicao_falhou():
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="O recurso foi alterado desde a última leitura (If-Match)"
+    )
+
+
+async def _receber_imagem(file: UploadFile, tipo: str) -> bytes:
+    """Receber upload limitado por tamanho e normalizar; erros viram 413/415"""
+    try:
+        return await imagens.processar_upload(file, tipo)
+    except imagens.ImagemMuitoGrande:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Arquivo excede o limite de {imagens.LIMITES[tipo][0] // (1024 * 1024)} MB"
+        )
+    except imagens.ImagemInvalida:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Arquivo não é uma imagem válida (JPEG, PNG, WebP ou GIF)"
+        )
+
+
+async def _servir_derivado(request: Request, hash_origem: str | None, w: int, fmt: str) -> Response:
+    """Responder com a miniatura da imagem (cacheada em memória/disco)"""
+    if not blobs.hash_valido(hash_origem):
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+
+    largura = derivados.largura_permitida(w)
+    etag = derivados.etag(hash_origem, largura, fmt)
+    # URL por driver: a imagem pode mudar, então revalidar com ETag após pouco tempo
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        conteudo = await derivados.obter(hash_origem, largura, fmt)
+    except imagens.ImagemInvalida:
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    return Response(content=conteudo, media_type=imagens.content_type(fmt), headers=headers)
+
+
 # ===== DRIVER ENDPOINTS =====
 
 @router.get("/me", response_model=DriverSchema)
-def obter_meu_perfil(email: str = Depends(verificar_token), db: Session = Depends(get_db)):
-    """Obter dados do driver logado"""
-    driver = DriverController.buscar_driver_por_email(db, email=email)
-    if not driver:
+@orcamento(3)
+def obter_meu_perfil(
+    request: Request,
+    fields: str | None = Query(None, description=FIELDS_DESCRICAO),
+    principal: Principal = Depends(current_principal),
+    db: Session = Depends(get_read_db)
+):
+    """Obter dados do driver logado (ETag / 304)"""
+    campos = _campos(fields, DriverSchema)
+    return _ler_condicional(
+        request, "d",
+        lambda: DriverController.buscar_versao_driver(db, principal.id),
+        lambda carregar: DriverController.buscar_driver_por_id(db, principal.id, campos=carregar),
+        DriverSchema, campos, "Driver não encontrado",
+    )
+
+@router.put("/position", response_model=DriverPositionSchema)
+@orcamento(3)
+async def atualizar_posicao(
+    posicao: DriverPositionUpdate,
+    principal: Principal = Depends(current_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Atualizar a posição do driver logado (upsert; entra na hora no índice deste
+    worker, os demais recebem na próxima sincronização)"""
+    try:
+        salva = await PosicaoController.salvar_posicao_async(db, principal.id, posicao)
+    except IntegrityError:
         raise HTTPException(status_code=404, detail="Driver não encontrado")
-    return driver
+    # O status (is_active) de um driver novo no índice vem da sincronização
+    posicoes.indice.atualizar(salva.driver_id, salva.lat, salva.lon, salva.vehicle_type, salva.updated_at)
+    return resposta_modelo(salva, DriverPositionSchema)
+
+@router.post("/location", status_code=status.HTTP_202_ACCEPTED)
+@orcamento(1)  # só a identidade do token, quando fora do cache; os pings são gravados em lote
+async def registrar_localizacao(
+    pings: LocationPing | list[LocationPing],
+    response: Response,
+    principal: Principal = Depends(current_principal_async)
+):
+    """Receber um ping de GPS ou uma lista deles (write-behind: o flusher grava em lote)"""
+    if not isinstance(pings, list):
+        pings = [pings]
+    if not 1 <= len(pings) <= localizacao.LOCALIZACAO_LOTE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Envie de 1 a {localizacao.LOCALIZACAO_LOTE_MAX} pings por request"
+        )
+    try:
+        ultimo = localizacao.registrar(principal.id, pings)
+    except localizacao.PingForaDoIntervalo:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="recorded_at fora do intervalo aceito (relógio do aparelho incorreto?)"
+        )
+    if ultimo is not None:
+        _, lat, lon, *_ = ultimo
+        posicoes.indice.atualizar(principal.id, lat, lon, None, datetime.utcnow())
+    if localizacao.LOCALIZACAO_DURABILIDADE == "commit":
+        try:
+            await localizacao.confirmar()
+        except localizacao.FalhaGravacao:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Não foi possível gravar a localização, tente novamente"
+            )
+        response.status_code = status.HTTP_200_OK
+    return {"aceitos": len(pings)}
+
+@router.get("/", response_model=PaginaDrivers)
+@orcamento(2)
+def listar_drivers(
+    cursor: str | None = Query(None, description="next_cursor da página anterior"),
+    limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO),
+    is_active: bool | None = Query(None, description="Filtrar por status (omitido lista todos)"),
+    fields: str | None = Query(None, description=FIELDS_DESCRICAO),
+    principal: Principal = Depends(current_principal),
+    db: Session = Depends(get_read_db)
+):
+    """Listar drivers paginando por (created_at, id)"""
+    campos = _campos(fields, DriverSchema)
+    try:
+        drivers, next_cursor = DriverController.listar_drivers(
+            db, limit=limit, cursor=cursor, is_active=is_active, campos=campos
+        )
+    except CursorInvalido:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+    if campos is None:
+        return resposta_modelo({"items": drivers, "next_cursor": next_cursor}, PaginaDrivers)
+    parcial = schema_parcial(DriverSchema, campos)
+    return RespostaJSON({
+        "items": [parcial.model_validate(driver) for driver in drivers],
+        "next_cursor": next_cursor,
+    })
 
 @router.get("/{driver_id}", response_model=DriverSchema)
-def obter_driver(driver_id: int, db: Session = Depends(get_db)):
-    """Obter dados de um driver específico"""
-    driver = DriverController.buscar_driver_por_id(db, driver_id=driver_id)
+@orcamento(2)
+def obter_driver(
+    driver_id: int,
+    request: Request,
+    fields: str | None = Query(None, description=FIELDS_DESCRICAO),
+    db: Session = Depends(get_read_db)
+):
+    """Obter dados de um driver específico (ETag / 304)"""
+    campos = _campos(fields, DriverSchema)
+    return _ler_condicional(
+        request, "d",
+        lambda: DriverController.buscar_versao_driver(db, driver_id),
+        lambda carregar: DriverController.buscar_driver_por_id(db, driver_id, campos=carregar),
+        DriverSchema, campos, "Driver não encontrado",
+    )
+
+@router.get("/{driver_id}/profile_image")
+async def obter_foto_perfil(
+    driver_id: int,
+    request: Request,
+    w: int = Query(256, ge=1, le=1024),
+    fmt: str = Query("webp", pattern="^(jpeg|webp)$"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Obter a foto de perfil redimensionada (ex.: ?w=128&fmt=webp)"""
+    driver = await DriverController.buscar_driver_por_id_async(db, driver_id, campos=("profile_image",))
     if not driver:
         raise HTTPException(status_code=404, detail="Driver não encontrado")
-    return driver
+    return await _servir_derivado(request, driver.profile_image, w, fmt)
 
 @router.put("/{driver_id}", response_model=DriverSchema)
+@orcamento(3)
 def atualizar_driver(
     driver_id: int,
     driver_update: DriverUpdate,
-    email: str = Depends(verificar_token),
+    request: Request,
+    principal: Principal = Depends(current_principal),
     db: Session = Depends(get_db)
 ):
-    """Atualizar dados do driver"""
-    # Verificar se o driver logado é o mesmo que está sendo atualizado
-    driver_logado = DriverController.buscar_driver_por_email(db, email=email)
-    if not driver_logado or driver_logado.id != driver_id:
+    """Atualizar dados do driver (If-Match com a ETag lida evita sobrescrever alterações)"""
+    # Verificar se o driver logado é o mesmo que está sendo atualizado (identidade em cache)
+    if principal.id != driver_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem permissão para atualizar este driver"
         )
     
-    driver = DriverController.atualizar_driver(db, driver_id, driver_update)
+    versoes = condicional.versoes_if_match(request, "d", driver_id)
+    if versoes == []:
+        raise _precondicao_falhou()
+    # Com If-Match o UPDATE também exige updated_at igual ao da versão lida (sem SELECT antes)
+    driver = DriverController.atualizar_driver(db, driver_id, driver_update, versoes=versoes)
     if not driver:
+        if versoes is not None and DriverController.buscar_versao_driver(db, driver_id):
+            raise _precondicao_falhou()
         raise HTTPException(status_code=404, detail="Driver não encontrado")
-    return driver
+    return _com_etag(resposta_modelo(driver, DriverSchema), "d", driver)
 
 @router.post("/upload/profile")
 async def upload_foto_perfil(
     driver_id: int,
     file: UploadFile = File(...),
-    email: str = Depends(verificar_token),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(current_principal_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload da foto de perfil do driver"""
     
     # Verificar se o driver logado é o mesmo
-    driver = DriverController.buscar_driver_por_id(db, driver_id)
-    if not driver or driver.email != email:
+    if principal.id != driver_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem permissão para atualizar este driver"
         )
     
-    # Ler arquivo e converter para base64
-    contents = await file.read()
-    file_base64 = base64.b64encode(contents).decode('utf-8')
+    # Normalizar e salvar no blob store; a linha guarda só o hash
+    contents = await _receber_imagem(file, "perfil")
+    driver = await DriverController.buscar_driver_por_id_async(db, driver_id, campos=("profile_image",))
+    if not driver:
+        raise HTTPException(status_code=404, detail="Driver não encontrado")
+    imagem_antiga = driver.profile_image
+    hash_imagem = await blobs.salvar_async(db, contents, imagens.content_type())
+    await blobs.liberar_async(db, imagem_antiga)
     
-    # Atualizar driver
-    driver_update = DriverUpdate(profile_image=file_base64)
-    updated_driver = DriverController.atualizar_driver(db, driver_id, driver_update)
+    # Atualizar driver (UPDATE ... RETURNING, na mesma transação dos blobs)
+    updated_driver = await DriverController.gravar_imagens_async(db, driver_id, profile_image=hash_imagem)
     
     return {
         "message": "Foto de perfil atualizada com sucesso",
         "driver_id": updated_driver.id,
-        "profile_image": updated_driver.profile_image[:100] + "..." if updated_driver.profile_image else None
+        "profile_image": updated_driver.profile_image,
+        "profile_image_url": blobs.url(updated_driver.profile_image)
     }
 
 @router.post("/upload/rg")
 async def upload_rg(
     driver_id: int,
     files: list[UploadFile] = File(...),
-    email: str = Depends(verificar_token),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(current_principal_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload das fotos de RG do driver"""
     
     # Verificar se o driver logado é o mesmo
-    driver = DriverController.buscar_driver_por_id(db, driver_id)
-    if not driver or driver.email != email:
+    if principal.id != driver_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem permissão para atualizar este driver"
         )
     
-    # Converter arquivo para base64
+    # Normalizar todas antes de gravar no blob store, para não deixar blobs pela metade
+    normalizadas = [await _receber_imagem(file, "rg") for file in files[:2]]  # Máximo 2 imagens
+    driver = await DriverController.buscar_driver_por_id_async(db, driver_id, campos=("rg_images",))
+    if not driver:
+        raise HTTPException(status_code=404, detail="Driver não encontrado")
     rg_images = []
-    for file in files[:2]:  # Máximo 2 imagens
-        contents = await file.read()
-        file_base64 = base64.b64encode(contents).decode('utf-8')
-        rg_images.append(file_base64)
+    for contents in normalizadas:
+        rg_images.append(await blobs.salvar_async(db, contents, imagens.content_type()))
+    
+    # Liberar as imagens anteriores
+    for hash_antigo in json.loads(driver.rg_images or "[]"):
+        await blobs.liberar_async(db, hash_antigo)
     
     # Atualizar driver
-    import json
-    driver_update = DriverUpdate(rg_images=json.dumps(rg_images))
-    updated_driver = DriverController.atualizar_driver(db, driver_id, driver_update)
+    updated_driver = await DriverController.gravar_imagens_async(db, driver_id, rg_images=json.dumps(rg_images))
     
     return {
         "message": "Fotos de RG atualizadas com sucesso",
         "driver_id": updated_driver.id,
-        "rg_count": len(rg_images)
+        "rg_count": len(rg_images),
+        "rg_images": rg_images
     }
 
 
 # ===== MOTORCYCLE ENDPOINTS =====
 
 @router.post("/vehicle", response_model=dict)
+@orcamento(6)
 async def upload_imagem_moto(
     file: UploadFile = File(...),
     driver_id: int = None,
-    email: str = Depends(verificar_token),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(current_principal_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload da imagem da motocicleta do driver"""
     
-    # Se não informou driver_id, buscar do token
+    # Se não informou driver_id, usar o do token
     if not driver_id:
-        driver = DriverController.buscar_driver_por_email(db, email=email)
-        if not driver:
-            raise HTTPException(status_code=404, detail="Driver não encontrado")
-        driver_id = driver.id
+        driver_id = principal.id
     
     # Verificar se o driver logado é o mesmo
-    driver = DriverController.buscar_driver_por_id(db, driver_id)
-    if not driver or driver.email != email:
+    if principal.id != driver_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Você não tem permissão para atualizar este driver"
         )
     
-    # Ler arquivo e converter para base64
-    contents = await file.read()
-    file_base64 = base64.b64encode(contents).decode('utf-8')
+    contents = await _receber_imagem(file, "moto")
     
-    # Buscar ou criar motocicleta
-    motorcycle = MotorcycleController.buscar_motorcycle_por_driver(db, driver_id)
+    # Salvar arquivo no blob store
+    motorcycle = await MotorcycleController.buscar_motorcycle_por_driver_async(db, driver_id, campos=("id", "image"))
+    hash_imagem = await blobs.salvar_async(db, contents, imagens.content_type())
     
     if not motorcycle:
-        # Criar nova motocicleta
+        # Criar nova motocicleta já com a imagem (um único INSERT ... RETURNING)
         motorcycle_create = MotorcycleCreate(driver_id=driver_id)
-        motorcycle = MotorcycleController.criar_motorcycle(db, motorcycle_create)
-    
-    # Atualizar imagem
-    motorcycle_update = MotorcycleUpdate(image=file_base64)
-    updated_motorcycle = MotorcycleController.atualizar_motorcycle(db, motorcycle.id, motorcycle_update)
+        updated_motorcycle = await MotorcycleController.criar_motorcycle_async(db, motorcycle_create, image=hash_imagem)
+    else:
+        # Liberar a imagem anterior e atualizar (UPDATE ... RETURNING)
+        imagem_antiga = motorcycle.image
+        await blobs.liberar_async(db, imagem_antiga)
+        updated_motorcycle = await MotorcycleController.gravar_imagem_async(db, motorcycle.id, hash_imagem)
     
     return {
         "message": "Imagem da motocicleta atualizada com sucesso",
         "motorcycle_id": updated_motorcycle.id,
-        "driver_id": driver_id
+        "driver_id": driver_id,
+        "image": updated_motorcycle.image,
+        "image_url": blobs.url(updated_motorcycle.image)
     }
 
 @router.get("/vehicle/{driver_id}", response_model=MotorcycleSchema)
-def obter_moto_driver(driver_id: int, db: Session = Depends(get_db)):
-    """Obter dados da motocicleta do driver"""
-    motorcycle = MotorcycleController.buscar_motorcycle_por_driver(db, driver_id)
+@orcamento(2)
+def obter_moto_driver(
+    driver_id: int,
+    request: Request,
+    fields: str | None = Query(None, description=FIELDS_DESCRICAO),
+    db: Session = Depends(get_read_db)
+):
+    """Obter dados da motocicleta do driver (ETag / 304)"""
+    campos = _campos(fields, MotorcycleSchema)
+    return _ler_condicional(
+        request, "m",
+        lambda: MotorcycleController.buscar_versao_motorcycle_por_driver(db, driver_id),
+        lambda carregar: MotorcycleController.buscar_motorcycle_por_driver(db, driver_id, campos=carregar),
+        MotorcycleSchema, campos, "Motocicleta não encontrada",
+    )
+
+@router.get("/vehicle/{driver_id}/image")
+async def obter_imagem_moto(
+    driver_id: int,
+    request: Request,
+    w: int = Query(256, ge=1, le=1024),
+    fmt: str = Query("webp", pattern="^(jpeg|webp)$"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Obter a imagem da motocicleta redimensionada (ex.: ?w=256&fmt=jpeg)"""
+    motorcycle = await MotorcycleController.buscar_motorcycle_por_driver_async(db, driver_id, campos=("image",))
     if not motorcycle:
         raise HTTPException(status_code=404, detail="Motocicleta não encontrada")
-    return motorcycle
+    return await _servir_derivado(request, motorcycle.image, w, fmt)
 
 @router.put("/vehicle/{motorcycle_id}", response_model=MotorcycleSchema)
+@orcamento(3)
 def atualizar_moto(
     motorcycle_id: int,
     motorcycle_update: MotorcycleUpdate,
-    email: str = Depends(verificar_token),
+    request: Request,
+    principal: Principal = Depends(current_principal),
     db: Session = Depends(get_db)
 ):
-    """Atualizar dados da motocicleta"""
+    """Atualizar dados da motocicleta (If-Match com a ETag lida evita sobrescrever alterações)"""
+    versoes = condicional.versoes_if_match(request, "m", motorcycle_id)
+    if versoes == []:
+        raise _precondicao_falhou()
+    # Um único UPDATE ... WHERE id = ? AND driver_id = <driver logado> [AND updated_at IN (If-Match)]
+    updated = MotorcycleController.atualizar_motorcycle(
+        db, motorcycle_id, motorcycle_update, driver_id=principal.id, versoes=versoes
+    )
+    if updated:
+        return _com_etag(resposta_modelo(updated, MotorcycleSchema), "m", updated)
+    
+    # Nada atualizado: descobrir se a moto não existe, é de outro driver ou mudou de versão
     motorcycle = MotorcycleController.buscar_motorcycle_por_id(db, motorcycle_id)
     if not motorcycle:
         raise HTTPException(status_code=404, detail="Motocicleta não encontrada")
-    
-    # Verificar se o driver logado é o proprietário
-    driver = DriverController.buscar_driver_por_id(db, motorcycle.driver_id)
-    if not driver or driver.email != email:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Você não tem permissão para atualizar esta motocicleta"
-        )
-    
-    updated = MotorcycleController.atualizar_motorcycle(db, motorcycle_id, motorcycle_update)
-    return updated
+    if versoes is not None and motorcycle.driver_id == principal.id:
+        raise _precondicao_falhou()
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Você não tem permissão para atualizar esta motocicleta"
+    )
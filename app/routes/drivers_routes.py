@@ -0,0 +1,288 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import get_async_db, get_async_read_db
+from app.models.schemas import DriverRegisterRequest, DriverProximo, DriversProximos
+from app.controllers import DriverController
+from app.auth import Principal, current_admin_async, current_principal_async, current_principal_stream_async
+from app.respostas import RespostaJSON
+from app.services import posicoes, transmissao
+from app.services.consultas import orcamento
+from app.services.hashing import FilaHashCheia, gerar_hashes
+import json
+import os
+
+# Operações sobre a frota (vários drivers por request)
+router = APIRouter(prefix="/drivers", tags=["drivers"])
+
+# Linhas por transação na importação em lote
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_LINHAS = int(os.getenv("BULK_MAX_LINHAS", "50000"))
+# Array JSON é lido inteiro; NDJSON é lido em streaming, limitado por linha
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(32 * 1024 * 1024)))
+BULK_MAX_BYTES_LINHA = int(os.getenv("BULK_MAX_BYTES_LINHA", str(16 * 1024)))
+
+
+def _erro(linha: int, mensagem: str) -> dict:
+    return {"linha": linha, "status": "erro", "erro": mensagem}
+
+
+def _grande_demais(detalhe: str):
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detalhe)
+
+
+class _Importacao:
+    """Estado de uma importação: duplicados dentro do próprio arquivo e relatório"""
+
+    def __init__(self, db: AsyncSession, leitura: AsyncSession):
+        self.db = db
+        self.leitura = leitura
+        self.emails_vistos = set()
+        self.cpfs_vistos = set()
+        self.resultados = []
+        self.total = 0
+
+    def validar(self, linha: int, bruto) -> DriverRegisterRequest | None:
+        """Validar uma linha; erros entram no relatório e a linha é descartada"""
+        try:
+            driver = DriverRegisterRequest.model_validate(bruto)
+        except ValidationError as e:
+            self.resultados.append(_erro(linha, f"Dados inválidos: {e.errors()[0]['msg']}"))
+            return None
+        if driver.password != driver.confirm_password:
+            self.resultados.append(_erro(linha, "As senhas não coincidem"))
+            return None
+        if driver.email in self.emails_vistos:
+            self.resultados.append(_erro(linha, "Email repetido no arquivo"))
+            return None
+        if driver.cpf in self.cpfs_vistos:
+            self.resultados.append(_erro(linha, "CPF repetido no arquivo"))
+            return None
+        self.emails_vistos.add(driver.email)
+        self.cpfs_vistos.add(driver.cpf)
+        return driver
+
+    async def processar_lote(self, lote: list[tuple[int, DriverRegisterRequest]]):
+        """Checar duplicados (1 SELECT), gerar hashes no pool e inserir numa transação"""
+        if not lote:
+            return
+        emails, cpfs = await DriverController.buscar_duplicados_async(
+            self.leitura, [d.email for _, d in lote], [d.cpf for _, d in lote]
+        )
+        # Encerrar a transação de leitura: o próximo lote precisa de um snapshot novo
+        # (e uma leitura aberta por toda a importação impediria o checkpoint do WAL)
+        await self.leitura.rollback()
+        novos = []
+        for linha, driver in lote:
+            if driver.email in emails:
+                self.resultados.append(_erro(linha, "Email já registrado"))
+            elif driver.cpf in cpfs:
+                self.resultados.append(_erro(linha, "CPF já registrado"))
+            else:
+                novos.append((linha, driver))
+        if not novos:
+            return
+
+        try:
+            hashes = await gerar_hashes([driver.password for _, driver in novos])
+        except FilaHashCheia:
+            for linha, _ in novos:
+                self.resultados.append(_erro(linha, "Serviço temporariamente sobrecarregado, tente novamente"))
+            return
+
+        linhas = [
+            {"nome": d.name, "email": d.email, "cpf": d.cpf, "phone": d.phone, "password": senha_hash}
+            for (_, d), senha_hash in zip(novos, hashes)
+        ]
+        try:
+            ids = await DriverController.criar_drivers_em_lote_async(self.db, linhas)
+        except IntegrityError:
+            # Cadastro concorrente entre a checagem e o INSERT: refazer linha a linha
+            await self.db.rollback()
+            await self._inserir_individualmente(novos, linhas)
+            return
+        for (linha, _), driver_id in zip(novos, ids):
+            self.resultados.append({"linha": linha, "status": "criado", "id": driver_id})
+
+    async def _inserir_individualmente(self, novos, linhas):
+        for (linha, _), dados in zip(novos, linhas):
+            try:
+                [driver_id] = await DriverController.criar_drivers_em_lote_async(self.db, [dados])
+            except IntegrityError:
+                await self.db.rollback()
+                self.resultados.append(_erro(linha, "Email ou CPF já registrado"))
+            else:
+                self.resultados.append({"linha": linha, "status": "criado", "id": driver_id})
+
+    def relatorio(self) -> dict:
+        self.resultados.sort(key=lambda r: r["linha"])
+        criados = sum(1 for r in self.resultados if r["status"] == "criado")
+        return {
+            "total": self.total,
+            "criados": criados,
+            "erros": self.total - criados,
+            "resultados": self.resultados,
+        }
+
+
+async def _linhas_ndjson(request: Request):
+    """Ler NDJSON em streaming, uma linha por vez (sem carregar o corpo inteiro)"""
+    resto = b""
+    async for pedaco in request.stream():
+        resto += pedaco
+        *completas, resto = resto.split(b"\n")
+        for linha in completas:
+            if len(linha) > BULK_MAX_BYTES_LINHA:
+                raise _grande_demais(f"Máximo de {BULK_MAX_BYTES_LINHA} bytes por linha")
+            if linha.strip():
+                yield linha
+        if len(resto) > BULK_MAX_BYTES_LINHA:
+            raise _grande_demais(f"Máximo de {BULK_MAX_BYTES_LINHA} bytes por linha")
+    if resto.strip():
+        yield resto
+
+
+async def _corpo_limitado(request: Request) -> bytes:
+    """Ler o corpo inteiro, recusando (413) pelo Content-Length ou assim que passar de
+    BULK_MAX_BYTES"""
+    mensagem = f"Máximo de {BULK_MAX_BYTES} bytes por importação (use NDJSON para arquivos maiores)"
+    if int(request.headers.get("content-length") or 0) > BULK_MAX_BYTES:
+        raise _grande_demais(mensagem)
+    corpo = bytearray()
+    async for pedaco in request.stream():
+        corpo += pedaco
+        if len(corpo) > BULK_MAX_BYTES:
+            raise _grande_demais(mensagem)
+    return bytes(corpo)
+
+
+async def _linhas(request: Request):
+    """Gerar (número da linha, objeto ou None se o JSON for inválido)"""
+    tipo = request.headers.get("content-type", "").split(";")[0].strip()
+    if tipo in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+        numero = 0
+        async for linha in _linhas_ndjson(request):
+            numero += 1
+            try:
+                yield numero, json.loads(linha)
+            except ValueError:
+                yield numero, None
+        return
+
+    try:
+        itens = json.loads(await _corpo_limitado(request))
+    except ValueError:
+        itens = None
+    if not isinstance(itens, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Envie um array JSON ou NDJSON (Content-Type: application/x-ndjson)"
+        )
+    for numero, item in enumerate(itens, start=1):
+        yield numero, item
+
+
+@router.post("/bulk")
+@orcamento(None)  # proporcional ao tamanho do arquivo
+async def importar_drivers(
+    request: Request,
+    principal: Principal = Depends(current_admin_async),
+    db: AsyncSession = Depends(get_async_db),
+    leitura: AsyncSession = Depends(get_async_read_db)
+):
+    """Cadastrar drivers em lote (array JSON ou NDJSON), com relatório por linha (só operadores)"""
+    importacao = _Importacao(db, leitura)
+    lote = []
+    async for numero, bruto in _linhas(request):
+        if numero > BULK_MAX_LINHAS:
+            raise _grande_demais(f"Máximo de {BULK_MAX_LINHAS} linhas por importação")
+        importacao.total = numero
+        if bruto is None:
+            importacao.resultados.append(_erro(numero, "JSON inválido"))
+            continue
+        driver = importacao.validar(numero, bruto)
+        if driver is not None:
+            lote.append((numero, driver))
+        if len(lote) >= BULK_BATCH_SIZE:
+            await importacao.processar_lote(lote)
+            lote = []
+    await importacao.processar_lote(lote)
+    return importacao.relatorio()
+
+
+@router.get("/nearby", response_model=DriversProximos)
+@orcamento(1)  # só a identidade do token, quando fora do cache
+async def drivers_proximos(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(5000, gt=0, le=posicoes.RAIO_MAXIMO_M, description="Raio em metros"),
+    limit: int = Query(20, ge=1, le=100),
+    vehicle_type: str | None = Query(None, description="Filtrar por tipo de veículo (ex.: moto)"),
+    principal: Principal = Depends(current_principal_async)
+):
+    """Drivers ativos mais próximos do ponto, por distância (índice em memória)"""
+    proximos = posicoes.indice.proximos(lat, lon, limit, radius, vehicle_type)
+    return RespostaJSON(DriversProximos(items=[
+        DriverProximo(
+            driver_id=posicao.driver_id, lat=posicao.lat, lon=posicao.lon,
+            vehicle_type=posicao.vehicle_type, updated_at=posicao.updated_at,
+            distance_m=round(distancia, 1),
+        )
+        for distancia, posicao in proximos
+    ]))
+
+
+def _assinatura_live(driver_id: str | None, bbox: str | None) -> tuple[frozenset[int] | None, tuple | None]:
+    """Validar ?driver_id=1,2,3 ou ?bbox=lat_min,lon_min,lat_max,lon_max (exatamente um)"""
+    if (driver_id is None) == (bbox is None):
+        raise HTTPException(status_code=422, detail="Informe driver_id ou bbox")
+    try:
+        if driver_id is not None:
+            drivers = frozenset(int(parte) for parte in driver_id.split(","))
+            if not 0 < len(drivers) <= transmissao.LIVE_DRIVERS_MAX:
+                raise HTTPException(
+                    status_code=422, detail=f"Entre 1 e {transmissao.LIVE_DRIVERS_MAX} drivers por conexão"
+                )
+            return drivers, None
+        lat_min, lon_min, lat_max, lon_max = (float(parte) for parte in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="driver_id ou bbox inválido")
+    if not (-90 <= lat_min <= lat_max <= 90 and -180 <= lon_min <= lon_max <= 180):
+        raise HTTPException(status_code=422, detail="bbox inválido")
+    if max(lat_max - lat_min, lon_max - lon_min) > transmissao.LIVE_BBOX_MAX_GRAUS:
+        raise HTTPException(
+            status_code=422, detail=f"bbox maior que {transmissao.LIVE_BBOX_MAX_GRAUS} grau(s) de lado"
+        )
+    return None, (lat_min, lon_min, lat_max, lon_max)
+
+
+@router.get("/live")
+@orcamento(1)  # só a identidade do token, quando fora do cache
+async def drivers_ao_vivo(
+    driver_id: str | None = Query(None, description="IDs separados por vírgula"),
+    bbox: str | None = Query(None, description="lat_min,lon_min,lat_max,lon_max"),
+    principal: Principal = Depends(current_principal_stream_async)
+):
+    """Posições ao vivo (Server-Sent Events): a posição atual de cada driver
+    assinado e, em seguida, um evento "position" a cada mudança ("leave" quando
+    um driver sai do bbox). Operadores assinam qualquer driver ou bbox; os demais
+    drivers, só a si mesmos"""
+    drivers, retangulo = _assinatura_live(driver_id, bbox)
+    if not principal.admin and drivers != frozenset({principal.id}):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Restrito a operadores")
+    if transmissao.transmissor.conexoes >= transmissao.LIVE_MAX_CONEXOES:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Limite de conexões ao vivo")
+
+    def iniciais():
+        if retangulo is not None:
+            return posicoes.indice.na_area(*retangulo)
+        encontradas = (posicoes.indice.obter(driver) for driver in drivers)
+        return [posicao for posicao in encontradas if posicao is not None and posicao.ativo]
+
+    return StreamingResponse(
+        transmissao.transmitir(drivers, retangulo, iniciais),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
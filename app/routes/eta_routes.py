@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.models.schemas import EstimativaEta
+from app.auth import Principal, current_principal_async
+from app.respostas import RespostaJSON
+from app.services import eta
+from app.services.consultas import orcamento
+
+router = APIRouter(prefix="/eta", tags=["eta"])
+
+
+def _ponto(texto: str) -> tuple[float, float]:
+    try:
+        lat, lon = (float(parte) for parte in texto.split(","))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Ponto inválido: {texto}")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Ponto inválido: {texto}")
+    return lat, lon
+
+
+@router.get("", response_model=EstimativaEta)
+@orcamento(1)  # só a identidade do token, quando fora do cache
+async def estimar_eta(
+    origin: str = Query(..., description="lat,lon"),
+    destination: list[str] = Query(..., description="lat,lon (repetir para vários destinos)"),
+    principal: Principal = Depends(current_principal_async)
+):
+    """Tempo de viagem de moto pela malha viária da origem a cada destino"""
+    if len(destination) > eta.ETA_MAX_DESTINOS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Máximo de {eta.ETA_MAX_DESTINOS} destinos por consulta"
+        )
+    try:
+        return RespostaJSON(await eta.estimar(_ponto(origin), [_ponto(destino) for destino in destination]))
+    except eta.GrafoIndisponivel as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except eta.ForaDoGrafo as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
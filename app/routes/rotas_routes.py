@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import get_async_read_db
+from app.models.schemas import OtimizarRota, RotaOtimizada
+from app.controllers import DeliveryController
+from app.auth import Principal, current_principal_async
+from app.respostas import RespostaJSON
+from app.services import posicoes, rotas
+from app.services.consultas import orcamento
+
+router = APIRouter(prefix="/routes", tags=["routes"])
+
+
+def _paradas_das_entregas(entregas) -> list[dict]:
+    """Coleta e entrega de cada entrega atribuída; das já coletadas, só a entrega"""
+    paradas = []
+    for entrega in entregas:
+        if entrega.status == "assigned":
+            paradas.append({
+                "id": f"pickup-{entrega.id}", "lat": entrega.pickup_lat, "lon": entrega.pickup_lon, "after": None,
+            })
+        paradas.append({
+            "id": f"dropoff-{entrega.id}", "lat": entrega.dropoff_lat, "lon": entrega.dropoff_lon,
+            "after": f"pickup-{entrega.id}" if entrega.status == "assigned" else None,
+        })
+    return paradas
+
+
+@router.post("/optimize", response_model=RotaOtimizada)
+@orcamento(3)
+async def otimizar_rota(
+    pedido: OtimizarRota,
+    principal: Principal = Depends(current_principal_async),
+    leitura: AsyncSession = Depends(get_async_read_db)
+):
+    """Ordenar as paradas do driver (coleta antes da entrega) pela menor distância,
+    partindo de start ou da posição atual dele"""
+    if pedido.stops is None:
+        paradas = _paradas_das_entregas(
+            await DeliveryController.listar_em_andamento_do_driver_async(leitura, principal.id)
+        )
+    else:
+        paradas = [parada.model_dump() for parada in pedido.stops]
+    if len(paradas) > rotas.ROTAS_MAX_PARADAS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Máximo de {rotas.ROTAS_MAX_PARADAS} paradas por rota"
+        )
+    if pedido.start is not None:
+        origem = (pedido.start.lat, pedido.start.lon)
+    else:
+        atual = posicoes.indice.obter(principal.id)
+        origem = None if atual is None else (atual.lat, atual.lon)
+    orcamento_ms = min(pedido.time_budget_ms or rotas.ROTAS_ORCAMENTO_MS, rotas.ROTAS_ORCAMENTO_MAX_MS)
+    try:
+        return RespostaJSON(await rotas.otimizar(origem, paradas, orcamento_ms))
+    except rotas.RotaInvalida as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
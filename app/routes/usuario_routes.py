@@ -1,31 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.config.database import get_db
+from app.config.database import get_db, get_read_db, get_async_db
 from app.models.schemas import (
-    UsuarioCreate, UsuarioUpdate, Usuario as UsuarioSchema
+    UsuarioCreate, UsuarioUpdate, Usuario as UsuarioSchema, ListaUsuarios
 )
 from app.controllers.usuario_controller import UsuarioController
+from app.respostas import resposta_modelo
+from app.services.hashing import FilaHashCheia
+from app.services.paginacao import CursorInvalido, LIMITE_MAXIMO
 
 router = APIRouter(prefix="/usuarios", tags=["usuarios"])
 
 
-@router.post("/", response_model=UsuarioSchema)
-def criar_usuario(usuario_data: UsuarioCreate, db: Session = Depends(get_db)):
-    """Criar um novo usuário"""
-    
-    # Verificar se email já existe
-    db_usuario = UsuarioController.obter_usuario_por_email(db, email=usuario_data.email)
-    if db_usuario:
+async def _hash_senha(senha: str) -> str:
+    try:
+        return await UsuarioController.hash_senha(senha)
+    except FilaHashCheia:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email já registrado"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serviço temporariamente sobrecarregado, tente novamente",
+            headers={"Retry-After": "1"},
         )
-    
-    return UsuarioController.criar_usuario(db, usuario_data)
+
+
+@router.post("/", response_model=UsuarioSchema)
+async def criar_usuario(usuario_data: UsuarioCreate, db: AsyncSession = Depends(get_async_db)):
+    """Criar um novo usuário"""
+    # Email duplicado é detectado pelo próprio INSERT (UNIQUE) e vira 400
+    senha_hash = await _hash_senha(usuario_data.senha)
+    return await UsuarioController.criar_usuario_async(db, usuario_data, senha_hash)
 
 
 @router.get("/{usuario_id}", response_model=UsuarioSchema)
-def obter_usuario(usuario_id: int, db: Session = Depends(get_db)):
+def obter_usuario(usuario_id: int, db: Session = Depends(get_read_db)):
     """Obter um usuário por ID"""
     db_usuario = UsuarioController.obter_usuario_por_id(db, usuario_id)
     
@@ -35,19 +43,33 @@ def obter_usuario(usuario_id: int, db: Session = Depends(get_db)):
             detail="Usuário não encontrado"
         )
     
-    return db_usuario
+    return resposta_modelo(db_usuario, UsuarioSchema)
 
 
 @router.get("/", response_model=list[UsuarioSchema])
-def listar_usuarios(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    """Listar todos os usuários com paginação"""
-    return UsuarioController.listar_usuarios(db, skip=skip, limit=limit)
+def listar_usuarios(
+    cursor: str | None = Query(None, description="Cabeçalho X-Next-Cursor da página anterior"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Use cursor"),
+    limit: int = Query(10, ge=1, le=LIMITE_MAXIMO),
+    db: Session = Depends(get_read_db)
+):
+    """Listar usuários com paginação por cursor (próxima página no cabeçalho X-Next-Cursor,
+    ausente na última)"""
+    try:
+        usuarios, next_cursor = UsuarioController.listar_usuarios(db, limit=limit, cursor=cursor, skip=skip)
+    except CursorInvalido:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+    resposta = resposta_modelo(usuarios, ListaUsuarios)
+    if next_cursor:
+        resposta.headers["X-Next-Cursor"] = next_cursor
+    return resposta
 
 
 @router.put("/{usuario_id}", response_model=UsuarioSchema)
-def atualizar_usuario(usuario_id: int, usuario_data: UsuarioUpdate, db: Session = Depends(get_db)):
+async def atualizar_usuario(usuario_id: int, usuario_data: UsuarioUpdate, db: AsyncSession = Depends(get_async_db)):
     """Atualizar um usuário"""
-    db_usuario = UsuarioController.atualizar_usuario(db, usuario_id, usuario_data)
+    senha_hash = await _hash_senha(usuario_data.senha) if usuario_data.senha else None
+    db_usuario = await UsuarioController.atualizar_usuario_async(db, usuario_id, usuario_data, senha_hash)
     
     if not db_usuario:
         raise HTTPException(
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import re
+import tempfile
+from datetime import datetime
+from anyio import to_thread
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config.database import AsyncSessionLocal
+from app.models.blob import Blob
+
+# Diretório raiz dos blobs (endereçados pelo SHA-256 do conteúdo)
+BLOB_DIR = os.getenv("BLOB_DIR", "./blobs")
+CHUNK_SIZE = 64 * 1024
+# Limpeza de órfãos em segundo plano: a cada BLOBS_LIMPEZA_S (0 desliga), blobs sem
+# referência há mais de BLOBS_CARENCIA_S
+BLOBS_LIMPEZA_S = float(os.getenv("BLOBS_LIMPEZA_S", "300"))
+BLOBS_CARENCIA_S = float(os.getenv("BLOBS_CARENCIA_S", "3600"))
+_LOTE_LIMPEZA = 500
+
+logger = logging.getLogger("tmax.blobs")
+_tarefa: asyncio.Task | None = None
+
+# INSERT ... ON CONFLICT DO UPDATE (upsert) de cada dialeto suportado
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Assinaturas dos formatos de imagem aceitos
+_ASSINATURAS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def hash_valido(valor: str | None) -> bool:
+    """Verificar se o valor é um hash de blob (64 caracteres hex)"""
+    return bool(valor) and bool(_HASH_RE.match(valor))
+
+
+def detectar_tipo(conteudo: bytes) -> str:
+    """Detectar o content type pelos primeiros bytes"""
+    for assinatura, tipo in _ASSINATURAS:
+        if conteudo.startswith(assinatura):
+            return tipo
+    if conteudo[:4] == b"RIFF" and conteudo[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def caminho(hash_blob: str) -> str:
+    """Caminho do arquivo de um blob no disco"""
+    return os.path.join(BLOB_DIR, hash_blob[:2], hash_blob)
+
+
+def url(hash_blob: str | None) -> str | None:
+    """URL pública de um blob"""
+    return f"/blobs/{hash_blob}" if hash_blob else None
+
+
+def gravar_atomico(destino: str, conteudo: bytes):
+    """Gravar em arquivo temporário no mesmo diretório e renomear (atômico no POSIX)"""
+    diretorio = os.path.dirname(destino)
+    os.makedirs(diretorio, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=diretorio, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, destino)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _referenciar(dialeto: str, hash_blob: str, conteudo: bytes, content_type: str | None):
+    """Criar o blob com uma referência ou somar uma à existente num único statement
+    (dois primeiros uploads simultâneos do mesmo conteúdo não colidem no INSERT)"""
+    agora = datetime.utcnow()
+    stmt = _INSERTS[dialeto](Blob).values(
+        hash=hash_blob,
+        tamanho=len(conteudo),
+        content_type=content_type or detectar_tipo(conteudo),
+        refs=1,
+        created_at=agora,
+        updated_at=agora,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[Blob.hash], set_={"refs": Blob.refs + 1, "updated_at": agora}
+    )
+
+
+def _desreferenciar(hash_blob: str):
+    stmt = (
+        update(Blob).where(Blob.hash == hash_blob, Blob.refs > 0)
+        .values(refs=Blob.refs - 1, updated_at=datetime.utcnow())
+    )
+    return stmt.execution_options(synchronize_session=False)
+
+
+def salvar(db: Session, conteudo: bytes, content_type: str | None = None) -> str:
+    """Salvar conteúdo e adicionar uma referência; retorna o hash.
+
+    O content type é detectado pelo conteúdo quando não informado (não confiar no cliente).
+    Não faz commit: a referência entra na mesma transação que grava o hash na linha.
+    """
+    hash_blob = hashlib.sha256(conteudo).hexdigest()
+
+    # Deduplicação: mesmo conteúdo, mesmo arquivo
+    _gravar_se_novo(hash_blob, conteudo)
+    db.execute(_referenciar(db.get_bind().dialect.name, hash_blob, conteudo, content_type))
+    return hash_blob
+
+
+def _gravar_se_novo(hash_blob: str, conteudo: bytes):
+    destino = caminho(hash_blob)
+    try:
+        # Já existe: renovar o mtime, que protege o arquivo de uma limpeza em andamento
+        os.utime(destino)
+    except FileNotFoundError:
+        gravar_atomico(destino, conteudo)
+
+
+async def salvar_async(db: AsyncSession, conteudo: bytes, content_type: str | None = None) -> str:
+    """Versão async de salvar: hash e escrita em disco rodam numa thread"""
+    hash_blob = await to_thread.run_sync(lambda: hashlib.sha256(conteudo).hexdigest())
+    await to_thread.run_sync(_gravar_se_novo, hash_blob, conteudo)
+    await db.execute(_referenciar(db.bind.dialect.name, hash_blob, conteudo, content_type))
+    return hash_blob
+
+
+def liberar(db: Session, hash_blob: str | None):
+    """Remover uma referência do blob (sem commit)"""
+    if hash_valido(hash_blob):
+        db.execute(_desreferenciar(hash_blob))
+
+
+async def liberar_async(db: AsyncSession, hash_blob: str | None):
+    """Versão async de liberar"""
+    if hash_valido(hash_blob):
+        await db.execute(_desreferenciar(hash_blob))
+
+
+def _apagar_arquivos(hashes: list[str], corte: float) -> int:
+    """Apagar os arquivos dos órfãos removidos do banco. O arquivo sai do lugar antes
+    de olhar o mtime: um upload do mesmo conteúdo que renovou o mtime depois do corte
+    volta a tê-lo (o conteúdo é o mesmo, pelo hash); um que chegou depois da troca
+    não acha o arquivo e o grava de novo"""
+    apagados = 0
+    for hash_blob in hashes:
+        destino = caminho(hash_blob)
+        removido = f"{destino}.apagar-{os.getpid()}"
+        try:
+            os.rename(destino, removido)
+        except FileNotFoundError:
+            continue
+        if os.stat(removido).st_mtime >= corte:
+            os.replace(removido, destino)
+        else:
+            os.unlink(removido)
+            apagados += 1
+    return apagados
+
+
+async def remover_orfaos_async(carencia_s: float = BLOBS_CARENCIA_S) -> int:
+    """Apagar blobs sem referência há mais de carencia_s (banco e disco), em lotes"""
+    corte = time.time() - carencia_s
+    limite = datetime.utcfromtimestamp(corte)
+    apagados = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            # ix_blobs_refs_updated_at; o DELETE confere refs de novo (upload concorrente)
+            candidatos = (await db.execute(
+                select(Blob.hash).where(Blob.refs <= 0, Blob.updated_at < limite).limit(_LOTE_LIMPEZA)
+            )).scalars().all()
+            if not candidatos:
+                break
+            removidos = (await db.execute(
+                delete(Blob).where(Blob.hash.in_(candidatos), Blob.refs <= 0)
+                .returning(Blob.hash).execution_options(synchronize_session=False)
+            )).scalars().all()
+            await db.commit()
+            apagados += await to_thread.run_sync(_apagar_arquivos, removidos, corte)
+            if len(candidatos) < _LOTE_LIMPEZA:
+                break
+    return apagados
+
+
+async def _loop_limpeza():
+    while True:
+        await asyncio.sleep(BLOBS_LIMPEZA_S)
+        try:
+            apagados = await remover_orfaos_async()
+        except Exception:
+            logger.exception("Falha na limpeza de blobs órfãos")
+            continue
+        if apagados:
+            logger.info("%d blobs órfãos apagados", apagados)
+
+
+def iniciar():
+    """Chamar no startup do worker. Cada worker limpa por conta própria: o DELETE ...
+    RETURNING entrega cada órfão a um só deles"""
+    global _tarefa
+    if BLOBS_LIMPEZA_S > 0:
+        _tarefa = asyncio.get_running_loop().create_task(_loop_limpeza())
+
+
+def encerrar():
+    global _tarefa
+    if _tarefa is not None:
+        _tarefa.cancel()
+        _tarefa = None
+
+
+def obter(db: Session, hash_blob: str) -> Blob | None:
+    """Obter metadados de um blob existente"""
+    if not hash_valido(hash_blob):
+        return None
+    return db.get(Blob, hash_blob)
+
+
+def ler_intervalo(hash_blob: str, inicio: int, fim: int):
+    """Gerador que lê o arquivo do blob em chunks, de inicio até fim (inclusive)"""
+    with open(caminho(hash_blob), "rb") as f:
+        f.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            chunk = f.read(min(CHUNK_SIZE, restante))
+            if not chunk:
+                break
+            restante -= len(chunk)
+            yield chunk
@@ -0,0 +1,411 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from app.services import workers
+
+try:
+    import fcntl
+except ImportError:  # Windows: desenvolvimento, um processo só
+    fcntl = None
+
+# Cercas (geofences): zonas circulares ou poligonais por entrega e detecção de
+# entrada, saída e permanência do driver. As zonas das entregas em andamento ficam
+# numa grade em memória (célula -> zonas que a tocam), sincronizada com o banco a
+# cada CERCAS_SYNC_S; cada posição nova do índice de drivers é testada só contra as
+# zonas da célula dela e as zonas em que o driver já está. Histerese: entra ao
+# cruzar a borda, só sai a mais de CERCAS_HISTERESE_M dela (o GPS oscila perto da
+# borda). Um worker por instância avalia (flock, como o despacho): ele recebe as
+# posições dos demais pela sincronização do índice; os eventos vão em lote para
+# geofence_events e, na hora, para os ganchos registrados. Entrada, saída e
+# permanência usam o relógio do servidor no momento da avaliação (o recorded_at do
+# aparelho pode chegar atrasado ou adiantado e não serve para medir permanência).
+CERCAS_ATIVAS = os.getenv("CERCAS_ATIVAS", "1") == "1"
+CERCAS_RAIO_M = float(os.getenv("CERCAS_RAIO_M", "75"))  # zonas de coleta/destino (0: não criar)
+CERCAS_HISTERESE_M = float(os.getenv("CERCAS_HISTERESE_M", "30"))
+CERCAS_PERMANENCIA_S = float(os.getenv("CERCAS_PERMANENCIA_S", "120"))
+CERCAS_SYNC_S = float(os.getenv("CERCAS_SYNC_S", "2"))
+CERCAS_CELULA_GRAUS = float(os.getenv("CERCAS_CELULA_GRAUS", "0.01"))
+# Saída do driver atribuído da zona de coleta marca a entrega como coletada
+CERCAS_COLETA_AUTOMATICA = os.getenv("CERCAS_COLETA_AUTOMATICA", "1") == "1"
+# Margem da sincronização incremental (commit de T depois da leitura de T' > T)
+_SOBREPOSICAO = timedelta(seconds=2)
+
+METROS_POR_GRAU = 6371008.8 * math.pi / 180
+
+logger = logging.getLogger("tmax.cercas")
+
+
+def _instante(data: datetime) -> float:
+    return data.replace(tzinfo=timezone.utc).timestamp() if data.tzinfo is None else data.timestamp()
+
+
+class Zona:
+    """Círculo (centro + raio) ou polígono [(lat, lon)], com distância à borda em
+    metros pela projeção equiretangular local (negativa dentro)"""
+
+    __slots__ = ("id", "delivery_id", "driver_id", "tipo", "forma", "lat", "lon", "raio_m",
+                 "vertices", "caixa", "_cos", "_plano")
+
+    def __init__(self, id: int, delivery_id: int | None, driver_id: int | None, tipo: str, forma: str,
+                 lat: float | None = None, lon: float | None = None, raio_m: float | None = None,
+                 vertices: list[tuple[float, float]] | None = None):
+        self.id, self.delivery_id, self.driver_id, self.tipo, self.forma = id, delivery_id, driver_id, tipo, forma
+        if forma == "circle":
+            self.lat, self.lon, self.raio_m, self.vertices = lat, lon, raio_m, None
+            graus = raio_m / METROS_POR_GRAU
+            self._cos = max(math.cos(math.radians(lat)), 1e-6)
+            self.caixa = (lat - graus, lon - graus / self._cos, lat + graus, lon + graus / self._cos)
+        else:
+            self.vertices = vertices
+            lats, lons = [v[0] for v in vertices], [v[1] for v in vertices]
+            self.lat, self.lon, self.raio_m = sum(lats) / len(lats), sum(lons) / len(lons), None
+            self._cos = max(math.cos(math.radians(self.lat)), 1e-6)
+            self.caixa = (min(lats), min(lons), max(lats), max(lons))
+            self._plano = [self._metros(v_lat, v_lon) for v_lat, v_lon in vertices]
+
+    def _metros(self, lat: float, lon: float) -> tuple[float, float]:
+        # (x, y) em metros a partir do centro da zona
+        return (lon - self.lon) * self._cos * METROS_POR_GRAU, (lat - self.lat) * METROS_POR_GRAU
+
+    def distancia_borda(self, lat: float, lon: float) -> float:
+        x, y = self._metros(lat, lon)
+        if self.vertices is None:
+            return math.hypot(x, y) - self.raio_m
+        dentro, menor = False, math.inf
+        pontos = self._plano
+        for (x1, y1), (x2, y2) in zip(pontos, pontos[1:] + pontos[:1]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                dentro = not dentro
+            dx, dy = x2 - x1, y2 - y1
+            t = 0.0 if dx == dy == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+            menor = min(menor, math.hypot(x - x1 - t * dx, y - y1 - t * dy))
+        return -menor if dentro else menor
+
+
+class MotorCercas:
+    """Zonas em memória e o estado de cada driver (em que zonas está e desde quando)"""
+
+    def __init__(self, celula_graus: float = CERCAS_CELULA_GRAUS, histerese_m: float = CERCAS_HISTERESE_M,
+                 permanencia_s: float = CERCAS_PERMANENCIA_S, ao_evento=None):
+        self.celula_graus = celula_graus
+        self.histerese_m = histerese_m
+        self.permanencia_s = permanencia_s
+        self.ao_evento = ao_evento  # ao_evento(evento: dict) para cada enter/exit/dwell
+        self.zonas: dict[int, Zona] = {}
+        self._celulas: dict[tuple[int, int], set[Zona]] = {}
+        # driver -> {zona: [instante da entrada, permanência já emitida]}
+        self._dentro: dict[int, dict[int, list]] = {}
+        self.avaliacoes = 0
+        self.testes = 0
+
+    def __len__(self) -> int:
+        return len(self.zonas)
+
+    def _celulas_da(self, zona: Zona) -> list[tuple[int, int]]:
+        # Caixa da zona com a margem da histerese: quem está saindo ainda é testado
+        margem = self.histerese_m / METROS_POR_GRAU
+        lat_min, lon_min, lat_max, lon_max = zona.caixa
+        cos = max(math.cos(math.radians(zona.lat)), 1e-6)
+        i0, j0 = self._celula(lat_min - margem, lon_min - margem / cos)
+        i1, j1 = self._celula(lat_max + margem, lon_max + margem / cos)
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def _celula(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.celula_graus), math.floor(lon / self.celula_graus)
+
+    def registrar(self, zona: Zona):
+        """Inserir ou substituir (mesmo id) uma zona; o estado dos drivers nela continua"""
+        anterior = self.zonas.get(zona.id)
+        if anterior is not None:
+            self._tirar_das_celulas(anterior)
+        self.zonas[zona.id] = zona
+        for celula in self._celulas_da(zona):
+            self._celulas.setdefault(celula, set()).add(zona)
+
+    def remover(self, zona_id: int):
+        """Tirar a zona (entrega concluída ou cancelada) sem emitir saída; o estado
+        de quem estava nela sai na próxima avaliação ou verificação de permanência"""
+        zona = self.zonas.pop(zona_id, None)
+        if zona is not None:
+            self._tirar_das_celulas(zona)
+
+    def _tirar_das_celulas(self, zona: Zona):
+        for celula in self._celulas_da(zona):
+            zonas = self._celulas.get(celula)
+            if zonas is not None:
+                zonas.discard(zona)
+                if not zonas:
+                    del self._celulas[celula]
+
+    def limpar(self):
+        self.zonas.clear()
+        self._celulas.clear()
+        self._dentro.clear()
+
+    def restaurar(self, zona_id: int, driver_id: int, desde: float, permaneceu: bool):
+        """Driver já dentro da zona (último evento gravado por outro worker)"""
+        if zona_id in self.zonas:
+            self._dentro.setdefault(driver_id, {})[zona_id] = [desde, permaneceu]
+
+    def avaliar(self, driver_id: int, lat: float, lon: float, instante: float):
+        """Testar a posição nova contra as zonas candidatas e emitir enter/exit"""
+        self.avaliacoes += 1
+        dentro = self._dentro.get(driver_id)
+        candidatas = self._celulas.get(self._celula(lat, lon), ())
+        if dentro:
+            for zona_id in [z for z in dentro if z not in self.zonas]:
+                del dentro[zona_id]
+            candidatas = set(candidatas) | {self.zonas[zona_id] for zona_id in dentro}
+        for zona in candidatas:
+            estado = dentro.get(zona.id) if dentro else None
+            if zona.driver_id is not None and zona.driver_id != driver_id:
+                if estado is not None:
+                    del dentro[zona.id]  # a entrega passou para outro driver
+                continue
+            self.testes += 1
+            distancia = zona.distancia_borda(lat, lon)
+            if estado is None and distancia <= 0:
+                if dentro is None:
+                    dentro = self._dentro[driver_id] = {}
+                dentro[zona.id] = [instante, False]
+                self._emitir("enter", zona, driver_id, lat, lon, instante)
+            elif estado is not None and distancia > self.histerese_m:
+                del dentro[zona.id]
+                self._emitir("exit", zona, driver_id, lat, lon, instante)
+        if dentro is not None and not dentro:
+            del self._dentro[driver_id]
+
+    def verificar_permanencia(self, agora: float, posicao_de):
+        """Emitir dwell de quem está numa zona há CERCAS_PERMANENCIA_S (uma vez por
+        visita); posicao_de(driver_id) -> (lat, lon) atual"""
+        for driver_id in list(self._dentro):
+            zonas = self._dentro[driver_id]
+            for zona_id in [z for z in zonas if z not in self.zonas]:
+                del zonas[zona_id]
+            if not zonas:
+                del self._dentro[driver_id]
+                continue
+            for zona_id, estado in zonas.items():
+                if not estado[1] and agora - estado[0] >= self.permanencia_s:
+                    estado[1] = True
+                    lat, lon = posicao_de(driver_id) or (self.zonas[zona_id].lat, self.zonas[zona_id].lon)
+                    self._emitir("dwell", self.zonas[zona_id], driver_id, lat, lon, agora)
+
+    def _emitir(self, tipo: str, zona: Zona, driver_id: int, lat: float, lon: float, instante: float):
+        if self.ao_evento is not None:
+            self.ao_evento({
+                "geofence_id": zona.id, "delivery_id": zona.delivery_id, "driver_id": driver_id,
+                "event": tipo, "kind": zona.tipo, "lat": lat, "lon": lon,
+                "occurred_at": datetime.fromtimestamp(instante, timezone.utc).replace(tzinfo=None),
+            })
+
+
+def zona_da_linha(linha) -> Zona:
+    """Zona a partir de uma linha de GeofenceController.listar_zonas_async"""
+    vertices = [tuple(v) for v in json.loads(linha.polygon)] if linha.shape == "polygon" else None
+    return Zona(linha.id, linha.delivery_id, linha.driver_id, linha.kind, linha.shape,
+                linha.lat, linha.lon, linha.radius_m, vertices)
+
+
+def cercas_da_entrega(entrega) -> list[dict]:
+    """Zonas padrão de uma entrega nova: círculos de CERCAS_RAIO_M na coleta e no destino"""
+    if CERCAS_RAIO_M <= 0:
+        return []
+    return [
+        {"kind": "pickup", "shape": "circle", "lat": entrega.pickup_lat, "lon": entrega.pickup_lon,
+         "radius_m": CERCAS_RAIO_M, "polygon": None},
+        {"kind": "dropoff", "shape": "circle", "lat": entrega.dropoff_lat, "lon": entrega.dropoff_lon,
+         "radius_m": CERCAS_RAIO_M, "polygon": None},
+    ]
+
+
+_ganchos = []
+_pendentes: list[dict] = []
+_estatisticas = {"enter": 0, "exit": 0, "dwell": 0, "gravados": 0, "falhas": 0, "coletas": 0}
+
+
+def registrar_gancho(funcao):
+    """funcao(evento: dict) é chamada no event loop para cada evento, antes da gravação
+    (ex.: coletar_ao_sair); exceções só vão para o log"""
+    _ganchos.append(funcao)
+
+
+def _ao_evento(evento: dict):
+    _estatisticas[evento["event"]] += 1
+    _pendentes.append(evento)
+    for gancho in _ganchos:
+        try:
+            gancho(evento)
+        except Exception:
+            logger.exception("Falha no gancho de cercas %r", gancho)
+
+
+_tarefas_ganchos: set[asyncio.Task] = set()
+
+
+async def _marcar_coletada(delivery_id: int, driver_id: int):
+    from app.config.database import AsyncSessionLocal
+    from app.controllers import DeliveryController
+
+    async with AsyncSessionLocal() as db:
+        # Só assigned -> picked_up do próprio driver: já coletada ou reatribuída, nada muda
+        if await DeliveryController.mudar_status_async(db, delivery_id, "picked_up", driver_id) is not None:
+            _estatisticas["coletas"] += 1
+
+
+def _tarefa_concluida(tarefa: asyncio.Task):
+    _tarefas_ganchos.discard(tarefa)
+    if not tarefa.cancelled() and tarefa.exception() is not None:
+        logger.error("Falha ao marcar entrega coletada", exc_info=tarefa.exception())
+
+
+def coletar_ao_sair(evento: dict):
+    """Gancho: o driver saiu da zona de coleta da entrega dele -> picked_up"""
+    if evento["event"] != "exit" or evento["kind"] != "pickup" or evento["delivery_id"] is None:
+        return
+    tarefa = asyncio.get_running_loop().create_task(_marcar_coletada(evento["delivery_id"], evento["driver_id"]))
+    _tarefas_ganchos.add(tarefa)
+    tarefa.add_done_callback(_tarefa_concluida)
+
+
+if CERCAS_COLETA_AUTOMATICA:
+    registrar_gancho(coletar_ao_sair)
+
+motor = MotorCercas(ao_evento=_ao_evento)
+_carregado = False  # este worker é o avaliador e já leu as zonas
+_trava = None
+_tarefa: asyncio.Task | None = None
+
+
+def ao_mover(posicao, anterior):
+    """Chamado pelo índice de posições quando um driver ativo muda de lugar"""
+    if _carregado:
+        motor.avaliar(posicao.driver_id, posicao.lat, posicao.lon, time.time())
+
+
+def _assumir() -> bool:
+    """Só um worker da instância avalia as cercas: quem segura o flock"""
+    global _trava
+    if _trava is not None or fcntl is None:
+        return True
+    os.makedirs(workers.WORKERS_DIR, exist_ok=True)
+    arquivo = open(os.path.join(workers.WORKERS_DIR, "cercas.lock"), "w")
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        arquivo.close()
+        return False
+    _trava = arquivo
+    return True
+
+
+async def _sincronizar(desde: datetime | None) -> datetime | None:
+    """Aplicar as zonas alteradas depois de desde (None: carga completa, retomando
+    quem já estava dentro pelo último evento gravado); devolve o maior updated_at"""
+    from app.config.database import AsyncReadSessionLocal
+    from app.controllers import GeofenceController
+    from app.models.delivery import STATUS_EM_ANDAMENTO
+
+    async with AsyncReadSessionLocal() as db:
+        linhas = await GeofenceController.listar_zonas_async(db, desde)
+        ultimos = [] if desde is not None else await GeofenceController.ultimos_eventos_async(
+            db, [linha.id for linha in linhas]
+        )
+    maximo = desde
+    for linha in linhas:
+        valida = linha.active and (linha.delivery_id is None or linha.status in STATUS_EM_ANDAMENTO)
+        if valida:
+            motor.registrar(zona_da_linha(linha))
+        else:
+            motor.remover(linha.id)
+        for alterada in (linha.updated_at, linha.delivery_updated_at):
+            if alterada is not None and (maximo is None or alterada > maximo):
+                maximo = alterada
+    for ultimo in ultimos:
+        if ultimo.event != "exit":
+            motor.restaurar(ultimo.geofence_id, ultimo.driver_id, _instante(ultimo.occurred_at), ultimo.event == "dwell")
+    return maximo
+
+
+async def gravar():
+    """Gravar numa transação os eventos pendentes (voltam para a fila se falhar)"""
+    global _pendentes
+    from app.config.database import AsyncSessionLocal
+    from app.controllers import GeofenceController
+
+    if not _pendentes:
+        return
+    eventos, _pendentes = _pendentes, []
+    try:
+        async with AsyncSessionLocal() as db:
+            await GeofenceController.gravar_eventos_async(
+                db, [{k: v for k, v in evento.items() if k != "kind"} for evento in eventos]
+            )
+    except Exception:
+        _estatisticas["falhas"] += 1
+        _pendentes = eventos + _pendentes
+        raise
+    _estatisticas["gravados"] += len(eventos)
+
+
+async def _loop_cercas():
+    global _carregado
+    from app.services import posicoes
+
+    def posicao_de(driver_id):
+        posicao = posicoes.indice.obter(driver_id)
+        return None if posicao is None else (posicao.lat, posicao.lon)
+
+    desde = None
+    while True:
+        await asyncio.sleep(CERCAS_SYNC_S)
+        if not _assumir():
+            continue
+        try:
+            if not _carregado:
+                motor.limpar()
+                desde = await _sincronizar(None)
+                _carregado = True
+            else:
+                visto = await _sincronizar(None if desde is None else desde - _SOBREPOSICAO)
+                if visto is not None and (desde is None or visto > desde):
+                    desde = visto
+            motor.verificar_permanencia(time.time(), posicao_de)
+            await gravar()
+        except Exception:
+            logger.exception("Falha na rodada das cercas")
+
+
+def estatisticas() -> dict:
+    return {
+        **_estatisticas, "zonas": len(motor), "avaliador": _carregado,
+        "avaliacoes": motor.avaliacoes, "testes": motor.testes, "pendentes": len(_pendentes),
+    }
+
+
+def iniciar():
+    """Chamar no startup do worker"""
+    global _tarefa
+    if CERCAS_ATIVAS:
+        _tarefa = asyncio.get_running_loop().create_task(_loop_cercas())
+
+
+async def encerrar():
+    """Chamar no shutdown: parar a sincronização e gravar os eventos pendentes"""
+    global _tarefa, _trava, _carregado
+    if _tarefa is not None:
+        _tarefa.cancel()
+        _tarefa = None
+    if _carregado:
+        try:
+            await gravar()
+        except Exception:
+            logger.exception("Falha ao gravar %d eventos de cercas no shutdown", len(_pendentes))
+    _carregado = False
+    if _trava is not None:
+        _trava.close()
+        _trava = None
@@ -0,0 +1,81 @@
+import re
+import zlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response, status
+
+# Requests condicionais (ETag / Last-Modified / If-Match) derivados de id + updated_at.
+# ETag: "<prefixo><id>-<updated_at com microssegundos>[-<crc dos campos>]", ex.: "d12-20250101120000123456"
+_FORMATO_VERSAO = "%Y%m%d%H%M%S%f"
+
+
+def etag(prefixo: str, id_: int, atualizado_em: datetime, campos: tuple[str, ...] | None = None) -> str:
+    """Validador forte do recurso; ?fields= é outra representação e ganha outra ETag"""
+    valor = f"{prefixo}{id_}-{atualizado_em.strftime(_FORMATO_VERSAO)}"
+    if campos:
+        valor += f"-{zlib.crc32(','.join(campos).encode()):08x}"
+    return f'"{valor}"'
+
+
+def _utc(data: datetime) -> datetime:
+    # updated_at é gravado com datetime.utcnow (sem fuso)
+    return data.replace(tzinfo=timezone.utc) if data.tzinfo is None else data
+
+
+def cabecalhos(etag_: str, atualizado_em: datetime) -> dict:
+    """ETag + Last-Modified; no-cache: o cliente pode guardar, mas sempre revalida"""
+    return {
+        "ETag": etag_,
+        "Last-Modified": format_datetime(_utc(atualizado_em), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def tem_condicao(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _etags(cabecalho: str) -> list[str]:
+    return [parte.strip() for parte in cabecalho.split(",") if parte.strip()]
+
+
+def nao_modificado(request: Request, etag_: str, atualizado_em: datetime) -> bool:
+    """If-None-Match (comparação fraca) tem precedência sobre If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [valor.removeprefix("W/") for valor in _etags(if_none_match)]
+        return "*" in etags or etag_ in etags
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        data = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # Last-Modified tem resolução de segundos
+    return _utc(atualizado_em).replace(microsecond=0) <= _utc(data)
+
+
+def resposta_304(etag_: str, atualizado_em: datetime) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos(etag_, atualizado_em))
+
+
+def versoes_if_match(request: Request, prefixo: str, id_: int) -> list[datetime] | None:
+    """Versões (updated_at) aceitas pelo If-Match do PUT.
+
+    None: sem If-Match (ou "*"), atualizar incondicionalmente; lista vazia: nenhuma
+    ETag do cabeçalho é deste recurso (o PUT deve falhar com 412).
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return None
+    etags = _etags(if_match)
+    if "*" in etags:
+        return None
+    padrao = re.compile(rf'"{re.escape(prefixo)}{id_}-(\d{{20}})(?:-[0-9a-f]{{8}})?"')
+    versoes = []
+    for valor in etags:
+        encontrado = padrao.fullmatch(valor)  # ETags fracas (W/) não servem para If-Match
+        if encontrado:
+            versoes.append(datetime.strptime(encontrado.group(1), _FORMATO_VERSAO))
+    return versoes
@@ -0,0 +1,213 @@
+import contextvars
+import logging
+import os
+import re
+import time
+from app.services import metricas
+
+# Inspeção das consultas SQL de cada request: log de consultas lentas, detector
+# de N+1 (a mesma consulta repetida num request), plano de execução de full
+# scans e orçamento de consultas por rota (verificado em modo teste)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Parâmetros no log de consultas lentas (podem conter emails e hashes de senha)
+SLOW_QUERY_PARAMETROS = os.getenv(
+    "SLOW_QUERY_PARAMETROS", "0" if os.getenv("ENVIRONMENT") == "production" else "1"
+) == "1"
+# A mesma consulta N vezes num request gera aviso (0 desliga)
+QUERY_REPETIDA = int(os.getenv("QUERY_REPETIDA", "2"))
+# EXPLAIN QUERY PLAN (SQLite) uma vez por consulta distinta, avisando full scans
+QUERY_EXPLAIN = os.getenv("QUERY_EXPLAIN", "1") == "1"
+QUERY_EXPLAIN_CACHE = int(os.getenv("QUERY_EXPLAIN_CACHE", "1024"))
+# Orçamento: desligado | log | erro (erro: o request falha com OrcamentoExcedido, para testes)
+QUERY_ORCAMENTO = os.getenv("QUERY_ORCAMENTO", "log")
+QUERY_ORCAMENTO_PADRAO = int(os.getenv("QUERY_ORCAMENTO_PADRAO", "10"))
+
+logger = logging.getLogger("tmax.consultas")
+
+_SEM_ORCAMENTO = object()
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+
+
+class OrcamentoExcedido(AssertionError):
+    """Request executou mais consultas do que o orçamento da rota"""
+
+
+class _Request:
+    __slots__ = ("scope", "total", "consultas")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.total = 0
+        self.consultas = {}  # statement: vezes
+
+
+_atual = contextvars.ContextVar("tmax_consultas", default=None)
+# statement: linhas do plano com full scan (None quando o plano usa índices)
+_planos: dict[str, list[str] | None] = {}
+
+
+def orcamento(limite: int | None):
+    """Declarar quantas consultas a rota pode fazer por request (None: sem limite).
+    Rotas autenticadas contam também a identidade do token, lida quando fora do cache"""
+
+    def decorar(func):
+        func.__orcamento_consultas__ = limite
+        return func
+
+    return decorar
+
+
+def _origem() -> str:
+    request = _atual.get()
+    if request is None:
+        return "fora de request"
+    return f"{request.scope['method']} {metricas.rota(request.scope)}"
+
+
+def _formatar_parametros(parametros) -> str:
+    def curto(valor):
+        texto = repr(valor)
+        return texto if len(texto) <= 80 else texto[:77] + "..."
+
+    if isinstance(parametros, dict):
+        return "{" + ", ".join(f"{k}: {curto(v)}" for k, v in parametros.items()) + "}"
+    if isinstance(parametros, (list, tuple)):
+        return "(" + ", ".join(curto(v) for v in parametros) + ")"
+    return curto(parametros)
+
+
+def _full_scans(cursor_bruto, statement: str, parametros) -> list[str] | None:
+    """Linhas do EXPLAIN QUERY PLAN que varrem uma tabela inteira"""
+    cursor_bruto.execute(f"EXPLAIN QUERY PLAN {statement}", parametros)
+    linhas = [linha[-1] for linha in cursor_bruto.fetchall()]
+    scans = [
+        detalhe for detalhe in linhas
+        if detalhe.startswith("SCAN ") and "INDEX" not in detalhe
+        and "PRIMARY KEY" not in detalhe and "CONSTANT ROW" not in detalhe
+    ]
+    if scans and _varredura_pela_chave(statement, linhas):
+        return None
+    return linhas if scans else None
+
+
+def _varredura_pela_chave(statement: str, linhas: list[str]) -> bool:
+    """SCAN de uma tabela só, sem filtro nem ordenação temporária, com LIMIT (ex.:
+    ORDER BY id LIMIT n): segue o rowid e para depois de n linhas. Com WHERE, o SCAN
+    pode ler a tabela toda até achar as n linhas, então continua sendo avisado"""
+    return (
+        len(linhas) == 1 and linhas[0].startswith("SCAN ")
+        and _LIMIT.search(statement) is not None and _WHERE.search(statement) is None
+    )
+
+
+def _explicar(conn, statement: str, parametros):
+    if len(_planos) >= QUERY_EXPLAIN_CACHE:
+        return
+    _planos[statement] = None
+    cursor_bruto = conn.connection.cursor()
+    try:
+        plano = _full_scans(cursor_bruto, statement, parametros)
+    except Exception:
+        return  # consulta que o EXPLAIN não aceita: ignorar
+    finally:
+        cursor_bruto.close()
+    if plano is not None:
+        _planos[statement] = plano
+        logger.warning(
+            "Full scan em %s: %s\n  plano: %s", _origem(), statement, " | ".join(plano)
+        )
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    request = _atual.get()
+    if request is not None:
+        request.total += 1
+        request.consultas[statement] = request.consultas.get(statement, 0) + 1
+    context._tmax_inicio = time.perf_counter()
+
+
+def _depois(conn, cursor, statement, parameters, context, executemany):
+    duracao = time.perf_counter() - context._tmax_inicio
+    if duracao * 1000 >= SLOW_QUERY_MS:
+        if not SLOW_QUERY_PARAMETROS:
+            detalhe = ""
+        elif executemany:
+            # Lote: só a primeira linha
+            detalhe = f"\n  parâmetros ({len(parameters)} linhas): {_formatar_parametros(parameters[0])}, ..."
+        else:
+            detalhe = f"\n  parâmetros: {_formatar_parametros(parameters)}"
+        logger.warning("Consulta lenta (%.1f ms) em %s: %s%s", duracao * 1000, _origem(), statement, detalhe)
+    if (
+        QUERY_EXPLAIN and not executemany and statement not in _planos
+        and conn.dialect.name == "sqlite" and statement.lstrip()[:6].upper() == "SELECT"
+    ):
+        _explicar(conn, statement, parameters)
+
+
+def instrumentar_engines(*engines):
+    """Registrar os eventos de inspeção nos engines (síncronos ou async)"""
+    from sqlalchemy import event
+    for engine in engines:
+        alvo = getattr(engine, "sync_engine", engine)
+        if not event.contains(alvo, "before_cursor_execute", _antes):
+            event.listen(alvo, "before_cursor_execute", _antes)
+            event.listen(alvo, "after_cursor_execute", _depois)
+
+
+def full_scans() -> dict[str, list[str]]:
+    """Consultas já vistas cujo plano varre uma tabela inteira"""
+    return {statement: plano for statement, plano in _planos.items() if plano is not None}
+
+
+# Listas de IN com tamanhos diferentes são a mesma consulta
+_LISTA_PARAMETROS = re.compile(r"\(\?(?:, \?)*\)|\(%\(\w+\)s(?:, %\(\w+\)s)*\)")
+
+
+def _repetidas(request: _Request) -> dict[str, int]:
+    formas = {}
+    for statement, vezes in request.consultas.items():
+        forma = _LISTA_PARAMETROS.sub("(?...)", statement)
+        formas[forma] = formas.get(forma, 0) + vezes
+    return {forma: vezes for forma, vezes in formas.items() if vezes >= QUERY_REPETIDA}
+
+
+def _verificar(request: _Request, metodo: str, rota: str):
+    if QUERY_REPETIDA and request.total >= QUERY_REPETIDA:
+        for forma, vezes in _repetidas(request).items():
+            logger.warning("Consulta repetida %d vezes em %s %s: %s", vezes, metodo, rota, forma)
+
+    if QUERY_ORCAMENTO == "desligado":
+        return
+    limite = getattr(request.scope.get("endpoint"), "__orcamento_consultas__", _SEM_ORCAMENTO)
+    if limite is _SEM_ORCAMENTO:
+        limite = QUERY_ORCAMENTO_PADRAO
+    if limite is None or request.total <= limite:
+        return
+    mensagem = (
+        f"{metodo} {rota} executou {request.total} consultas (orçamento: {limite}):\n  "
+        + "\n  ".join(f"{vezes}x {statement}" for statement, vezes in request.consultas.items())
+    )
+    if QUERY_ORCAMENTO == "erro":
+        raise OrcamentoExcedido(mensagem)
+    logger.warning(mensagem)
+
+
+class InspecaoConsultas:
+    """Middleware ASGI: acompanha as consultas de cada request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = _Request(scope)
+        token = _atual.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _atual.reset(token)
+            metodo, rota = scope["method"], metricas.rota(scope)
+            metricas.observar_consultas(metodo, rota, request.total)
+        _verificar(request, metodo, rota)
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from app.services import blobs, imagens
+
+try:
+    import fcntl
+except ImportError:  # Windows: desenvolvimento, um processo só
+    fcntl = None
+
+# Cache de derivados (miniaturas) gerados sob demanda a partir dos blobs. A chave é
+# o hash do conteúdo de origem: um derivado nunca fica desatualizado e o mesmo blob
+# pode ser de vários drivers, então nada é invalidado na troca de imagem; o que
+# deixa de ser pedido sai pelo LRU (memória e disco)
+DERIVADOS_DIR = os.getenv("DERIVADOS_DIR", os.path.join(blobs.BLOB_DIR, "derivados"))
+DERIVADOS_MEM_BYTES = int(os.getenv("DERIVADOS_MEM_BYTES", str(32 * 1024 * 1024)))
+DERIVADOS_DISCO_BYTES = int(os.getenv("DERIVADOS_DISCO_BYTES", str(512 * 1024 * 1024)))
+
+# Larguras permitidas; pedidos intermediários são arredondados para cima
+LARGURAS = (64, 128, 256, 512, 1024)
+FORMATOS = ("jpeg", "webp")
+
+
+def largura_permitida(largura: int) -> int:
+    """Arredondar para a menor largura permitida que atende o pedido"""
+    for permitida in LARGURAS:
+        if largura <= permitida:
+            return permitida
+    return LARGURAS[-1]
+
+
+def _chave(hash_origem: str, largura: int, formato: str) -> str:
+    return f"{hash_origem}-{largura}.{formato}"
+
+
+def etag(hash_origem: str, largura: int, formato: str) -> str:
+    return f'"{_chave(hash_origem, largura, formato)}"'
+
+
+class _LRU:
+    """LRU em memória limitado pelo total de bytes"""
+
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        self.total = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave][0]
+
+    def adicionar(self, chave, valor, tamanho: int):
+        with self._lock:
+            if chave in self._itens:
+                self.total -= self._itens.pop(chave)[1]
+            self._itens[chave] = (valor, tamanho)
+            self.total += tamanho
+            while self.total > self.capacidade and len(self._itens) > 1:
+                _, (_, tam) = self._itens.popitem(last=False)
+                self.total -= tam
+
+    def __len__(self):
+        return len(self._itens)
+
+
+def _caminho_disco(chave: str) -> str:
+    return os.path.join(DERIVADOS_DIR, chave[:2], chave)
+
+
+def _apagar_arquivo(chave: str):
+    try:
+        os.unlink(_caminho_disco(chave))
+    except FileNotFoundError:
+        pass
+
+
+_memoria = _LRU(DERIVADOS_MEM_BYTES)
+_em_andamento: dict[str, asyncio.Task] = {}
+_estatisticas = {"hits_memoria": 0, "hits_disco": 0, "renderizacoes": 0, "coalescidos": 0}
+# O disco é compartilhado pelos workers: o mtime de cada arquivo é o "último uso" do
+# LRU, e o total é medido varrendo o diretório (sob flock) depois de cada
+# DERIVADOS_DISCO_BYTES / 10 gravados por este worker
+_disco = {"itens": 0, "bytes": 0, "gravados": 0, "varreduras": 0}
+_disco_lock = threading.Lock()
+
+
+def varrer_disco():
+    """Medir o diretório e, acima de DERIVADOS_DISCO_BYTES, apagar os menos usados até
+    90% do limite. Um worker por vez (flock); os outros pulam a varredura. Chamada no
+    startup do worker e a cada DERIVADOS_DISCO_BYTES / 10 gravados por ele"""
+    if not os.path.isdir(DERIVADOS_DIR):
+        return
+    with open(os.path.join(DERIVADOS_DIR, ".varredura.lock"), "w") as trava:
+        if fcntl is not None:
+            try:
+                fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+        arquivos, total = [], 0
+        for raiz, _, nomes in os.walk(DERIVADOS_DIR):
+            for nome in nomes:
+                if nome.startswith("."):
+                    continue
+                try:
+                    info = os.stat(os.path.join(raiz, nome))
+                except FileNotFoundError:
+                    continue
+                arquivos.append((info.st_mtime, nome, info.st_size))
+                total += info.st_size
+        if total > DERIVADOS_DISCO_BYTES:
+            arquivos.sort()
+            while arquivos and total > DERIVADOS_DISCO_BYTES * 0.9:
+                _, nome, tamanho = arquivos.pop(0)
+                _apagar_arquivo(nome)
+                total -= tamanho
+    with _disco_lock:
+        _disco.update(itens=len(arquivos), bytes=total, gravados=0, varreduras=_disco["varreduras"] + 1)
+
+
+def _ler_disco(chave: str) -> bytes | None:
+    caminho = _caminho_disco(chave)
+    try:
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+        os.utime(caminho)  # último uso, para o LRU do disco
+    except FileNotFoundError:
+        return None
+    return conteudo
+
+
+def _gravar_disco(chave: str, conteudo: bytes):
+    blobs.gravar_atomico(_caminho_disco(chave), conteudo)
+    with _disco_lock:
+        _disco["gravados"] += len(conteudo)
+        varrer = _disco["gravados"] >= DERIVADOS_DISCO_BYTES / 10
+    if varrer:
+        varrer_disco()
+
+
+async def _produzir(chave: str, hash_origem: str, largura: int, formato: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    conteudo = await loop.run_in_executor(None, _ler_disco, chave)
+    if conteudo is not None:
+        _estatisticas["hits_disco"] += 1
+    else:
+        _estatisticas["renderizacoes"] += 1
+        conteudo = await imagens.gerar_derivado(blobs.caminho(hash_origem), largura, formato)
+        await loop.run_in_executor(None, _gravar_disco, chave, conteudo)
+    _memoria.adicionar(chave, conteudo, len(conteudo))
+    return conteudo
+
+
+def _concluida(chave: str, tarefa: asyncio.Task):
+    _em_andamento.pop(chave, None)
+    if not tarefa.cancelled():
+        tarefa.exception()  # consumida: sem aviso quando todos os pedidos já desistiram
+
+
+async def obter(hash_origem: str, largura: int, formato: str) -> bytes:
+    """Obter o derivado (memória -> disco -> renderização única por chave)"""
+    chave = _chave(hash_origem, largura, formato)
+
+    conteudo = _memoria.obter(chave)
+    if conteudo is not None:
+        _estatisticas["hits_memoria"] += 1
+        return conteudo
+
+    # Coalescer: pedidos simultâneos da mesma chave aguardam a mesma tarefa, que não é
+    # cancelada quando um deles desiste (nem o primeiro)
+    tarefa = _em_andamento.get(chave)
+    if tarefa is not None:
+        _estatisticas["coalescidos"] += 1
+    else:
+        tarefa = asyncio.ensure_future(_produzir(chave, hash_origem, largura, formato))
+        _em_andamento[chave] = tarefa
+        tarefa.add_done_callback(lambda t: _concluida(chave, t))
+    return await asyncio.shield(tarefa)
+
+
+def estatisticas() -> dict:
+    return {
+        **_estatisticas,
+        "itens_memoria": len(_memoria),
+        "bytes_memoria": _memoria.total,
+        # Da última varredura do diretório (todos os workers)
+        "itens_disco": _disco["itens"],
+        "bytes_disco": _disco["bytes"],
+    }
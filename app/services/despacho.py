@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from app.services import posicoes, workers
+
+try:
+    import fcntl
+except ImportError:  # Windows: desenvolvimento, um processo só
+    fcntl = None
+
+# Despacho em lote: a cada DESPACHO_JANELA_S um worker junta as entregas abertas
+# (até DESPACHO_LOTE_MAX, mais antigas primeiro) e os drivers disponíveis (ativos,
+# com posição válida no índice e sem entrega em andamento), calcula a matriz de
+# distâncias até as coletas (haversine, NumPy, uma passada) e resolve a atribuição
+# ótima (Jonker-Volgenant do SciPy): o maior número de entregas com driver a até
+# DESPACHO_RAIO_M e, entre essas soluções, a menor distância total.
+DESPACHO_JANELA_S = float(os.getenv("DESPACHO_JANELA_S", "5"))  # 0 desliga o despacho automático
+DESPACHO_RAIO_M = float(os.getenv("DESPACHO_RAIO_M", "10000"))
+DESPACHO_LOTE_MAX = int(os.getenv("DESPACHO_LOTE_MAX", "2000"))
+
+RAIO_TERRA_M = 6371008.8
+# Custo de um par inviável: maior que qualquer soma de distâncias viáveis, então
+# o solver só usa um desses pares quando não há alternativa (e ele é descartado)
+_INVIAVEL = 1e12
+
+logger = logging.getLogger("tmax.despacho")
+
+_estatisticas = {"rodadas": 0, "atribuidas": 0, "conflitos": 0, "segundos": 0.0}
+_rodada = asyncio.Lock()  # uma rodada por vez neste worker
+_trava = None  # arquivo com flock do worker que faz o despacho automático
+_tarefa: asyncio.Task | None = None
+
+
+def matriz_distancias(lat_a, lon_a, lat_b, lon_b) -> np.ndarray:
+    """Distância haversine em metros de cada ponto a (linhas) a cada ponto b (colunas)"""
+    lat_a, lon_a, lat_b, lon_b = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat_a, lon_a, lat_b, lon_b))
+    h = np.sin(np.subtract.outer(lat_b, lat_a).T / 2) ** 2
+    h += np.outer(np.cos(lat_a), np.cos(lat_b)) * np.sin(np.subtract.outer(lon_b, lon_a).T / 2) ** 2
+    np.sqrt(np.minimum(h, 1.0, out=h), out=h)
+    return np.arcsin(h, out=h) * (2 * RAIO_TERRA_M)
+
+
+def atribuir(custos: np.ndarray, limite: float) -> tuple[np.ndarray, np.ndarray]:
+    """(linhas, colunas) da atribuição de menor custo, sem pares acima de limite"""
+    viavel = custos <= limite
+    # Linhas e colunas sem nenhum par viável ficam fora do problema
+    linhas_ok = np.flatnonzero(viavel.any(axis=1))
+    colunas_ok = np.flatnonzero(viavel.any(axis=0))
+    if not len(linhas_ok):
+        return linhas_ok, colunas_ok
+    reduzido = custos[np.ix_(linhas_ok, colunas_ok)]
+    reduzido[~viavel[np.ix_(linhas_ok, colunas_ok)]] = _INVIAVEL
+    linhas, colunas = linear_sum_assignment(reduzido)
+    manter = reduzido[linhas, colunas] <= limite
+    return linhas_ok[linhas[manter]], colunas_ok[colunas[manter]]
+
+
+def planejar(entregas: dict, drivers: dict, raio_m: float = DESPACHO_RAIO_M) -> list[tuple[int, int, float]]:
+    """(delivery_id, driver_id, metros até a coleta) da melhor atribuição.
+
+    entregas e drivers são dicts de arrays (id, lat, lon, tipo); tipo -1 na entrega
+    aceita qualquer veículo. Só NumPy/SciPy: pode rodar fora do event loop.
+    """
+    custos = matriz_distancias(entregas["lat"], entregas["lon"], drivers["lat"], drivers["lon"])
+    incompativel = (entregas["tipo"][:, None] >= 0) & (entregas["tipo"][:, None] != drivers["tipo"][None, :])
+    custos[incompativel] = np.inf
+    linhas, colunas = atribuir(custos, raio_m)
+    return list(zip(
+        entregas["id"][linhas].tolist(), drivers["id"][colunas].tolist(), custos[linhas, colunas].tolist()
+    ))
+
+
+def _arrays(entregas: list, drivers: list) -> tuple[dict, dict]:
+    # Tipos de veículo viram inteiros para comparar na matriz
+    codigos = {}
+
+    def tipo(nome: str | None) -> int:
+        return -1 if nome is None else codigos.setdefault(nome, len(codigos))
+
+    return (
+        {
+            "id": np.fromiter((e.id for e in entregas), np.int64, len(entregas)),
+            "lat": np.fromiter((e.pickup_lat for e in entregas), np.float64, len(entregas)),
+            "lon": np.fromiter((e.pickup_lon for e in entregas), np.float64, len(entregas)),
+            "tipo": np.fromiter((tipo(e.vehicle_type) for e in entregas), np.int64, len(entregas)),
+        },
+        {
+            "id": np.fromiter((p.driver_id for p in drivers), np.int64, len(drivers)),
+            "lat": np.fromiter((p.lat for p in drivers), np.float64, len(drivers)),
+            "lon": np.fromiter((p.lon for p in drivers), np.float64, len(drivers)),
+            # Tipo que nenhuma entrega pediu: -2 (só casa com entregas sem tipo)
+            "tipo": np.fromiter((codigos.get(p.vehicle_type, -2) for p in drivers), np.int64, len(drivers)),
+        },
+    )
+
+
+async def despachar() -> dict:
+    """Uma rodada: ler entregas e drivers, resolver e gravar as atribuições numa transação"""
+    from app.config.database import AsyncReadSessionLocal, AsyncSessionLocal
+    from app.controllers import DeliveryController
+
+    async with _rodada:
+        inicio = time.perf_counter()
+        async with AsyncReadSessionLocal() as leitura:
+            entregas = await DeliveryController.listar_abertas_async(leitura, DESPACHO_LOTE_MAX)
+            ocupados = await DeliveryController.listar_drivers_ocupados_async(leitura) if entregas else set()
+        drivers = [p for p in posicoes.indice.ativos() if p.driver_id not in ocupados] if entregas else []
+        atribuidas = []
+        if entregas and drivers:
+            plano = await asyncio.to_thread(planejar, *_arrays(entregas, drivers))
+            async with AsyncSessionLocal() as db:
+                gravadas = dict(await DeliveryController.atribuir_async(db, {e: d for e, d, _ in plano}))
+            atribuidas = [(e, d, metros) for e, d, metros in plano if gravadas.get(e) == d]
+            # Planejadas e não gravadas: outro despacho pegou a entrega ou o driver antes
+            _estatisticas["conflitos"] += len(plano) - len(atribuidas)
+        duracao = time.perf_counter() - inicio
+        _estatisticas["rodadas"] += 1
+        _estatisticas["atribuidas"] += len(atribuidas)
+        _estatisticas["segundos"] += duracao
+    return {
+        "assignments": [
+            {"delivery_id": e, "driver_id": d, "distance_m": round(metros, 1)} for e, d, metros in atribuidas
+        ],
+        "open_deliveries": len(entregas),
+        "available_drivers": len(drivers),
+        "seconds": round(duracao, 4),
+    }
+
+
+def _assumir_despacho() -> bool:
+    """Só um worker da instância despacha automaticamente: quem segura o flock
+    (liberado pelo sistema se o processo morrer; outro worker assume na janela seguinte)"""
+    global _trava
+    if _trava is not None or fcntl is None:
+        return True
+    os.makedirs(workers.WORKERS_DIR, exist_ok=True)
+    arquivo = open(os.path.join(workers.WORKERS_DIR, "despacho.lock"), "w")
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        arquivo.close()
+        return False
+    _trava = arquivo
+    return True
+
+
+async def _loop_despacho():
+    while True:
+        await asyncio.sleep(DESPACHO_JANELA_S)
+        if not _assumir_despacho():
+            continue
+        try:
+            resultado = await despachar()
+        except Exception:
+            logger.exception("Falha na rodada de despacho")
+            continue
+        if resultado["assignments"]:
+            logger.info(
+                "%d entregas atribuídas (%d abertas, %d drivers) em %.3fs", len(resultado["assignments"]),
+                resultado["open_deliveries"], resultado["available_drivers"], resultado["seconds"],
+            )
+
+
+def estatisticas() -> dict:
+    return {**_estatisticas, "automatico": _trava is not None}
+
+
+def iniciar():
+    """Chamar no startup do worker"""
+    global _tarefa, _rodada
+    _rodada = asyncio.Lock()  # ligado ao event loop deste worker
+    if DESPACHO_JANELA_S > 0:
+        _tarefa = asyncio.get_running_loop().create_task(_loop_despacho())
+
+
+def encerrar():
+    global _tarefa, _trava
+    if _tarefa is not None:
+        _tarefa.cancel()
+        _tarefa = None
+    if _trava is not None:
+        _trava.close()
+        _trava = None
@@ -0,0 +1,298 @@
+import heapq
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+from app.services.processos import PoolProcessos, workers_padrao
+
+# Tempo de viagem de moto pela malha viária (GET /eta). O grafo é gerado offline
+# (converter_osm.py) num diretório de arrays .npy abertos com mmap: adjacência CSR
+# (indptr/destino/segundos) e, para cada nó, o tempo de/para cada landmark (ALT).
+# Ponto a ponto: A* com a heurística dos landmarks (desigualdade triangular), que
+# visita uma fração dos nós do Dijkstra; um para muitos: Dijkstra do SciPy (C) a
+# partir da origem. As buscas rodam num pool de processos, que mapeiam os mesmos
+# arquivos (páginas compartilhadas pelo sistema); o índice dos nós (KD-tree) e o
+# cache de pares origem/destino ficam no processo do worker.
+ETA_GRAFO_DIR = os.getenv("ETA_GRAFO_DIR", "")  # vazio: GET /eta responde 503
+ETA_MAX_S = float(os.getenv("ETA_MAX_S", "10800"))  # além disso, destino inalcançável
+ETA_MAX_DESTINOS = int(os.getenv("ETA_MAX_DESTINOS", "100"))
+ETA_AJUSTE_MAX_M = float(os.getenv("ETA_AJUSTE_MAX_M", "1000"))  # ponto -> nó mais próximo
+ETA_ACESSO_KMH = float(os.getenv("ETA_ACESSO_KMH", "15"))  # trecho ponto <-> nó
+ETA_CACHE_PARES = int(os.getenv("ETA_CACHE_PARES", "200000"))
+ETA_WORKERS = int(os.getenv("ETA_WORKERS", str(workers_padrao(0.5))))
+# Até quantos destinos sem cache valem um A* cada; acima, um Dijkstra só
+_A_ESTRELA_MAX = 4
+_VERSAO = 1
+
+METROS_POR_GRAU = 6371008.8 * math.pi / 180
+
+
+class GrafoIndisponivel(RuntimeError):
+    """ETA_GRAFO_DIR não configurado"""
+
+
+class ForaDoGrafo(ValueError):
+    """Ponto a mais de ETA_AJUSTE_MAX_M do nó mais próximo"""
+
+
+class Grafo:
+    """Arrays do diretório gerado por construir(), abertos com mmap"""
+
+    def __init__(self, diretorio: str):
+        with open(os.path.join(diretorio, "meta.json")) as arquivo:
+            self.meta = json.load(arquivo)
+        if self.meta.get("versao") != _VERSAO:
+            raise ValueError(f"Grafo em {diretorio} é de outra versão; gere de novo com converter_osm.py")
+
+        def abrir(nome):
+            # ndarray comum sobre o mmap: indexar um np.memmap custa bem mais
+            return np.asarray(np.load(os.path.join(diretorio, nome + ".npy"), mmap_mode="r"))
+
+        self.lat, self.lon = abrir("lat"), abrir("lon")
+        self.indptr, self.destino, self.segundos = abrir("indptr"), abrir("destino"), abrir("segundos")
+        # (nós, 2 x landmarks): tempo de cada landmark até o nó e, negativo, do nó até ele
+        self.landmarks = abrir("landmarks")
+        self.explorados = 0  # nós fechados pelo A* (benchmark)
+        self._arvore = None
+        self._matriz = None
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def ajustar(self, lat: list[float], lon: list[float]) -> tuple[list[int], list[float]]:
+        """Nó mais próximo de cada ponto e a distância até ele em metros"""
+        if self._arvore is None:
+            from scipy.spatial import cKDTree
+            self._arvore = cKDTree(self._plano(self.lat, self.lon))
+        distancias, nos = self._arvore.query(self._plano(np.asarray(lat), np.asarray(lon)))
+        return nos.tolist(), distancias.tolist()
+
+    def _plano(self, lat, lon) -> np.ndarray:
+        # Equiretangular na latitude média do grafo: metros, com erro desprezível numa cidade
+        return np.column_stack((lat * METROS_POR_GRAU, lon * (METROS_POR_GRAU * self.meta["cos_lat"])))
+
+    def a_estrela(self, origem: int, destino: int, limite: float) -> float | None:
+        """Menor tempo de origem a destino (None: acima de limite)"""
+        if origem == destino:
+            return 0.0
+        indptr, vizinhos, pesos = self.indptr, self.destino, self.segundos
+        landmarks = self.landmarks
+        alvo = landmarks[destino]
+        tempo = {origem: 0.0}
+        fechados = set()
+        heap = [(0.0, origem)]
+        while heap:
+            estimativa, no = heapq.heappop(heap)
+            if no == destino:
+                self.explorados += len(fechados)
+                return tempo[no]
+            if estimativa > limite:
+                break
+            if no in fechados:
+                continue
+            fechados.add(no)
+            inicio, fim = indptr[no:no + 2].tolist()
+            alvos = vizinhos[inicio:fim]
+            # Limite inferior do resto do caminho: d(v,t) >= d(L,t) - d(L,v) e >= d(v,L) - d(t,L)
+            restante = (alvo - landmarks[alvos]).max(axis=1)
+            base = tempo[no]
+            for vizinho, peso, falta in zip(alvos.tolist(), pesos[inicio:fim].tolist(), restante.tolist()):
+                novo = base + peso
+                if novo < tempo.get(vizinho, math.inf):
+                    tempo[vizinho] = novo
+                    heapq.heappush(heap, (novo + max(falta, 0.0), vizinho))
+        self.explorados += len(fechados)
+        return None
+
+    def um_para_muitos(self, origem: int, destinos: list[int], limite: float) -> list[float | None]:
+        """Dijkstra completo a partir da origem (até limite) e o tempo de cada destino"""
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import dijkstra
+        if self._matriz is None:
+            self._matriz = csr_matrix((self.segundos, self.destino, self.indptr), shape=(len(self), len(self)))
+        tempos = dijkstra(self._matriz, indices=origem, limit=limite)
+        return [None if math.isinf(t) else t for t in tempos[destinos].tolist()]
+
+
+_grafos: dict[str, Grafo] = {}  # por diretório, em cada processo do pool
+
+
+def calcular(diretorio: str, origem: int, destinos: list[int], limite: float) -> list[float | None]:
+    """Tempos da origem a cada destino (nós do grafo). Roda no pool (função top-level)."""
+    grafo = _grafos.get(diretorio)
+    if grafo is None:
+        grafo = _grafos[diretorio] = Grafo(diretorio)
+    if len(destinos) <= _A_ESTRELA_MAX:
+        return [grafo.a_estrela(origem, destino, limite) for destino in destinos]
+    return grafo.um_para_muitos(origem, destinos, limite)
+
+
+def _metros(lat_a, lon_a, lat_b, lon_b) -> np.ndarray:
+    """Haversine elemento a elemento"""
+    from app.services.despacho import RAIO_TERRA_M
+    lat_a, lon_a, lat_b, lon_b = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat_a, lon_a, lat_b, lon_b))
+    h = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def construir(diretorio: str, lat, lon, origens, destinos, segundos, landmarks: int = 16) -> dict:
+    """Gravar o grafo (arestas dirigidas origens[i] -> destinos[i] em segundos) no
+    formato de Grafo: só a maior componente fortemente conexa, arestas paralelas
+    reduzidas à mais rápida e os tempos de/para landmarks escolhidos pelo mais
+    distante dos já escolhidos. Offline: leva segundos a minutos."""
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components, dijkstra
+
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    origens, destinos = np.asarray(origens, dtype=np.int64), np.asarray(destinos, dtype=np.int64)
+    # Peso zero seria tratado como ausência de aresta pelo csgraph
+    segundos = np.maximum(np.asarray(segundos, dtype=np.float64), 1e-3)
+    laco = origens == destinos
+    origens, destinos, segundos = origens[~laco], destinos[~laco], segundos[~laco]
+
+    matriz = csr_matrix((np.ones(len(origens)), (origens, destinos)), shape=(len(lat), len(lat)))
+    _, componentes = connected_components(matriz, directed=True, connection="strong")
+    maior = np.bincount(componentes).argmax()
+    manter = componentes == maior
+    novo = np.cumsum(manter) - 1
+    validas = manter[origens] & manter[destinos]
+    origens, destinos, segundos = novo[origens[validas]], novo[destinos[validas]], segundos[validas]
+    lat, lon = lat[manter], lon[manter]
+    n = len(lat)
+
+    # Ordenar por (origem, destino, tempo) e manter a primeira de cada par
+    ordem = np.lexsort((segundos, destinos, origens))
+    origens, destinos, segundos = origens[ordem], destinos[ordem], segundos[ordem]
+    primeira = np.ones(len(origens), dtype=bool)
+    primeira[1:] = (origens[1:] != origens[:-1]) | (destinos[1:] != destinos[:-1])
+    origens, destinos, segundos = origens[primeira], destinos[primeira], segundos[primeira]
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(origens, minlength=n), out=indptr[1:])
+
+    ida = csr_matrix((segundos, destinos.astype(np.int32), indptr), shape=(n, n))
+    volta = ida.T.tocsr()
+    landmarks = min(landmarks, n)
+    tabela = np.empty((n, 2 * landmarks), dtype=np.float32)
+    mais_perto = np.full(n, np.inf)
+    atual = int(np.argmax(dijkstra(ida, indices=0)))
+    escolhidos = []
+    for k in range(landmarks):
+        escolhidos.append(atual)
+        de, para = dijkstra(ida, indices=atual), dijkstra(volta, indices=atual)
+        tabela[:, k], tabela[:, landmarks + k] = de, -para
+        mais_perto = np.minimum(mais_perto, de + para)
+        atual = int(np.argmax(mais_perto))
+
+    os.makedirs(diretorio, exist_ok=True)
+    arrays = {
+        "lat": lat, "lon": lon, "indptr": indptr, "destino": destinos.astype(np.int32),
+        "segundos": segundos, "landmarks": tabela,
+    }
+    for nome, valores in arrays.items():
+        np.save(os.path.join(diretorio, nome + ".npy"), valores)
+    meta = {
+        "versao": _VERSAO, "nos": n, "arestas": len(destinos), "landmarks": escolhidos,
+        "cos_lat": math.cos(math.radians(float(lat.mean()))),
+    }
+    with open(os.path.join(diretorio, "meta.json"), "w") as arquivo:
+        json.dump(meta, arquivo)
+    return meta
+
+
+class CachePares:
+    """LRU de (nó de origem, nó de destino) -> segundos (None: inalcançável)"""
+
+    def __init__(self, pares_max: int = ETA_CACHE_PARES):
+        self.pares_max = pares_max
+        self._pares: OrderedDict[tuple[int, int], float | None] = OrderedDict()
+        self.acertos = 0
+        self.calculados = 0
+
+    def obter(self, origem: int, destino: int):
+        par = (origem, destino)
+        if par not in self._pares:
+            return False, None
+        self._pares.move_to_end(par)
+        self.acertos += 1
+        return True, self._pares[par]
+
+    def guardar(self, origem: int, destino: int, segundos: float | None):
+        self._pares[(origem, destino)] = segundos
+        self.calculados += 1
+        if len(self._pares) > self.pares_max:
+            self._pares.popitem(last=False)
+
+    def limpar(self):
+        self._pares.clear()
+
+
+cache = CachePares()
+_grafo: Grafo | None = None  # no processo do worker: KD-tree dos nós
+_pool = PoolProcessos("eta", ETA_WORKERS)
+
+
+def carregar() -> Grafo | None:
+    """Abrir o grafo de ETA_GRAFO_DIR e montar o índice dos nós (no master, antes do
+    fork, fica compartilhado entre os workers)"""
+    global _grafo
+    if _grafo is None and ETA_GRAFO_DIR:
+        grafo = Grafo(ETA_GRAFO_DIR)
+        grafo.ajustar([0.0], [0.0])
+        _grafo = grafo
+    return _grafo
+
+
+async def estimar(origem: tuple[float, float], destinos: list[tuple[float, float]]) -> dict:
+    """Tempo de viagem da origem a cada destino: grafo entre os nós mais próximos e o
+    trecho até eles a ETA_ACESSO_KMH; eta_s None quando inalcançável ou fora do grafo"""
+    grafo = carregar()
+    if grafo is None:
+        raise GrafoIndisponivel("Grafo de ruas não configurado (ETA_GRAFO_DIR)")
+    inicio = time.perf_counter()
+    pontos = [origem] + destinos
+    nos, ajustes = grafo.ajustar([lat for lat, _ in pontos], [lon for _, lon in pontos])
+    if ajustes[0] > ETA_AJUSTE_MAX_M:
+        raise ForaDoGrafo(f"Origem a {ajustes[0]:.0f} m da via mais próxima")
+    no_origem = nos[0]
+    tempos, faltando = {}, []
+    for no, ajuste in zip(nos[1:], ajustes[1:]):
+        if ajuste > ETA_AJUSTE_MAX_M or no in tempos:
+            continue
+        achou, segundos = cache.obter(no_origem, no)
+        if achou:
+            tempos[no] = segundos
+        else:
+            tempos[no] = None
+            faltando.append(no)
+    if faltando:
+        calculados = await _pool.executar(calcular, ETA_GRAFO_DIR, no_origem, faltando, ETA_MAX_S)
+        for no, segundos in zip(faltando, calculados):
+            tempos[no] = segundos
+            cache.guardar(no_origem, no, segundos)
+    acesso = ETA_ACESSO_KMH / 3.6
+    resultados = []
+    for (lat, lon), no, ajuste in zip(destinos, nos[1:], ajustes[1:]):
+        segundos = tempos.get(no) if ajuste <= ETA_AJUSTE_MAX_M else None
+        if segundos is not None:
+            segundos = round(segundos + (ajustes[0] + ajuste) / acesso, 1)
+        resultados.append({"lat": lat, "lon": lon, "eta_s": segundos, "snap_m": round(ajuste, 1)})
+    return {
+        "origin": {"lat": origem[0], "lon": origem[1], "snap_m": round(ajustes[0], 1)},
+        "destinations": resultados,
+        "computed": len(faltando),
+        "seconds": round(time.perf_counter() - inicio, 4),
+    }
+
+
+def estatisticas() -> dict:
+    return {
+        "nos": 0 if _grafo is None else len(_grafo),
+        "pares": len(cache._pares), "acertos": cache.acertos, "calculados": cache.calculados,
+    }
+
+
+def encerrar():
+    """Encerrar o pool de processos (shutdown da aplicação)"""
+    _pool.encerrar()
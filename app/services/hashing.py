@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+import time
+from passlib.context import CryptContext
+from app.services.processos import PoolProcessos, workers_padrao
+
+# Configurações do pool de hashing
+# BCRYPT_ROUNDS controla o custo do bcrypt (cada +1 dobra o tempo de cada hash)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(workers_padrao())))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", str(HASH_WORKERS * 8)))
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "5"))
+# Importações em lote: senhas por tarefa enviada ao pool
+HASH_LOTE = int(os.getenv("HASH_LOTE", "16"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class FilaHashCheia(Exception):
+    """Fila do pool de hashing cheia por mais tempo que HASH_QUEUE_TIMEOUT"""
+
+
+# Funções executadas dentro dos processos do pool (precisam ser top-level)
+def _hash(senha: str) -> str:
+    return pwd_context.hash(senha)
+
+
+def _verify(senha: str, senha_hash: str) -> bool:
+    return pwd_context.verify(senha, senha_hash)
+
+
+def _hash_lote(senhas: list[str]) -> list[str]:
+    return [pwd_context.hash(senha) for senha in senhas]
+
+
+class _Estatisticas:
+    """Contadores de tempo por operação (hash/verify)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dados = {}
+
+    def registrar(self, operacao: str, espera: float, duracao: float):
+        with self._lock:
+            op = self._dados.setdefault(
+                operacao, {"chamadas": 0, "tempo_total": 0.0, "tempo_max": 0.0, "espera_total": 0.0}
+            )
+            op["chamadas"] += 1
+            op["tempo_total"] += duracao
+            op["espera_total"] += espera
+            op["tempo_max"] = max(op["tempo_max"], duracao)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {nome: dict(valores) for nome, valores in self._dados.items()}
+
+
+_estatisticas = _Estatisticas()
+_pool = PoolProcessos("hashing", HASH_WORKERS)
+_pendentes_lock = threading.Lock()
+_semaforo = threading.BoundedSemaphore(HASH_QUEUE_SIZE)
+_pendentes = 0
+
+
+def _reservar_vaga(bloqueante: bool) -> float:
+    """Reservar uma vaga na fila e retornar o tempo de espera"""
+    global _pendentes
+    inicio = time.perf_counter()
+    if not _semaforo.acquire(timeout=HASH_QUEUE_TIMEOUT if bloqueante else 0):
+        raise FilaHashCheia()
+    with _pendentes_lock:
+        _pendentes += 1
+    return time.perf_counter() - inicio
+
+
+def _liberar_vaga():
+    global _pendentes
+    with _pendentes_lock:
+        _pendentes -= 1
+    _semaforo.release()
+
+
+def _devolver_reserva(reserva: asyncio.Future):
+    if not reserva.cancelled() and reserva.exception() is None:
+        _liberar_vaga()
+
+
+async def _executar(operacao: str, func, *args):
+    loop = asyncio.get_running_loop()
+    # Tentativa sem bloquear; se a fila estiver cheia esperar fora do event loop
+    try:
+        espera = _reservar_vaga(bloqueante=False)
+    except FilaHashCheia:
+        reserva = loop.run_in_executor(None, _reservar_vaga, True)
+        try:
+            espera = await asyncio.shield(reserva)
+        except asyncio.CancelledError:
+            # A thread continua esperando e pode conseguir a vaga depois do
+            # cancelamento (cliente desconectou): devolver assim que conseguir
+            reserva.add_done_callback(_devolver_reserva)
+            raise
+    inicio = time.perf_counter()
+    try:
+        return await _pool.executar(func, *args)
+    finally:
+        _liberar_vaga()
+        _estatisticas.registrar(operacao, espera, time.perf_counter() - inicio)
+
+
+async def gerar_hash(senha: str) -> str:
+    """Gerar hash bcrypt da senha no pool de processos"""
+    return await _executar("hash", _hash, senha)
+
+
+async def verificar_hash(senha: str, senha_hash: str) -> bool:
+    """Verificar senha contra o hash no pool de processos"""
+    return await _executar("verify", _verify, senha, senha_hash)
+
+
+async def gerar_hashes(senhas: list[str]) -> list[str]:
+    """Gerar hashes de muitas senhas (importação em lote), na mesma ordem"""
+    # Fatias de HASH_LOTE senhas por tarefa; no máximo metade dos workers fica com o
+    # lote, o restante continua atendendo login e registro
+    paralelo = asyncio.Semaphore(max(1, HASH_WORKERS // 2))
+
+    async def fatia(parte: list[str]) -> list[str]:
+        async with paralelo:
+            return await _executar("hash_lote", _hash_lote, parte)
+
+    partes = [senhas[i:i + HASH_LOTE] for i in range(0, len(senhas), HASH_LOTE)]
+    resultados = await asyncio.gather(*(fatia(parte) for parte in partes))
+    return [senha_hash for parte in resultados for senha_hash in parte]
+
+
+def gerar_hash_sync(senha: str) -> str:
+    """Versão bloqueante de gerar_hash para código síncrono (scripts, CLI)"""
+    espera = _reservar_vaga(bloqueante=True)
+    inicio = time.perf_counter()
+    try:
+        return _pool.executar_sync(_hash, senha)
+    finally:
+        _liberar_vaga()
+        _estatisticas.registrar("hash", espera, time.perf_counter() - inicio)
+
+
+def estatisticas() -> dict:
+    """Métricas do pool: chamadas e tempos por operação"""
+    return {
+        "workers": HASH_WORKERS,
+        "recriacoes": _pool.recriacoes,
+        "rounds": BCRYPT_ROUNDS,
+        "capacidade_fila": HASH_QUEUE_SIZE,
+        "pendentes": _pendentes,
+        "operacoes": _estatisticas.snapshot(),
+    }
+
+
+def encerrar():
+    """Encerrar o pool de processos (shutdown da aplicação)"""
+    _pool.encerrar()
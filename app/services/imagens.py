@@ -0,0 +1,183 @@
+import io
+import os
+import tempfile
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from PIL import Image, ImageOps
+from app.services import metricas
+from app.services.processos import PoolProcessos, workers_padrao
+
+# Configurações de ingestão de imagens
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(workers_padrao(0.5))))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()  # jpeg ou webp
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+CHUNK_SIZE = 64 * 1024
+
+# Limites por tipo de upload: (bytes máximos recebidos, dimensão máxima após normalizar)
+LIMITES = {
+    "perfil": (int(os.getenv("UPLOAD_MAX_BYTES_PERFIL", str(10 * 1024 * 1024))), 1024),
+    "rg": (int(os.getenv("UPLOAD_MAX_BYTES_RG", str(15 * 1024 * 1024))), 2048),
+    "moto": (int(os.getenv("UPLOAD_MAX_BYTES_MOTO", str(15 * 1024 * 1024))), 1600),
+}
+
+# Proteção contra "decompression bombs" (ex.: PNG minúsculo com 100k x 100k pixels)
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(60_000_000)))
+
+_ASSINATURAS = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+
+
+class ImagemInvalida(Exception):
+    """Arquivo enviado não é uma imagem suportada"""
+
+
+class ImagemMuitoGrande(Exception):
+    """Arquivo enviado excede o limite de bytes do endpoint"""
+
+
+# Corpo máximo de cada rota de upload: arquivos aceitos x limite do tipo + cabeçalhos do multipart
+_MARGEM_MULTIPART = 64 * 1024
+_ROTAS_UPLOAD = {
+    "/driver/upload/profile": ("perfil", 1),
+    "/driver/upload/rg": ("rg", 2),
+    "/driver/vehicle": ("moto", 1),
+}
+
+
+def _mensagem_limite(tipo: str) -> str:
+    return f"Arquivo excede o limite de {LIMITES[tipo][0] // (1024 * 1024)} MB"
+
+
+class LimiteUploads:
+    """Middleware ASGI: limita o corpo dos POST de upload antes do parse do multipart,
+    que gravaria o corpo inteiro no spool antes de receber_upload ver o arquivo.
+    Content-Length acima do limite é rejeitado sem ler o corpo; sem ele (chunked),
+    a leitura para assim que passar do limite"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        rota = _ROTAS_UPLOAD.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if rota is None:
+            return await self.app(scope, receive, send)
+        tipo, arquivos = rota
+        limite = LIMITES[tipo][0] * arquivos + _MARGEM_MULTIPART
+        tamanho = dict(scope["headers"]).get(b"content-length", b"")
+        if tamanho.isdigit() and int(tamanho) > limite:
+            resposta = JSONResponse({"detail": _mensagem_limite(tipo)}, status_code=413, headers={"Connection": "close"})
+            return await resposta(scope, receive, send)
+        recebido = 0
+
+        async def receber():
+            nonlocal recebido
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebido += len(mensagem.get("body", b""))
+                if recebido > limite:
+                    raise HTTPException(status_code=413, detail=_mensagem_limite(tipo))
+            return mensagem
+
+        await self.app(scope, receber, send)
+
+
+def _e_imagem(cabecalho: bytes) -> bool:
+    if cabecalho.startswith(_ASSINATURAS):
+        return True
+    return cabecalho[:4] == b"RIFF" and cabecalho[8:12] == b"WEBP"
+
+
+def content_type(formato: str = IMAGE_FORMAT) -> str:
+    return "image/webp" if formato == "webp" else "image/jpeg"
+
+
+async def receber_upload(file: UploadFile, limite: int) -> str:
+    """Copiar o upload em chunks para um arquivo temporário, respeitando o limite.
+
+    Retorna o caminho do arquivo; quem chamar deve removê-lo.
+    """
+    # Rejeitar cedo quando o tamanho já é conhecido
+    if file.size is not None and file.size > limite:
+        raise ImagemMuitoGrande()
+
+    fd, caminho = tempfile.mkstemp(prefix="tmax-upload-")
+    total = 0
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if total == 0 and not _e_imagem(chunk[:12]):
+                    raise ImagemInvalida()
+                total += len(chunk)
+                if total > limite:
+                    raise ImagemMuitoGrande()
+                destino.write(chunk)
+        if total == 0:
+            raise ImagemInvalida()
+    except BaseException:
+        os.unlink(caminho)
+        raise
+    return caminho
+
+
+# Executado dentro dos processos do pool
+def _normalizar(caminho: str, dimensao_max: int, formato: str, qualidade: int) -> bytes:
+    try:
+        with Image.open(caminho) as img:
+            # JPEG: decodificar já em escala reduzida (economiza memória e CPU)
+            img.draft("RGB", (dimensao_max, dimensao_max))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((dimensao_max, dimensao_max), Image.Resampling.LANCZOS)
+
+            if formato == "webp":
+                if img.mode not in ("RGB", "RGBA"):
+                    img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+                saida = io.BytesIO()
+                img.save(saida, "WEBP", quality=qualidade, method=4)
+            else:
+                if img.mode != "RGB":
+                    # Transparência vira fundo branco no JPEG
+                    rgba = img.convert("RGBA")
+                    img = Image.new("RGB", rgba.size, (255, 255, 255))
+                    img.paste(rgba, mask=rgba.getchannel("A"))
+                saida = io.BytesIO()
+                img.save(saida, "JPEG", quality=qualidade, optimize=True, progressive=True)
+            # Metadados (EXIF/GPS) não são copiados: o save só recebe os pixels
+            return saida.getvalue()
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise ImagemInvalida() from e
+
+
+_pool = PoolProcessos("imagens", IMAGE_WORKERS)
+
+
+async def executar_no_pool(func, *args):
+    """Executar uma função top-level no pool de processos de imagem"""
+    return await _pool.executar(func, *args)
+
+
+async def normalizar(caminho: str, dimensao_max: int, formato: str = IMAGE_FORMAT) -> bytes:
+    """Orientar pelo EXIF, remover metadados, reduzir e recodificar no pool de processos"""
+    return await executar_no_pool(_normalizar, caminho, dimensao_max, formato, IMAGE_QUALITY)
+
+
+async def gerar_derivado(caminho: str, largura: int, formato: str) -> bytes:
+    """Gerar uma versão reduzida (miniatura) de uma imagem já normalizada"""
+    return await executar_no_pool(_normalizar, caminho, largura, formato, IMAGE_QUALITY)
+
+
+async def processar_upload(file: UploadFile, tipo: str) -> bytes:
+    """Receber (limitado por tipo) e normalizar um upload; retorna a imagem final"""
+    limite, dimensao_max = LIMITES[tipo]
+    caminho = await receber_upload(file, limite)
+    metricas.registrar_upload(tipo, os.path.getsize(caminho))
+    try:
+        return await normalizar(caminho, dimensao_max)
+    finally:
+        os.unlink(caminho)
+
+
+def encerrar():
+    """Encerrar o pool de processos (shutdown da aplicação)"""
+    _pool.encerrar()
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+
+# Ingestão de pings de GPS com write-behind: cada ping entra no ring buffer do
+# driver (últimos LOCALIZACAO_RASTRO pings) e um flusher por worker grava os
+# pendentes de todos os drivers numa transação (histórico em driver_locations e
+# última posição em driver_positions) a cada LOCALIZACAO_FLUSH_MS, ou antes
+# quando LOCALIZACAO_FLUSH_LOTE pings estiverem pendentes.
+LOCALIZACAO_RASTRO = int(os.getenv("LOCALIZACAO_RASTRO", "32"))
+LOCALIZACAO_FLUSH_MS = float(os.getenv("LOCALIZACAO_FLUSH_MS", "500"))
+LOCALIZACAO_FLUSH_LOTE = int(os.getenv("LOCALIZACAO_FLUSH_LOTE", "5000"))
+LOCALIZACAO_LOTE_MAX = int(os.getenv("LOCALIZACAO_LOTE_MAX", "100"))  # pings por request
+# Histórico de lotes que falharam, regravado no flush seguinte (os mais antigos
+# saem além disso); a última posição dos drivers do lote é sempre regravada
+LOCALIZACAO_REENVIO_MAX = int(os.getenv("LOCALIZACAO_REENVIO_MAX", str(4 * LOCALIZACAO_FLUSH_LOTE)))
+# recorded_at vem do relógio do aparelho: pings mais antigos que ATRASO_MAX (fila
+# offline) ou mais adiantados que ADIANTO_MAX são recusados; dentro da tolerância,
+# um recorded_at no futuro vira a hora do recebimento
+LOCALIZACAO_ATRASO_MAX_S = float(os.getenv("LOCALIZACAO_ATRASO_MAX_S", "86400"))
+LOCALIZACAO_ADIANTO_MAX_S = float(os.getenv("LOCALIZACAO_ADIANTO_MAX_S", "300"))
+# memoria: responde assim que o ping está no buffer (uma queda perde até um
+# intervalo de flush); commit: o request espera o commit do lote que o contém
+LOCALIZACAO_DURABILIDADE = os.getenv("LOCALIZACAO_DURABILIDADE", "memoria")
+DURABILIDADES = ("memoria", "commit")
+if LOCALIZACAO_DURABILIDADE not in DURABILIDADES:
+    raise ValueError(f"LOCALIZACAO_DURABILIDADE deve ser um de {DURABILIDADES}")
+
+logger = logging.getLogger("tmax.localizacao")
+
+
+class FalhaGravacao(RuntimeError):
+    """O lote com os pings do request não foi gravado (durabilidade commit)"""
+
+
+class PingForaDoIntervalo(ValueError):
+    """recorded_at antigo demais ou adiantado além da tolerância"""
+
+
+class Rastro:
+    """Ring buffer de um driver: pings (recorded_at, lat, lon, speed, heading,
+    accuracy) em ordem de chegada; os `pendentes` mais novos ainda não foram gravados"""
+
+    __slots__ = ("pings", "pendentes", "ultimo")
+
+    def __init__(self):
+        self.pings = deque(maxlen=LOCALIZACAO_RASTRO)
+        self.pendentes = 0
+        self.ultimo = None  # ping com o maior recorded_at (a posição atual)
+
+
+_rastros: dict[int, Rastro] = {}
+_sujos: set[int] = set()  # drivers com pings pendentes
+_pendentes = 0
+_reenvio: list[dict] = []  # histórico de lotes que falharam
+_estatisticas = {"recebidos": 0, "gravados": 0, "descartados": 0, "flushes": 0, "flush_segundos": 0.0, "falhas": 0}
+_acordar = asyncio.Event()
+_confirmacao: asyncio.Future | None = None  # resolvida no commit do próximo lote
+_tarefa: asyncio.Task | None = None
+_encerrando = False
+
+
+def _utc(data: datetime | None, agora: datetime) -> datetime:
+    # As colunas são UTC sem fuso, como os demais timestamps (datetime.utcnow)
+    if data is None:
+        return agora
+    data = data.astimezone(timezone.utc).replace(tzinfo=None) if data.tzinfo else data
+    diferenca = (data - agora).total_seconds()
+    if diferenca > LOCALIZACAO_ADIANTO_MAX_S or -diferenca > LOCALIZACAO_ATRASO_MAX_S:
+        raise PingForaDoIntervalo(data)
+    # Nunca no futuro: recorded_at decide a posição atual e o instante das cercas
+    return min(data, agora)
+
+
+def registrar(driver_id: int, pings: list) -> tuple | None:
+    """Colocar os pings (LocationPing) no buffer do driver; devolve o ping mais
+    recente se ele mudou a posição atual (pings atrasados só entram no histórico).
+    PingForaDoIntervalo recusa o request inteiro, antes de registrar qualquer ping"""
+    global _pendentes
+    agora = datetime.utcnow()
+    entradas = [
+        (_utc(ping.recorded_at, agora), ping.lat, ping.lon, ping.speed, ping.heading, ping.accuracy)
+        for ping in pings
+    ]
+    rastro = _rastros.get(driver_id)
+    if rastro is None:
+        rastro = _rastros[driver_id] = Rastro()
+    moveu = None
+    for entrada in entradas:
+        if rastro.pendentes == LOCALIZACAO_RASTRO:
+            _estatisticas["descartados"] += 1  # o pendente mais antigo sai do ring buffer
+        else:
+            rastro.pendentes += 1
+            _pendentes += 1
+        rastro.pings.append(entrada)
+        if rastro.ultimo is None or entrada[0] >= rastro.ultimo[0]:
+            rastro.ultimo = moveu = entrada
+    _estatisticas["recebidos"] += len(pings)
+    _sujos.add(driver_id)
+    if _pendentes >= LOCALIZACAO_FLUSH_LOTE:
+        _acordar.set()
+    return moveu
+
+
+def rastro(driver_id: int) -> list[tuple]:
+    """Últimos pings do driver recebidos por este worker, do mais antigo ao mais novo"""
+    encontrado = _rastros.get(driver_id)
+    return list(encontrado.pings) if encontrado else []
+
+
+async def confirmar():
+    """Esperar o commit do lote que contém os pings já registrados"""
+    global _confirmacao
+    if _confirmacao is None:
+        _confirmacao = asyncio.get_running_loop().create_future()
+    await asyncio.shield(_confirmacao)
+
+
+def _drenar() -> tuple[list[dict], list[dict]]:
+    global _pendentes
+    historico, posicoes = [], []
+    agora = datetime.utcnow()
+    for driver_id in _sujos:
+        rastro = _rastros[driver_id]
+        inicio = len(rastro.pings) - rastro.pendentes
+        for recorded_at, lat, lon, speed, heading, accuracy in islice(rastro.pings, inicio, None):
+            historico.append({
+                "driver_id": driver_id, "lat": lat, "lon": lon, "speed": speed,
+                "heading": heading, "accuracy": accuracy, "recorded_at": recorded_at,
+            })
+        rastro.pendentes = 0
+        _, lat, lon, *_ = rastro.ultimo
+        # updated_at = hora do flush: a sincronização dos outros workers usa essa coluna
+        posicoes.append({"driver_id": driver_id, "lat": lat, "lon": lon, "updated_at": agora})
+    _sujos.clear()
+    _pendentes = 0
+    return historico, posicoes
+
+
+def _devolver(historico: list[dict], posicoes: list[dict]):
+    """Lote que falhou volta para o próximo flush: o histórico (até
+    LOCALIZACAO_REENVIO_MAX pings, sem os mais antigos) e os drivers, para regravar
+    a última posição de cada um"""
+    global _reenvio
+    excedente = len(historico) + len(_reenvio) - LOCALIZACAO_REENVIO_MAX
+    historico = historico + _reenvio
+    if excedente > 0:
+        _estatisticas["descartados"] += excedente
+        historico = historico[excedente:]
+    _reenvio = historico
+    _sujos.update(posicao["driver_id"] for posicao in posicoes)
+
+
+async def flush():
+    """Gravar numa transação todos os pings pendentes deste worker (e os de um
+    lote anterior que falhou)"""
+    global _confirmacao, _reenvio
+    from app.config.database import AsyncSessionLocal
+    from app.controllers import PosicaoController
+
+    confirmacao, _confirmacao = _confirmacao, None
+    if not _sujos:
+        if confirmacao is not None:
+            confirmacao.set_result(None)
+        return
+    historico, posicoes = _drenar()
+    historico, _reenvio = _reenvio + historico, []
+    inicio = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            await PosicaoController.gravar_pings_async(db, historico, posicoes)
+    except Exception as e:
+        _estatisticas["falhas"] += 1
+        logger.exception("Falha ao gravar %d pings de %d drivers; nova tentativa no próximo flush",
+                         len(historico), len(posicoes))
+        _devolver(historico, posicoes)
+        if confirmacao is not None:
+            confirmacao.set_exception(FalhaGravacao(str(e)))
+        return
+    finally:
+        _estatisticas["flushes"] += 1
+        _estatisticas["flush_segundos"] += time.perf_counter() - inicio
+    _estatisticas["gravados"] += len(historico)
+    if confirmacao is not None:
+        confirmacao.set_result(None)
+
+
+async def _loop_flush():
+    while True:
+        try:
+            await asyncio.wait_for(_acordar.wait(), LOCALIZACAO_FLUSH_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+        _acordar.clear()
+        await flush()
+        if _encerrando:
+            return
+
+
+def estatisticas() -> dict:
+    return {**_estatisticas, "pendentes": _pendentes + len(_reenvio), "durabilidade": LOCALIZACAO_DURABILIDADE}
+
+
+def iniciar():
+    """Chamar no startup do worker"""
+    global _tarefa, _encerrando, _acordar
+    _encerrando = False
+    _acordar = asyncio.Event()  # ligado ao event loop deste worker
+    _tarefa = asyncio.get_running_loop().create_task(_loop_flush())
+
+
+async def encerrar():
+    """Chamar no shutdown: gravar o que estiver pendente e parar o flusher"""
+    global _tarefa, _encerrando
+    if _tarefa is None:
+        return
+    _encerrando = True
+    _acordar.set()
+    await _tarefa
+    _tarefa = None
@@ -0,0 +1,276 @@
+import os
+import time
+from bisect import bisect_left
+
+# Métricas no formato texto do Prometheus (GET /metrics).
+# Toda escrita acontece no event loop (middleware e rotas async), então os
+# contadores são dicts e listas simples, sem lock: registrar uma amostra custa
+# uma busca no dict e um bisect (na casa de centenas de nanossegundos).
+# Cada worker exporta as próprias séries (rótulo pid): somar os workers faria os
+# contadores "voltarem" quando um worker é reciclado, e o Prometheus já trata o fim
+# de uma série e o reinício de um contador
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_TAMANHO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LIMITES_STATEMENTS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+LIMITES_ATRASO = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0)
+
+# nome: (tipo, ajuda, rótulos)
+FAMILIAS = {
+    "tmax_http_requests_total": ("counter", "Requests atendidos", ("method", "route", "status")),
+    "tmax_http_request_duration_seconds": ("histogram", "Latência dos requests", ("method", "route")),
+    "tmax_http_response_size_bytes": ("histogram", "Tamanho do corpo das respostas", ("method", "route")),
+    "tmax_http_requests_in_flight": ("gauge", "Requests em andamento", ()),
+    "tmax_db_statements_per_request": ("histogram", "Statements SQL executados por request", ("method", "route")),
+    "tmax_db_pool_checkouts_total": ("counter", "Conexões retiradas do pool", ("pool",)),
+    "tmax_db_pool_wait_seconds_total": ("counter", "Tempo total esperando conexão no pool", ("pool",)),
+    "tmax_db_pool_in_use": ("gauge", "Conexões em uso", ("pool",)),
+    "tmax_hash_operations_total": ("counter", "Operações de hashing (bcrypt)", ("operation",)),
+    "tmax_hash_seconds_total": ("counter", "Tempo total das operações de hashing", ("operation",)),
+    "tmax_hash_queue_wait_seconds_total": ("counter", "Tempo total na fila do pool de hashing", ("operation",)),
+    "tmax_hash_pending": ("gauge", "Operações de hashing pendentes", ()),
+    "tmax_upload_bytes_total": ("counter", "Bytes recebidos em uploads", ("type",)),
+    "tmax_uploads_total": ("counter", "Uploads recebidos", ("type",)),
+    "tmax_location_pings_total": ("counter", "Pings de GPS por resultado", ("result",)),
+    "tmax_location_pending": ("gauge", "Pings de GPS aguardando o flush", ()),
+    "tmax_location_flushes_total": ("counter", "Lotes de pings gravados (ou que falharam)", ()),
+    "tmax_location_flush_seconds_total": ("counter", "Tempo total gravando lotes de pings", ()),
+    "tmax_live_connections": ("gauge", "Conexões abertas em /drivers/live", ()),
+    "tmax_live_connections_total": ("counter", "Conexões aceitas em /drivers/live", ()),
+    "tmax_live_events_total": ("counter", "Eventos de posição ao vivo por resultado", ("result",)),
+    "tmax_live_lag_seconds": ("histogram", "Atraso entre a mudança de posição e o envio ao cliente", ()),
+    "tmax_dispatch_rounds_total": ("counter", "Rodadas de despacho em lote", ()),
+    "tmax_dispatch_assigned_total": ("counter", "Entregas atribuídas pelo despacho", ()),
+    "tmax_dispatch_conflicts_total": ("counter", "Atribuições planejadas e não gravadas (despacho concorrente)", ()),
+    "tmax_dispatch_seconds_total": ("counter", "Tempo gasto nas rodadas de despacho", ()),
+    "tmax_geofence_events_total": ("counter", "Eventos de cercas emitidos", ("event",)),
+    "tmax_geofence_checks_total": ("counter", "Posições avaliadas e testes de zona das cercas", ("kind",)),
+    "tmax_geofence_zones": ("gauge", "Zonas em memória no worker avaliador", ()),
+    "tmax_workers": ("gauge", "Workers nesta resposta (1 por pid)", ()),
+}
+
+ROTA_DESCONHECIDA = "desconhecida"
+
+
+class Histograma:
+    """Buckets fixos; contagens não cumulativas (acumuladas só na renderização)"""
+
+    __slots__ = ("limites", "contagens", "soma")
+
+    def __init__(self, limites: tuple):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+
+    def observar(self, valor: float):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+
+
+_requests: dict[tuple, int] = {}
+_duracao: dict[tuple, Histograma] = {}
+_tamanho: dict[tuple, Histograma] = {}
+_statements_por_request: dict[tuple, Histograma] = {}
+_uploads: dict[str, list] = {}
+_atraso_live: dict[tuple, Histograma] = {}
+
+
+def rota(scope) -> str:
+    """Template da rota (/driver/{driver_id}), nunca o path: cardinalidade fixa"""
+    return getattr(scope.get("route"), "path", ROTA_DESCONHECIDA)
+
+
+def resposta_em_stream(mensagem: dict) -> bool:
+    """http.response.start de um stream SSE (text/event-stream): conexões longas que
+    ficam fora da latência e dos requests em andamento (ver tmax_live_connections)"""
+    for nome, valor in mensagem.get("headers", ()):
+        if nome.lower() == b"content-type":
+            return valor.startswith(b"text/event-stream")
+    return False
+
+
+def _histograma(serie: dict, chave: tuple, limites: tuple) -> Histograma:
+    h = serie.get(chave)
+    if h is None:
+        h = serie[chave] = Histograma(limites)
+    return h
+
+
+class MetricasHTTP:
+    """Middleware ASGI: contagem, latência e tamanho da resposta por rota (streams SSE
+    só entram na contagem e no tamanho)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        resposta = [500, 0, False]  # status, bytes do corpo, stream SSE
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.body":
+                resposta[1] += len(mensagem.get("body", b""))
+            elif mensagem["type"] == "http.response.start":
+                resposta[0] = mensagem["status"]
+                resposta[2] = resposta_em_stream(mensagem)
+            await send(mensagem)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao = time.perf_counter() - inicio
+            chave = (scope["method"], rota(scope))
+            chave_status = (*chave, str(resposta[0]))
+            _requests[chave_status] = _requests.get(chave_status, 0) + 1
+            if not resposta[2]:
+                _histograma(_duracao, chave, LIMITES_LATENCIA).observar(duracao)
+            _histograma(_tamanho, chave, LIMITES_TAMANHO).observar(resposta[1])
+
+
+def observar_consultas(metodo: str, rota: str, total: int):
+    """Statements SQL executados por um request (ver app.services.consultas)"""
+    _histograma(_statements_por_request, (metodo, rota), LIMITES_STATEMENTS).observar(total)
+
+
+def registrar_upload(tipo: str, tamanho: int):
+    """Bytes recebidos num upload (chamado no event loop)"""
+    upload = _uploads.get(tipo)
+    if upload is None:
+        upload = _uploads[tipo] = [0, 0]
+    upload[0] += 1
+    upload[1] += tamanho
+
+
+def observar_atraso_live(segundos: float):
+    """Atraso de um evento de /drivers/live entre a publicação e o envio"""
+    _histograma(_atraso_live, (), LIMITES_ATRASO).observar(segundos)
+
+
+def _histogramas(serie: dict) -> list:
+    return [[list(chave), h.contagens, h.soma] for chave, h in serie.items()]
+
+
+def exportar(em_andamento: int, pools: dict, hashing: dict, localizacao: dict, live: dict, despacho: dict,
+             cercas: dict) -> dict:
+    """Estado deste worker em formato JSON (vai no heartbeat para a agregação)"""
+    pools_validos = {nome: p for nome, p in pools.items() if p.get("em_uso") is not None}
+    operacoes = hashing.get("operacoes", {})
+    return {
+        "pid": os.getpid(),
+        "valores": {
+            "tmax_http_requests_total": [[list(k), v] for k, v in _requests.items()],
+            "tmax_http_requests_in_flight": [[[], em_andamento]],
+            "tmax_db_pool_checkouts_total": [[[nome], p["checkouts"]] for nome, p in pools.items()],
+            "tmax_db_pool_wait_seconds_total": [[[nome], p["espera_total"]] for nome, p in pools.items()],
+            "tmax_db_pool_in_use": [[[nome], p["em_uso"]] for nome, p in pools_validos.items()],
+            "tmax_hash_operations_total": [[[op], d["chamadas"]] for op, d in operacoes.items()],
+            "tmax_hash_seconds_total": [[[op], d["tempo_total"]] for op, d in operacoes.items()],
+            "tmax_hash_queue_wait_seconds_total": [[[op], d["espera_total"]] for op, d in operacoes.items()],
+            "tmax_hash_pending": [[[], hashing.get("pendentes", 0)]],
+            "tmax_upload_bytes_total": [[[tipo], u[1]] for tipo, u in _uploads.items()],
+            "tmax_uploads_total": [[[tipo], u[0]] for tipo, u in _uploads.items()],
+            "tmax_location_pings_total": [
+                [[resultado], localizacao[chave]]
+                for resultado, chave in (("received", "recebidos"), ("written", "gravados"), ("dropped", "descartados"))
+            ],
+            "tmax_location_pending": [[[], localizacao["pendentes"]]],
+            "tmax_location_flushes_total": [[[], localizacao["flushes"]]],
+            "tmax_location_flush_seconds_total": [[[], localizacao["flush_segundos"]]],
+            "tmax_live_connections": [[[], live["conexoes"]]],
+            "tmax_live_connections_total": [[[], live["conexoes_total"]]],
+            "tmax_live_events_total": [
+                [[resultado], live[chave]]
+                for resultado, chave in (("sent", "enviados"), ("coalesced", "coalescidos"), ("dropped", "descartados"))
+            ],
+            "tmax_dispatch_rounds_total": [[[], despacho["rodadas"]]],
+            "tmax_dispatch_assigned_total": [[[], despacho["atribuidas"]]],
+            "tmax_dispatch_conflicts_total": [[[], despacho["conflitos"]]],
+            "tmax_dispatch_seconds_total": [[[], despacho["segundos"]]],
+            "tmax_geofence_events_total": [[[evento], cercas[evento]] for evento in ("enter", "exit", "dwell")],
+            "tmax_geofence_checks_total": [
+                [["positions"], cercas["avaliacoes"]], [["zone_tests"], cercas["testes"]],
+            ],
+            "tmax_geofence_zones": [[[], cercas["zonas"]]],
+            "tmax_workers": [[[], 1]],
+        },
+        "histogramas": {
+            "tmax_http_request_duration_seconds": _histogramas(_duracao),
+            "tmax_http_response_size_bytes": _histogramas(_tamanho),
+            "tmax_db_statements_per_request": _histogramas(_statements_por_request),
+            "tmax_live_lag_seconds": _histogramas(_atraso_live),
+        },
+    }
+
+
+_LIMITES = {
+    "tmax_http_request_duration_seconds": LIMITES_LATENCIA,
+    "tmax_http_response_size_bytes": LIMITES_TAMANHO,
+    "tmax_db_statements_per_request": LIMITES_STATEMENTS,
+    "tmax_live_lag_seconds": LIMITES_ATRASO,
+}
+
+
+def _agregar(estados: list[dict]) -> tuple[dict, dict]:
+    """Juntar os estados de vários workers; o pid é o primeiro rótulo de cada série"""
+    valores, histogramas = {}, {}
+    for estado in estados:
+        pid = str(estado.get("pid", ""))
+        for nome, series in estado.get("valores", {}).items():
+            destino = valores.setdefault(nome, {})
+            for rotulos, valor in series:
+                chave = (pid, *rotulos)
+                destino[chave] = destino.get(chave, 0) + valor
+        for nome, series in estado.get("histogramas", {}).items():
+            destino = histogramas.setdefault(nome, {})
+            for rotulos, contagens, soma in series:
+                chave = (pid, *rotulos)
+                if chave not in destino:
+                    destino[chave] = ([0] * len(contagens), [0.0])
+                acumulado, total = destino[chave]
+                for i, c in enumerate(contagens):
+                    acumulado[i] += c
+                total[0] += soma
+    return valores, histogramas
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor) -> str:
+    if isinstance(valor, float):
+        return "+Inf" if valor == float("inf") else repr(valor)
+    return str(valor)
+
+
+def renderizar(estados: list[dict]) -> str:
+    """Texto no formato de exposição do Prometheus (version=0.0.4)"""
+    valores, histogramas = _agregar(estados)
+    linhas = []
+    for nome, (tipo, ajuda, nomes) in FAMILIAS.items():
+        nomes = ("pid", *nomes)
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        if tipo != "histogram":
+            for chave, valor in sorted(valores.get(nome, {}).items()):
+                linhas.append(f"{nome}{_rotulos(nomes, chave)} {_numero(valor)}")
+            continue
+        limites = _LIMITES[nome]
+        for chave, (contagens, soma) in sorted(histogramas.get(nome, {}).items()):
+            acumulado = 0
+            for limite, contagem in zip(limites + (float("inf"),), contagens):
+                acumulado += contagem
+                le = f'le="{_numero(float(limite))}"'
+                linhas.append(f"{nome}_bucket{_rotulos(nomes, chave, le)} {acumulado}")
+            linhas.append(f"{nome}_sum{_rotulos(nomes, chave)} {_numero(soma[0])}")
+            linhas.append(f"{nome}_count{_rotulos(nomes, chave)} {acumulado}")
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,69 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+# Paginação por cursor (keyset): o cursor guarda a chave de ordenação do último
+# item da página, e a próxima página começa com "WHERE (colunas) > (chave)".
+# O custo de qualquer página é o de uma busca no índice, sem OFFSET.
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+
+class CursorInvalido(ValueError):
+    """Cursor malformado ou de outra listagem"""
+
+
+def _serializar(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def codificar_cursor(valores: tuple) -> str:
+    """Cursor opaco (base64url de um JSON com a chave do último item)"""
+    bruto = json.dumps([_serializar(valor) for valor in valores], separators=(",", ":"))
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, colunas) -> tuple:
+    """Converter o cursor de volta para os tipos das colunas de ordenação"""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(bruto)
+    except (binascii.Error, ValueError):
+        raise CursorInvalido(cursor)
+    if not isinstance(valores, list) or len(valores) != len(colunas):
+        raise CursorInvalido(cursor)
+
+    convertidos = []
+    for coluna, valor in zip(colunas, valores):
+        tipo = coluna.type.python_type
+        try:
+            if tipo is datetime:
+                convertidos.append(datetime.fromisoformat(valor))
+            elif isinstance(valor, tipo) and not isinstance(valor, bool):
+                convertidos.append(valor)
+            else:
+                raise TypeError
+        except (TypeError, ValueError):
+            raise CursorInvalido(cursor)
+    return tuple(convertidos)
+
+
+def _chave(item, colunas) -> tuple:
+    return tuple(getattr(item, coluna.key) for coluna in colunas)
+
+
+def aplicar_cursor(query, colunas, cursor: str | None, limite: int):
+    """Ordenar pelas colunas, começar depois do cursor e buscar limite + 1 itens"""
+    if cursor:
+        query = query.filter(tuple_(*colunas) > tuple_(*decodificar_cursor(cursor, colunas)))
+    return query.order_by(*colunas).limit(limite + 1)
+
+
+def montar_pagina(itens: list, colunas, limite: int) -> tuple[list, str | None]:
+    """Cortar o item extra e gerar o next_cursor (None na última página)"""
+    if len(itens) <= limite:
+        return itens, None
+    itens = itens[:limite]
+    return itens, codificar_cursor(_chave(itens[-1], colunas))
@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from app.services import cercas, transmissao
+
+# Índice espacial em memória das posições dos drivers: grade de células de
+# POSICOES_CELULA_GRAUS graus (0.01 ≈ 1,1 km de latitude). Cada worker mantém a
+# sua cópia: carga completa no startup e, a cada POSICOES_SYNC_S, as posições e
+# status de drivers alterados desde a última sincronização (updated_at indexado)
+CELULA_GRAUS = float(os.getenv("POSICOES_CELULA_GRAUS", "0.01"))
+# Posição mais velha que isso não aparece nas buscas (driver sem sinal; 0 desliga)
+POSICOES_VALIDADE_S = float(os.getenv("POSICOES_VALIDADE_S", "300"))
+POSICOES_SYNC_S = float(os.getenv("POSICOES_SYNC_S", "1"))
+RAIO_MAXIMO_M = float(os.getenv("POSICOES_RAIO_MAXIMO_M", "50000"))
+# Margem da sincronização incremental: uma escrita com updated_at T pode ser
+# commitada depois de outra com T' > T já ter sido lida
+_SOBREPOSICAO = timedelta(seconds=2)
+
+METROS_POR_GRAU = 6371008.8 * math.pi / 180
+
+logger = logging.getLogger("tmax.posicoes")
+
+
+def _instante(data: datetime) -> float:
+    # updated_at é gravado com datetime.utcnow (sem fuso)
+    return data.replace(tzinfo=timezone.utc).timestamp() if data.tzinfo is None else data.timestamp()
+
+
+class Posicao:
+    __slots__ = ("driver_id", "lat", "lon", "vehicle_type", "updated_at", "instante", "ativo", "celula")
+
+    def __init__(self, driver_id: int, lat: float, lon: float, vehicle_type: str,
+                 updated_at: datetime, ativo: bool, celula: tuple[int, int]):
+        self.driver_id = driver_id
+        self.lat = lat
+        self.lon = lon
+        self.vehicle_type = vehicle_type
+        self.updated_at = updated_at
+        self.instante = _instante(updated_at)
+        self.ativo = ativo
+        self.celula = celula
+
+
+class IndiceEspacial:
+    """Grade lat/lon: célula -> posições. Buscas percorrem anéis de células em volta
+    do ponto até que nenhuma célula ainda não vista possa ter algo mais próximo.
+
+    Distâncias pela projeção equiretangular no ponto da busca (erro desprezível
+    nos raios de despacho); não trata o antimeridiano nem os polos.
+    """
+
+    def __init__(self, celula_graus: float = CELULA_GRAUS, ao_mover=None):
+        self.celula_graus = celula_graus
+        self._celulas: dict[tuple[int, int], set[Posicao]] = {}
+        self._posicoes: dict[int, Posicao] = {}
+        # ao_mover(posicao, (lat, lon) anterior ou None): chamado quando um driver ativo muda de lugar
+        self.ao_mover = ao_mover
+
+    def __len__(self) -> int:
+        return len(self._posicoes)
+
+    def _celula(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.celula_graus), math.floor(lon / self.celula_graus)
+
+    def limpar(self):
+        self._celulas.clear()
+        self._posicoes.clear()
+
+    def atualizar(self, driver_id: int, lat: float, lon: float, vehicle_type: str | None,
+                  updated_at: datetime, ativo: bool | None = None) -> bool:
+        """Inserir ou mover um driver; posição mais antiga que a do índice é ignorada
+        (vehicle_type=None e ativo=None mantêm os valores conhecidos)"""
+        atual = self._posicoes.get(driver_id)
+        if atual is not None:
+            if updated_at < atual.updated_at:
+                return False
+            if ativo is None:
+                ativo = atual.ativo
+            if vehicle_type is None:
+                vehicle_type = atual.vehicle_type
+            if lat == atual.lat and lon == atual.lon:
+                # Mesmo lugar (ex.: a sincronização trazendo de volta a posição deste worker)
+                atual.updated_at, atual.instante = updated_at, _instante(updated_at)
+                atual.vehicle_type, atual.ativo = vehicle_type, ativo
+                return True
+            self._tirar_da_celula(atual)
+        posicao = Posicao(driver_id, lat, lon, vehicle_type or "moto", updated_at,
+                          True if ativo is None else ativo, self._celula(lat, lon))
+        self._posicoes[driver_id] = posicao
+        self._celulas.setdefault(posicao.celula, set()).add(posicao)
+        if self.ao_mover is not None and posicao.ativo:
+            self.ao_mover(posicao, None if atual is None else (atual.lat, atual.lon))
+        return True
+
+    def obter(self, driver_id: int) -> Posicao | None:
+        return self._posicoes.get(driver_id)
+
+    def na_area(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float,
+                agora: float | None = None) -> list[Posicao]:
+        """Drivers ativos (com posição válida) dentro do retângulo"""
+        corte = (time.time() if agora is None else agora) - POSICOES_VALIDADE_S if POSICOES_VALIDADE_S else None
+        (i0, j0), (i1, j1) = self._celula(lat_min, lon_min), self._celula(lat_max, lon_max)
+        encontrados = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for posicao in self._celulas.get((i, j), ()):
+                    if (posicao.ativo and (corte is None or posicao.instante >= corte)
+                            and lat_min <= posicao.lat <= lat_max and lon_min <= posicao.lon <= lon_max):
+                        encontrados.append(posicao)
+        return encontrados
+
+    def ativos(self, agora: float | None = None) -> list[Posicao]:
+        """Todos os drivers ativos com posição válida"""
+        corte = (time.time() if agora is None else agora) - POSICOES_VALIDADE_S if POSICOES_VALIDADE_S else None
+        return [p for p in self._posicoes.values() if p.ativo and (corte is None or p.instante >= corte)]
+
+    def definir_ativo(self, driver_id: int, ativo: bool):
+        posicao = self._posicoes.get(driver_id)
+        if posicao is not None:
+            posicao.ativo = ativo
+
+    def remover(self, driver_id: int):
+        posicao = self._posicoes.pop(driver_id, None)
+        if posicao is not None:
+            self._tirar_da_celula(posicao)
+
+    def _tirar_da_celula(self, posicao: Posicao):
+        celula = self._celulas[posicao.celula]
+        celula.discard(posicao)
+        if not celula:
+            del self._celulas[posicao.celula]
+
+    def proximos(self, lat: float, lon: float, limite: int = 10, raio_m: float = RAIO_MAXIMO_M,
+                 vehicle_type: str | None = None, agora: float | None = None) -> list[tuple[float, Posicao]]:
+        """Até `limite` drivers ativos mais próximos dentro de `raio_m`, em ordem de
+        distância: [(distância em metros, posição)]"""
+        if limite <= 0:
+            return []
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        # Distâncias em "graus de latitude" ao quadrado até o fim; metros só na saída
+        raio = raio_m / METROS_POR_GRAU
+        raio2 = raio * raio
+        # Depois de ver o anel r, o que falta está a pelo menos r células do ponto
+        passo = self.celula_graus * min(1.0, cos_lat)
+        aneis = math.ceil(raio / passo)
+        corte = (time.time() if agora is None else agora) - POSICOES_VALIDADE_S if POSICOES_VALIDADE_S else None
+        ci, cj = self._celula(lat, lon)
+        celulas = self._celulas
+        heap = []  # max-heap de tamanho `limite`: (-distância², driver_id, posição)
+
+        for r in range(aneis + 1):
+            if r == 0:
+                anel = ((ci, cj),)
+            else:
+                anel = [(ci - r, cj + d) for d in range(-r, r + 1)]
+                anel += [(ci + r, cj + d) for d in range(-r, r + 1)]
+                anel += [(ci + d, cj - r) for d in range(-r + 1, r)]
+                anel += [(ci + d, cj + r) for d in range(-r + 1, r)]
+            for chave in anel:
+                celula = celulas.get(chave)
+                if not celula:
+                    continue
+                for posicao in celula:
+                    if not posicao.ativo or (vehicle_type is not None and posicao.vehicle_type != vehicle_type):
+                        continue
+                    if corte is not None and posicao.instante < corte:
+                        continue
+                    dlat = posicao.lat - lat
+                    dlon = (posicao.lon - lon) * cos_lat
+                    d2 = dlat * dlat + dlon * dlon
+                    if d2 > raio2:
+                        continue
+                    if len(heap) < limite:
+                        heapq.heappush(heap, (-d2, posicao.driver_id, posicao))
+                    elif d2 < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d2, posicao.driver_id, posicao))
+            if len(heap) == limite and -heap[0][0] <= (r * passo) ** 2:
+                break
+
+        return [(math.sqrt(-d2) * METROS_POR_GRAU, posicao) for d2, _, posicao in sorted(heap, reverse=True)]
+
+
+def _ao_mover(posicao: Posicao, anterior: tuple[float, float] | None):
+    transmissao.transmissor.publicar(posicao, anterior)
+    cercas.ao_mover(posicao, anterior)
+
+
+indice = IndiceEspacial(ao_mover=_ao_mover)
+_tarefa: asyncio.Task | None = None
+
+
+async def _sincronizar(desde: datetime | None) -> datetime | None:
+    """Aplicar no índice o que mudou depois de desde (None: carga completa);
+    devolve o maior updated_at visto"""
+    from app.config.database import AsyncReadSessionLocal
+    from app.controllers import PosicaoController
+
+    async with AsyncReadSessionLocal() as db:
+        posicoes = await PosicaoController.listar_posicoes_async(db, desde)
+        status = [] if desde is None else await PosicaoController.listar_status_drivers_async(db, desde)
+    maximo = desde
+    # is_active nulo (linhas antigas) conta como ativo, como na autenticação
+    for linha in posicoes:
+        indice.atualizar(linha.driver_id, linha.lat, linha.lon, linha.vehicle_type, linha.updated_at,
+                         linha.is_active is not False)
+        if maximo is None or linha.updated_at > maximo:
+            maximo = linha.updated_at
+    for linha in status:
+        indice.definir_ativo(linha.id, linha.is_active is not False)
+        if linha.updated_at > maximo:
+            maximo = linha.updated_at
+    return maximo
+
+
+async def _loop_sincronizacao(desde: datetime | None):
+    while True:
+        await asyncio.sleep(POSICOES_SYNC_S)
+        try:
+            visto = await _sincronizar(None if desde is None else desde - _SOBREPOSICAO)
+        except Exception:
+            logger.exception("Falha ao sincronizar o índice de posições")
+            continue
+        if visto is not None and (desde is None or visto > desde):
+            desde = visto
+
+
+async def iniciar():
+    """Chamar no startup do worker: carregar todas as posições e manter o índice em dia"""
+    global _tarefa
+    indice.limpar()
+    desde = await _sincronizar(None)
+    _tarefa = asyncio.get_running_loop().create_task(_loop_sincronizacao(desde))
+
+
+def encerrar():
+    global _tarefa
+    if _tarefa is not None:
+        _tarefa.cancel()
+        _tarefa = None
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Pools de processos dos serviços de CPU (hashing, imagens, rotas, ETA). Cada worker
+# do servidor tem os próprios pools, então os tamanhos padrão dividem as CPUs da
+# máquina entre os WEB_CONCURRENCY workers (gunicorn.conf.py exporta o valor efetivo)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+logger = logging.getLogger("tmax.processos")
+
+
+def workers_padrao(fracao: float = 1.0) -> int:
+    """Processos de um pool neste worker: fração das CPUs da máquina dividida entre
+    os workers do servidor (no mínimo 1)"""
+    return max(int((os.cpu_count() or 1) * fracao) // WEB_CONCURRENCY, 1)
+
+
+class PoolProcessos:
+    """ProcessPoolExecutor criado sob demanda (depois do fork dos workers do servidor)
+    e recriado quando um processo filho morre (BrokenProcessPool): a tarefa em curso
+    falha, as seguintes vão para um pool novo"""
+
+    def __init__(self, nome: str, max_workers: int):
+        self.nome = nome
+        self.max_workers = max_workers
+        self.recriacoes = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def obter(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _descartar(self, quebrado: ProcessPoolExecutor):
+        with self._lock:
+            # Várias tarefas falham juntas; só a primeira troca o pool
+            if self._executor is not quebrado:
+                return
+            self._executor = None
+            self.recriacoes += 1
+        logger.warning("Pool de %s quebrado (processo filho morreu); recriando", self.nome)
+        quebrado.shutdown(wait=False, cancel_futures=True)
+
+    async def executar(self, func, *args):
+        """Executar uma função top-level no pool"""
+        executor = self.obter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            self._descartar(executor)
+            raise
+
+    def executar_sync(self, func, *args):
+        """Versão bloqueante de executar (scripts, CLI)"""
+        executor = self.obter()
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            self._descartar(executor)
+            raise
+
+    def encerrar(self):
+        """Encerrar o pool (shutdown da aplicação)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
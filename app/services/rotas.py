@@ -0,0 +1,235 @@
+import os
+import time
+from collections import OrderedDict
+from app.services.processos import PoolProcessos, workers_padrao
+
+# Sequenciamento de paradas de um driver (POST /routes/optimize): construção pelo
+# vizinho mais próximo e melhoria por 2-opt e Or-opt, respeitando "parada X depois
+# de Y" (coleta antes da entrega), até não haver melhoria ou acabar o orçamento de
+# tempo. Caminho aberto a partir da origem (posição do driver), sem volta.
+ROTAS_ORCAMENTO_MS = float(os.getenv("ROTAS_ORCAMENTO_MS", "50"))
+ROTAS_ORCAMENTO_MAX_MS = float(os.getenv("ROTAS_ORCAMENTO_MAX_MS", "1000"))
+ROTAS_MAX_PARADAS = int(os.getenv("ROTAS_MAX_PARADAS", "200"))
+ROTAS_CACHE_LINHAS = int(os.getenv("ROTAS_CACHE_LINHAS", "20000"))
+ROTAS_WORKERS = int(os.getenv("ROTAS_WORKERS", str(workers_padrao(0.5))))
+_CASAS = 6  # coordenadas arredondadas (~0,1 m) na chave do cache
+
+
+class RotaInvalida(ValueError):
+    """Paradas repetidas ou restrições de ordem impossíveis"""
+
+
+def _haversine(origens: list[tuple[float, float]], destinos: list[tuple[float, float]]) -> list[list[float]]:
+    from app.services.despacho import matriz_distancias
+
+    return matriz_distancias(*zip(*origens), *zip(*destinos)).tolist()
+
+
+class CacheDistancias:
+    """Linhas da matriz de distâncias por coordenada de origem ({destino: metros}, LRU):
+    reotimizar depois que uma parada muda só calcula a linha e a coluna dela"""
+
+    def __init__(self, linhas_max: int = ROTAS_CACHE_LINHAS, calcular=_haversine):
+        self.linhas_max = linhas_max
+        self.calcular = calcular  # calcular(origens, destinos) -> matriz [origem][destino] em metros
+        self._linhas: OrderedDict[tuple, dict] = OrderedDict()
+        self.calculadas = 0
+        self.reaproveitadas = 0
+
+    def matriz(self, pontos: list[tuple[float, float]]) -> list[list[float]]:
+        chaves = [(round(lat, _CASAS), round(lon, _CASAS)) for lat, lon in pontos]
+        distintas = list(dict.fromkeys(chaves))
+        linhas, faltando = {}, {}
+        for origem in distintas:
+            linha = self._linhas.get(origem)
+            if linha is None or len(linha) > 4 * ROTAS_MAX_PARADAS:
+                linha = self._linhas[origem] = {}
+                if len(self._linhas) > self.linhas_max:
+                    self._linhas.popitem(last=False)
+            self._linhas.move_to_end(origem)
+            linhas[origem] = linha
+            sem_valor = [destino for destino in distintas if destino not in linha]
+            if sem_valor:
+                faltando[origem] = sem_valor
+        calculadas = 0
+        if faltando:
+            # Uma chamada só: origens com algo faltando x destinos que faltam em alguma delas
+            destinos = list(dict.fromkeys(d for sem_valor in faltando.values() for d in sem_valor))
+            coluna = {destino: j for j, destino in enumerate(destinos)}
+            for origem, valores in zip(faltando, self.calcular(list(faltando), destinos)):
+                linha = linhas[origem]
+                for destino in faltando[origem]:
+                    linha[destino] = valores[coluna[destino]]
+                calculadas += len(faltando[origem])
+        self.calculadas += calculadas
+        self.reaproveitadas += len(distintas) ** 2 - calculadas
+        return [[linhas[origem][destino] for destino in chaves] for origem in chaves]
+
+    def limpar(self):
+        self._linhas.clear()
+
+
+cache = CacheDistancias()
+
+
+def _custo(matriz: list[list[float]], rota: list[int]) -> float:
+    return sum((matriz[a][b] for a, b in zip(rota, rota[1:])), 0.0)
+
+
+def _vizinho_mais_proximo(matriz: list[list[float]], antes: list[list[int]], depois: list[list[int]]) -> list[int]:
+    faltam = [len(predecessores) for predecessores in antes]
+    livres = {i for i in range(1, len(matriz)) if not faltam[i]}
+    rota = [0]
+    while livres:
+        linha = matriz[rota[-1]]
+        proxima = min(livres, key=linha.__getitem__)
+        livres.remove(proxima)
+        rota.append(proxima)
+        for sucessor in depois[proxima]:
+            faltam[sucessor] -= 1
+            if not faltam[sucessor]:
+                livres.add(sucessor)
+    if len(rota) != len(matriz):
+        raise RotaInvalida("Restrições de ordem em ciclo")
+    return rota
+
+
+def _dois_opt(matriz, rota: list[int], depois: list[list[int]], prazo: float) -> bool:
+    """Aplicar a primeira inversão de trecho que encurta a rota (custos assimétricos
+    considerados: o trecho invertido é percorrido no sentido contrário)"""
+    m = len(rota) - 1
+    posicao = {no: p for p, no in enumerate(rota)}
+    ida, volta = [0.0], [0.0]  # somas de prefixo das arestas nos dois sentidos
+    for a, b in zip(rota, rota[1:]):
+        ida.append(ida[-1] + matriz[a][b])
+        volta.append(volta[-1] + matriz[b][a])
+    # Inverter rota[i..j] viola "a antes de b" se i <= pos[a] < pos[b] <= j: para cada
+    # i, j precisa ficar antes do menor pos[b] dos predecessores a partir de i
+    limite = [m + 1] * (m + 2)
+    for p in range(m, 0, -1):
+        limite[p] = min([limite[p + 1]] + [posicao[b] for b in depois[rota[p]]])
+    for i in range(1, m):
+        if time.perf_counter() > prazo:
+            return False
+        anterior, primeiro = rota[i - 1], rota[i]
+        base = matriz[anterior][primeiro]
+        for j in range(i + 1, min(m, limite[i] - 1) + 1):
+            ultimo = rota[j]
+            delta = matriz[anterior][ultimo] - base + (volta[j] - volta[i]) - (ida[j] - ida[i])
+            if j < m:
+                seguinte = rota[j + 1]
+                delta += matriz[primeiro][seguinte] - matriz[ultimo][seguinte]
+            if delta < -1e-7:
+                rota[i:j + 1] = rota[i:j + 1][::-1]
+                return True
+    return False
+
+
+def _or_opt(matriz, rota: list[int], antes: list[list[int]], depois: list[list[int]], prazo: float) -> bool:
+    """Aplicar o primeiro deslocamento de um trecho de 1 a 3 paradas (mesmo sentido)
+    para outro ponto da rota que a encurte sem violar a ordem"""
+    m = len(rota) - 1
+    posicao = {no: p for p, no in enumerate(rota)}
+    for tamanho in (1, 2, 3):
+        for i in range(1, m - tamanho + 2):
+            if time.perf_counter() > prazo:
+                return False
+            fim = i + tamanho - 1
+            trecho = rota[i:fim + 1]
+            primeiro, ultimo, anterior = trecho[0], trecho[-1], rota[i - 1]
+            seguinte = rota[fim + 1] if fim < m else None
+            ganho = matriz[anterior][primeiro]
+            if seguinte is not None:
+                ganho += matriz[ultimo][seguinte] - matriz[anterior][seguinte]
+            # Para frente, o trecho não passa de nenhum sucessor; para trás, de nenhum predecessor
+            no_trecho = set(trecho)
+            ate = min([m] + [posicao[t] - 1 for s in trecho for t in depois[s] if t not in no_trecho])
+            desde = max([0] + [posicao[u] for s in trecho for u in antes[s] if u not in no_trecho])
+            for k in range(desde, ate + 1):
+                if i - 1 <= k <= fim:
+                    continue
+                depois_de = rota[k]
+                insercao = matriz[depois_de][primeiro]
+                if k < m:
+                    insercao += matriz[ultimo][rota[k + 1]] - matriz[depois_de][rota[k + 1]]
+                if insercao - ganho < -1e-7:
+                    resto = rota[:i] + rota[fim + 1:]
+                    onde = k + 1 if k < i else k + 1 - tamanho
+                    rota[:] = resto[:onde] + trecho + resto[onde:]
+                    return True
+    return False
+
+
+def sequenciar(matriz: list[list[float]], antes: list[list[int]], orcamento_s: float) -> dict:
+    """Ordem das paradas 1..n partindo do nó 0 (fixo); antes[i]: nós que precisam vir
+    antes de i. Roda no pool de processos (função top-level)."""
+    prazo = time.perf_counter() + orcamento_s
+    depois = [[] for _ in matriz]
+    for no, predecessores in enumerate(antes):
+        for predecessor in predecessores:
+            depois[predecessor].append(no)
+    rota = _vizinho_mais_proximo(matriz, antes, depois)
+    inicial = _custo(matriz, rota)
+    melhorias = 0
+    while time.perf_counter() < prazo:
+        if not (_dois_opt(matriz, rota, depois, prazo) or _or_opt(matriz, rota, antes, depois, prazo)):
+            break
+        melhorias += 1
+    return {"ordem": rota[1:], "inicial": inicial, "final": _custo(matriz, rota), "melhorias": melhorias}
+
+
+_pool = PoolProcessos("rotas", ROTAS_WORKERS)
+
+
+def _restricoes(paradas: list[dict]) -> list[list[int]]:
+    """antes[i] de cada nó (paradas são os nós 1..n) a partir do campo after"""
+    indices = {}
+    for numero, parada in enumerate(paradas, start=1):
+        if parada["id"] in indices:
+            raise RotaInvalida(f"Parada repetida: {parada['id']}")
+        indices[parada["id"]] = numero
+    antes = [[]]
+    for parada in paradas:
+        referencia = parada.get("after")
+        if referencia is None:
+            antes.append([])
+        elif referencia not in indices or referencia == parada["id"]:
+            raise RotaInvalida(f"after inválido na parada {parada['id']}: {referencia}")
+        else:
+            antes.append([indices[referencia]])
+    return antes
+
+
+async def otimizar(origem: tuple[float, float] | None, paradas: list[dict], orcamento_ms: float) -> dict:
+    """Ordenar paradas [{id, lat, lon, after}] a partir da origem (None: começar pela
+    melhor parada); distance_m de cada parada é contada desde a anterior"""
+    inicio = time.perf_counter()
+    antes = _restricoes(paradas)
+    pontos = [(parada["lat"], parada["lon"]) for parada in paradas]
+    if origem is not None:
+        matriz = cache.matriz([origem] + pontos)
+    else:
+        # Origem fictícia a custo zero de/para todas as paradas
+        matriz = [[0.0] * (len(pontos) + 1)] + [[0.0] + linha for linha in cache.matriz(pontos)]
+    resultado = await _pool.executar(sequenciar, matriz, antes, orcamento_ms / 1000)
+    ordenadas, anterior = [], 0
+    for no in resultado["ordem"]:
+        distancia = matriz[anterior][no] if anterior or origem is not None else 0.0
+        ordenadas.append({**paradas[no - 1], "distance_m": round(distancia, 1)})
+        anterior = no
+    return {
+        "stops": ordenadas,
+        "total_distance_m": round(resultado["final"], 1),
+        "initial_distance_m": round(resultado["inicial"], 1),
+        "improvements": resultado["melhorias"],
+        "seconds": round(time.perf_counter() - inicio, 4),
+    }
+
+
+def estatisticas() -> dict:
+    return {"linhas": len(cache._linhas), "calculadas": cache.calculadas, "reaproveitadas": cache.reaproveitadas}
+
+
+def encerrar():
+    """Encerrar o pool de processos (shutdown da aplicação)"""
+    _pool.encerrar()
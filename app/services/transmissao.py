@@ -0,0 +1,197 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+import pydantic_core
+from app.services import metricas
+
+# Posições ao vivo (GET /drivers/live, Server-Sent Events). Um transmissor por
+# worker recebe cada mudança de posição do índice em memória (pings deste worker
+# na hora, dos outros pela sincronização) e entrega às assinaturas interessadas:
+# por driver (dict driver -> assinaturas) ou por retângulo (grade de células de
+# 0,1 grau -> assinaturas). Cada conexão tem uma fila limitada com no máximo um
+# evento por driver: chegou posição nova de quem já estava na fila, a antiga é
+# substituída (coalescida); fila cheia, sai o driver pendente há mais tempo.
+LIVE_FILA = int(os.getenv("LIVE_FILA", "256"))
+LIVE_MAX_CONEXOES = int(os.getenv("LIVE_MAX_CONEXOES", "10000"))  # por worker
+LIVE_KEEPALIVE_S = float(os.getenv("LIVE_KEEPALIVE_S", "15"))
+LIVE_BBOX_MAX_GRAUS = float(os.getenv("LIVE_BBOX_MAX_GRAUS", "1.0"))
+LIVE_DRIVERS_MAX = int(os.getenv("LIVE_DRIVERS_MAX", "100"))
+LIVE_RETRY_MS = 3000  # reconexão do EventSource
+_CELULA_GRAUS = 0.1
+
+
+class LimiteConexoes(RuntimeError):
+    """Worker já atende LIVE_MAX_CONEXOES assinaturas"""
+
+
+_estatisticas = {"conexoes_total": 0, "enviados": 0, "coalescidos": 0, "descartados": 0}
+
+
+def _celula(lat: float, lon: float) -> tuple[int, int]:
+    return math.floor(lat / _CELULA_GRAUS), math.floor(lon / _CELULA_GRAUS)
+
+
+class Evento:
+    """Um evento SSE, serializado uma única vez para todas as conexões"""
+
+    __slots__ = ("driver_id", "tipo", "dados", "publicado_em", "_bytes")
+
+    def __init__(self, driver_id: int, tipo: str, dados: dict):
+        self.driver_id = driver_id
+        self.tipo = tipo
+        self.dados = dados
+        self.publicado_em = time.monotonic()
+        self._bytes = None
+
+    def bytes(self) -> bytes:
+        if self._bytes is None:
+            self._bytes = b"event: " + self.tipo.encode() + b"\ndata: " + pydantic_core.to_json(self.dados) + b"\n\n"
+        return self._bytes
+
+
+def evento_posicao(posicao) -> Evento:
+    return Evento(posicao.driver_id, "position", {
+        "driver_id": posicao.driver_id, "lat": posicao.lat, "lon": posicao.lon,
+        "vehicle_type": posicao.vehicle_type, "updated_at": posicao.updated_at,
+    })
+
+
+def _acordar(futuro: asyncio.Future):
+    if not futuro.done():
+        futuro.set_result(None)
+
+
+class Assinatura:
+    """Uma conexão: drivers ou retângulo assinados e a fila de eventos pendentes"""
+
+    __slots__ = ("drivers", "bbox", "celulas", "fila", "_espera")
+
+    def __init__(self, drivers: frozenset[int] | None, bbox: tuple[float, float, float, float] | None):
+        self.drivers = drivers
+        self.bbox = bbox
+        self.celulas = []
+        if bbox is not None:
+            (i0, j0), (i1, j1) = _celula(bbox[0], bbox[1]), _celula(bbox[2], bbox[3])
+            self.celulas = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+        self.fila: OrderedDict[int, Evento] = OrderedDict()
+        self._espera: asyncio.Future | None = None  # proximos() aguardando evento
+
+    def contem(self, lat: float, lon: float) -> bool:
+        lat_min, lon_min, lat_max, lon_max = self.bbox
+        return lat_min <= lat <= lat_max and lon_min <= lon <= lon_max
+
+    def entregar(self, evento: Evento):
+        fila = self.fila
+        if evento.driver_id in fila:
+            _estatisticas["coalescidos"] += 1
+            fila[evento.driver_id] = evento
+            fila.move_to_end(evento.driver_id)
+        else:
+            if len(fila) >= LIVE_FILA:
+                fila.popitem(last=False)
+                _estatisticas["descartados"] += 1
+            fila[evento.driver_id] = evento
+        if self._espera is not None and not self._espera.done():
+            self._espera.set_result(None)
+
+    async def proximos(self, espera: float) -> list[Evento]:
+        """Todos os eventos pendentes (vazio se nada chegou em `espera` segundos)"""
+        if not self.fila:
+            # Future + call_later em vez de wait_for, que cria uma task a cada espera
+            loop = asyncio.get_running_loop()
+            self._espera = loop.create_future()
+            prazo = loop.call_later(espera, _acordar, self._espera)
+            try:
+                await self._espera
+            finally:
+                prazo.cancel()
+                self._espera = None
+        eventos = list(self.fila.values())
+        self.fila.clear()
+        return eventos
+
+
+class Transmissor:
+    def __init__(self):
+        self._por_driver: dict[int, set[Assinatura]] = {}
+        self._por_celula: dict[tuple[int, int], set[Assinatura]] = {}
+        self.conexoes = 0
+
+    def assinar(self, drivers: frozenset[int] | None = None, bbox: tuple | None = None) -> Assinatura:
+        if self.conexoes >= LIVE_MAX_CONEXOES:
+            raise LimiteConexoes()
+        assinatura = Assinatura(drivers, bbox)
+        for driver_id in drivers or ():
+            self._por_driver.setdefault(driver_id, set()).add(assinatura)
+        for celula in assinatura.celulas:
+            self._por_celula.setdefault(celula, set()).add(assinatura)
+        self.conexoes += 1
+        _estatisticas["conexoes_total"] += 1
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura):
+        for indice, chaves in ((self._por_driver, assinatura.drivers or ()), (self._por_celula, assinatura.celulas)):
+            for chave in chaves:
+                assinaturas = indice.get(chave)
+                if assinaturas is not None:
+                    assinaturas.discard(assinatura)
+                    if not assinaturas:
+                        del indice[chave]
+        self.conexoes -= 1
+
+    def publicar(self, posicao, anterior: tuple[float, float] | None):
+        """Entregar a nova posição a quem assina o driver ou um retângulo que a
+        contém; quem via o driver no retângulo e deixou de ver recebe "leave" """
+        por_driver = self._por_driver.get(posicao.driver_id)
+        por_area = self._por_celula.get(_celula(posicao.lat, posicao.lon))
+        if anterior is not None:
+            celula_anterior = _celula(*anterior)
+            if celula_anterior != _celula(posicao.lat, posicao.lon) and celula_anterior in self._por_celula:
+                por_area = (por_area or set()) | self._por_celula[celula_anterior]
+        if not (por_driver or por_area):
+            return
+        evento = evento_posicao(posicao)
+        for assinatura in por_driver or ():
+            assinatura.entregar(evento)
+        saida = None
+        for assinatura in por_area or ():
+            if assinatura.contem(posicao.lat, posicao.lon):
+                assinatura.entregar(evento)
+            elif anterior is not None and assinatura.contem(*anterior):
+                if saida is None:
+                    saida = Evento(posicao.driver_id, "leave", {"driver_id": posicao.driver_id})
+                assinatura.entregar(saida)
+
+
+transmissor = Transmissor()
+
+
+async def transmitir(drivers: frozenset[int] | None, bbox: tuple | None, iniciais):
+    """Corpo do stream SSE: posições atuais (iniciais() depois de assinar, para não
+    perder nada entre a foto e os eventos) e, em seguida, cada mudança"""
+    assinatura = transmissor.assinar(drivers, bbox)
+    try:
+        yield f"retry: {LIVE_RETRY_MS}\n\n".encode()
+        pendentes = [evento_posicao(posicao) for posicao in iniciais()]
+        if pendentes:
+            yield b"".join(evento.bytes() for evento in pendentes)
+        while True:
+            # Enquanto o cliente lê devagar (o send espera o socket), os eventos
+            # novos ficam coalescidos na fila da assinatura
+            eventos = await assinatura.proximos(LIVE_KEEPALIVE_S)
+            if not eventos:
+                yield b": keepalive\n\n"
+                continue
+            agora = time.monotonic()
+            for evento in eventos:
+                metricas.observar_atraso_live(agora - evento.publicado_em)
+            _estatisticas["enviados"] += len(eventos)
+            yield b"".join(evento.bytes() for evento in eventos)
+    finally:
+        transmissor.cancelar(assinatura)
+
+
+def estatisticas() -> dict:
+    return {**_estatisticas, "conexoes": transmissor.conexoes}
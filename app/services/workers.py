@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from app.services import blobs, metricas
+
+# Saúde por worker: cada processo grava um heartbeat (JSON) em WORKERS_DIR, e
+# qualquer worker consegue listar o estado de todos. Padrão: um diretório por
+# instância do servidor (o pid do processo que iniciou o master)
+WORKERS_DIR = os.getenv("WORKERS_DIR", os.path.join(tempfile.gettempdir(), f"tmax-workers-{os.getppid()}"))
+WORKER_HEARTBEAT = float(os.getenv("WORKER_HEARTBEAT", "5"))
+
+_estado = {"pid": None, "iniciado_em": None, "requests": 0, "em_andamento": 0}
+_tarefa: asyncio.Task | None = None
+
+
+class ContadorRequests:
+    """Middleware ASGI mínimo: requests atendidos e em andamento neste worker (um stream
+    SSE deixa de contar como em andamento quando a resposta começa)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        _estado["requests"] += 1
+        _estado["em_andamento"] += 1
+        em_andamento = [True]
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start" and metricas.resposta_em_stream(mensagem):
+                em_andamento[0] = False
+                _estado["em_andamento"] -= 1
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if em_andamento[0]:
+                _estado["em_andamento"] -= 1
+
+
+def _arquivo(pid: int) -> str:
+    return os.path.join(WORKERS_DIR, f"{pid}.json")
+
+
+def snapshot(extra: dict | None = None) -> dict:
+    """Estado deste worker"""
+    agora = time.time()
+    return {
+        **_estado,
+        "uptime": round(agora - _estado["iniciado_em"], 1) if _estado["iniciado_em"] else 0,
+        "heartbeat": agora,
+        **(extra or {}),
+    }
+
+
+def _gravar_heartbeat(extra: dict | None):
+    blobs.gravar_atomico(_arquivo(_estado["pid"]), json.dumps(snapshot(extra)).encode())
+
+
+async def _loop_heartbeat(coletar):
+    while True:
+        try:
+            await asyncio.to_thread(_gravar_heartbeat, coletar() if coletar else None)
+        except OSError:
+            pass  # diretório indisponível: só perdemos a visão agregada
+        await asyncio.sleep(WORKER_HEARTBEAT)
+
+
+def iniciar(coletar=None):
+    """Chamar no startup de cada worker; coletar() devolve dados extras do heartbeat"""
+    global _tarefa
+    _estado.update(pid=os.getpid(), iniciado_em=time.time(), requests=0, em_andamento=0)
+    _tarefa = asyncio.get_running_loop().create_task(_loop_heartbeat(coletar))
+
+
+def encerrar():
+    """Chamar no shutdown do worker: parar o heartbeat e sair da listagem"""
+    global _tarefa
+    if _tarefa is not None:
+        _tarefa.cancel()
+        _tarefa = None
+    if _estado["pid"] is not None:
+        try:
+            os.unlink(_arquivo(_estado["pid"]))
+        except FileNotFoundError:
+            pass
+
+
+def _vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def listar() -> list[dict]:
+    """Heartbeat de todos os workers; arquivos de processos mortos são removidos"""
+    if not os.path.isdir(WORKERS_DIR):
+        return []
+    agora = time.time()
+    workers = []
+    for nome in sorted(os.listdir(WORKERS_DIR)):
+        if not nome.endswith(".json"):
+            continue
+        caminho = os.path.join(WORKERS_DIR, nome)
+        try:
+            with open(caminho) as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not _vivo(dados["pid"]):
+            try:
+                os.unlink(caminho)
+            except FileNotFoundError:
+                pass
+            continue
+        dados["atrasado"] = agora - dados["heartbeat"] > 3 * WORKER_HEARTBEAT
+        workers.append(dados)
+    return workers
@@ -0,0 +1,1005 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Benchmark de carga e latência por endpoint
+
+Roda cada cenário com N clientes concorrentes (httpx async) contra a aplicação
+em processo (padrão, banco temporário) ou contra um servidor já rodando (--url).
+Mede p50/p95/p99, RPS e taxa de erro, grava o resultado em JSON e compara com
+um baseline salvo: sai com código 1 se algum cenário regrediu.
+
+Uso:
+    python benchmark.py                                   # todos os cenários, em processo
+    python benchmark.py --cenarios driver_me,login -c 50 -d 15
+    python benchmark.py --url http://localhost:8000
+    python benchmark.py --salvar-baseline                 # grava benchmarks/baseline.json
+    python benchmark.py --baseline benchmarks/baseline.json --tolerancia 0.2
+    python benchmark.py --serializacao --campo-kb 2048     # CPU/alocação por resposta de /driver/me
+    python benchmark.py --indice-espacial --posicoes 100000  # kNN/raio de /drivers/nearby
+    python benchmark.py --localizacao -c 50 -d 15          # ingestão sustentada de pings de GPS
+    python benchmark.py --transmissao --assinantes 5000    # fan-out de GET /drivers/live
+    python benchmark.py --despacho --entregas 1000 --drivers-gps 1000  # atribuição em lote
+    python benchmark.py --rotas --paradas 50               # sequenciamento de POST /routes/optimize
+    python benchmark.py --eta --nos 250000                 # grafo de ruas e buscas de GET /eta
+    python benchmark.py --cercas --entregas 5000           # avaliação de geofences por posição
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+DIRETORIO = "benchmarks"
+BASELINE_PADRAO = os.path.join(DIRETORIO, "baseline.json")
+
+# ===== CENÁRIOS =====
+# Cada cenário recebe (client, ctx, i) e devolve o Response; ctx tem os drivers de
+# teste criados no preparo (id, email, headers) e o JPEG usado nos uploads.
+CENARIOS = {}
+
+
+def cenario(nome: str):
+    def registrar(func):
+        CENARIOS[nome] = func
+        return func
+    return registrar
+
+
+def _driver(ctx, i):
+    return ctx["drivers"][i % len(ctx["drivers"])]
+
+
+@cenario("health")
+async def _health(client, ctx, i):
+    return await client.get("/health")
+
+
+@cenario("login")
+async def _login(client, ctx, i):
+    driver = _driver(ctx, i)
+    return await client.post("/auth/login", json={"email": driver["email"], "password": ctx["senha"]})
+
+
+@cenario("register")
+async def _register(client, ctx, i):
+    sufixo = f"{ctx['execucao'][-6:]}{i:07d}"
+    return await client.post("/auth/register", json={
+        "name": "Bench", "email": f"reg-{sufixo}@bench.tmax", "cpf": f"r{sufixo}",
+        "phone": "(11) 90000-0000", "password": ctx["senha"], "confirm_password": ctx["senha"],
+    })
+
+
+@cenario("driver_me")
+async def _driver_me(client, ctx, i):
+    return await client.get("/driver/me", headers=_driver(ctx, i)["headers"])
+
+
+@cenario("driver_por_id")
+async def _driver_por_id(client, ctx, i):
+    return await client.get(f"/driver/{_driver(ctx, i)['id']}")
+
+
+@cenario("drivers_listagem")
+async def _drivers_listagem(client, ctx, i):
+    return await client.get("/driver/?limit=50", headers=_driver(ctx, i)["headers"])
+
+
+@cenario("upload_perfil")
+async def _upload_perfil(client, ctx, i):
+    driver = _driver(ctx, i)
+    return await client.post(
+        f"/driver/upload/profile?driver_id={driver['id']}",
+        files={"file": ("perfil.jpg", ctx["jpeg"], "image/jpeg")},
+        headers=driver["headers"],
+    )
+
+
+@cenario("imagem_perfil")
+async def _imagem_perfil(client, ctx, i):
+    return await client.get(f"/driver/{_driver(ctx, i)['id']}/profile_image?w=128")
+
+
+@cenario("vehicle")
+async def _vehicle(client, ctx, i):
+    return await client.get(f"/driver/vehicle/{_driver(ctx, i)['id']}")
+
+
+@cenario("vehicle_update")
+async def _vehicle_update(client, ctx, i):
+    driver = _driver(ctx, i)
+    return await client.put(
+        f"/driver/vehicle/{driver['motorcycle_id']}", json={"model": f"CG {i % 100}"}, headers=driver["headers"]
+    )
+
+
+# ===== PREPARO =====
+
+def _jpeg() -> bytes:
+    from PIL import Image
+    saida = io.BytesIO()
+    Image.new("RGB", (800, 600), (200, 30, 30)).save(saida, "JPEG", quality=90)
+    return saida.getvalue()
+
+
+async def preparar(client, quantidade: int) -> dict:
+    """Criar drivers de teste (com foto e moto) e obter os tokens"""
+    execucao = datetime.now().strftime("%Y%m%d%H%M%S")
+    ctx = {"execucao": execucao, "senha": "bench-senha-123", "jpeg": _jpeg(), "drivers": []}
+    for n in range(quantidade):
+        email = f"bench-{execucao}-{n}@bench.tmax"
+        r = await client.post("/auth/register", json={
+            "name": f"Bench {n}", "email": email, "cpf": f"b{execucao[-8:]}{n:03d}"[:14],
+            "phone": "(11) 90000-0000", "password": ctx["senha"], "confirm_password": ctx["senha"],
+        })
+        r.raise_for_status()
+        driver_id = r.json()["id"]
+        r = await client.post("/auth/login", json={"email": email, "password": ctx["senha"]})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        await client.post(
+            f"/driver/upload/profile?driver_id={driver_id}",
+            files={"file": ("perfil.jpg", ctx["jpeg"], "image/jpeg")}, headers=headers,
+        )
+        r = await client.post(
+            "/driver/vehicle", files={"file": ("moto.jpg", ctx["jpeg"], "image/jpeg")}, headers=headers
+        )
+        r.raise_for_status()
+        ctx["drivers"].append({
+            "id": driver_id, "email": email, "headers": headers, "motorcycle_id": r.json()["motorcycle_id"],
+        })
+    return ctx
+
+
+# ===== EXECUÇÃO =====
+
+def percentil(valores: list[float], p: float) -> float:
+    """Percentil por posição mais próxima (valores já ordenados)"""
+    if not valores:
+        return 0.0
+    posicao = math.ceil(p / 100 * len(valores)) - 1
+    return valores[max(0, min(len(valores) - 1, posicao))]
+
+
+def resumir(latencias: list[float], erros: int, total: int, duracao: float, bytes_recebidos: int) -> dict:
+    latencias = sorted(latencias)
+    ms = lambda s: round(s * 1000, 3)
+    return {
+        "requests": total,
+        "erros": erros,
+        "taxa_erro": round(erros / total, 4) if total else 0.0,
+        "rps": round(total / duracao, 1) if duracao else 0.0,
+        "p50_ms": ms(percentil(latencias, 50)),
+        "p95_ms": ms(percentil(latencias, 95)),
+        "p99_ms": ms(percentil(latencias, 99)),
+        "media_ms": ms(sum(latencias) / len(latencias)) if latencias else 0.0,
+        "max_ms": ms(latencias[-1]) if latencias else 0.0,
+        "bytes_por_resposta": round(bytes_recebidos / total) if total else 0,
+    }
+
+
+async def executar_cenario(client, ctx, func, concorrencia: int, duracao: float, aquecimento: int) -> dict:
+    """N clientes em loop durante `duracao` segundos; só conta depois do aquecimento"""
+    contador = itertools.count()
+    for _ in range(aquecimento):
+        await func(client, ctx, next(contador))
+
+    latencias, estado = [], {"erros": 0, "bytes": 0}
+    fim = time.perf_counter() + duracao
+
+    async def cliente():
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                resposta = await func(client, ctx, next(contador))
+                if resposta.status_code >= 400:
+                    estado["erros"] += 1
+                estado["bytes"] += len(resposta.content)
+            except httpx.HTTPError:
+                estado["erros"] += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concorrencia)))
+    decorrido = time.perf_counter() - inicio
+    return resumir(latencias, estado["erros"], len(latencias), decorrido, estado["bytes"])
+
+
+def _app_em_processo():
+    """Importar a aplicação com banco e blobs temporários (antes do import de main)"""
+    temporario = tempfile.mkdtemp(prefix="tmax-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{temporario}/tmax.db")
+    os.environ.setdefault("BLOB_DIR", os.path.join(temporario, "blobs"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from main import app
+    return app
+
+
+def _commit_atual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def rodar(args) -> dict:
+    nomes = args.cenarios.split(",") if args.cenarios else list(CENARIOS)
+    desconhecidos = [nome for nome in nomes if nome not in CENARIOS]
+    if desconhecidos:
+        raise SystemExit(f"Cenários desconhecidos: {', '.join(desconhecidos)} (disponíveis: {', '.join(CENARIOS)})")
+
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30)
+        app = None
+    else:
+        app = _app_em_processo()
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+    resultado = {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_atual(),
+            "alvo": args.url or "em processo",
+            "concorrencia": args.concorrencia,
+            "duracao_s": args.duracao,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "cenarios": {},
+    }
+    try:
+        async with client:
+            ctx = await preparar(client, args.drivers)
+            for nome in nomes:
+                print(f"-> {nome} ...", flush=True)
+                resultado["cenarios"][nome] = await executar_cenario(
+                    client, ctx, CENARIOS[nome], args.concorrencia, args.duracao, args.aquecimento
+                )
+    finally:
+        if app is not None:
+            await app.router.shutdown()
+    return resultado
+
+
+# ===== SERIALIZAÇÃO (CPU e alocação por resposta de GET /driver/me) =====
+
+def _driver_orm(campo_kb: int):
+    from app.models.driver import Driver
+    agora = datetime.now()
+    return Driver(
+        id=1, nome="Benchmark", email="bench@bench.tmax", cpf="000.000.000-00",
+        phone="(11) 90000-0000", password="x", is_active=True, created_at=agora, updated_at=agora,
+        # campo_kb simula os campos base64 antigos (imagens inline no registro)
+        profile_image="A" * (campo_kb * 1024) if campo_kb else "e3b0c44298fc1c149afbf4c8996fb924",
+    )
+
+
+async def medir_serializacao(repeticoes: int, campo_kb: int) -> dict:
+    """response_model (validar -> dict -> json.dumps) contra RespostaJSON (direto para bytes)"""
+    import tracemalloc
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from app.models.schemas import Driver as DriverSchema
+    from app.respostas import resposta_modelo
+
+    app = _app_em_processo()
+    rota = next(r for r in app.routes if getattr(r, "path", None) == "/driver/me" and "GET" in r.methods)
+    driver = _driver_orm(campo_kb)
+
+    async def response_model():
+        conteudo = await serialize_response(field=rota.response_field, response_content=driver)
+        return JSONResponse(conteudo).body
+
+    async def resposta_json():
+        return resposta_modelo(driver, DriverSchema).body
+
+    caminhos = {"response_model": response_model, "RespostaJSON": resposta_json}
+    assert json.loads(await response_model()) == json.loads(await resposta_json())
+
+    resultado = {}
+    for nome, caminho in caminhos.items():
+        for _ in range(min(repeticoes, 100)):
+            await caminho()
+        inicio = time.process_time()
+        for _ in range(repeticoes):
+            corpo = await caminho()
+        cpu = time.process_time() - inicio
+
+        tracemalloc.start()
+        antes = tracemalloc.get_traced_memory()[0]
+        await caminho()
+        pico = tracemalloc.get_traced_memory()[1] - antes
+        tracemalloc.stop()
+        resultado[nome] = {
+            "cpu_us": round(cpu / repeticoes * 1e6, 1),
+            "pico_alocado_kb": round(pico / 1024, 1),
+            "bytes_resposta": len(corpo),
+        }
+    return resultado
+
+
+def imprimir_serializacao(resultado: dict):
+    print(f"\n{'caminho':<18}{'cpu µs':>10}{'pico KB':>12}{'resposta':>12}")
+    for nome, r in resultado.items():
+        print(f"{nome:<18}{r['cpu_us']:>10}{r['pico_alocado_kb']:>12}{r['bytes_resposta']:>12}")
+
+
+# ===== ÍNDICE ESPACIAL (buscas de GET /drivers/nearby) =====
+
+# Região metropolitana de São Paulo, aproximadamente 90 x 80 km
+_REGIAO = ((-24.0, -23.2), (-47.1, -46.2))
+
+
+def medir_indice_espacial(quantidade: int, repeticoes: int) -> dict:
+    """kNN e busca por raio no índice em memória contra uma varredura de todas as posições"""
+    import random
+    from app.services.posicoes import IndiceEspacial, METROS_POR_GRAU
+
+    aleatorio = random.Random(42)
+    (lat_min, lat_max), (lon_min, lon_max) = _REGIAO
+    agora = datetime.utcnow()
+    indice = IndiceEspacial()
+    inicio = time.perf_counter()
+    for driver_id in range(1, quantidade + 1):
+        indice.atualizar(
+            driver_id, aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lon_min, lon_max),
+            "moto" if driver_id % 4 else "carro", agora, ativo=driver_id % 10 != 0,
+        )
+    carga = time.perf_counter() - inicio
+    pontos = [(aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lon_min, lon_max))
+              for _ in range(repeticoes)]
+
+    def varredura(lat, lon, limite, raio_m, vehicle_type):
+        cos_lat = math.cos(math.radians(lat))
+        distancias = []
+        for posicao in indice._posicoes.values():
+            if posicao.ativo and (vehicle_type is None or posicao.vehicle_type == vehicle_type):
+                d = math.hypot(posicao.lat - lat, (posicao.lon - lon) * cos_lat) * METROS_POR_GRAU
+                if d <= raio_m:
+                    distancias.append(d)
+        return sorted(distancias)[:limite]
+
+    buscas = {
+        "knn_20": (20, 50000, None),
+        "knn_20_moto": (20, 50000, "moto"),
+        "raio_1km": (100, 1000, None),
+        "raio_5km_100": (100, 5000, None),
+    }
+    resultado = {"posicoes": quantidade, "carga_us_por_posicao": round(carga / quantidade * 1e6, 2)}
+    for nome, (limite, raio_m, vehicle_type) in buscas.items():
+        # Mesmo resultado da varredura (amostra)
+        for lat, lon in pontos[:5]:
+            obtido = [d for d, _ in indice.proximos(lat, lon, limite, raio_m, vehicle_type)]
+            esperado = varredura(lat, lon, limite, raio_m, vehicle_type)
+            assert len(obtido) == len(esperado) and all(map(math.isclose, obtido, esperado)), nome
+        latencias = []
+        encontrados = 0
+        for lat, lon in pontos:
+            t0 = time.perf_counter()
+            encontrados += len(indice.proximos(lat, lon, limite, raio_m, vehicle_type))
+            latencias.append((time.perf_counter() - t0) * 1e6)
+        latencias.sort()
+        t0 = time.perf_counter()
+        for lat, lon in pontos[:20]:
+            varredura(lat, lon, limite, raio_m, vehicle_type)
+        resultado[nome] = {
+            "p50_us": round(percentil(latencias, 50), 1),
+            "p99_us": round(percentil(latencias, 99), 1),
+            "media_encontrados": round(encontrados / len(pontos), 1),
+            "varredura_us": round((time.perf_counter() - t0) / 20 * 1e6, 1),
+        }
+    return resultado
+
+
+def imprimir_indice_espacial(resultado: dict):
+    print(f"\n{resultado['posicoes']} posições, carga {resultado['carga_us_por_posicao']} µs/posição")
+    print(f"{'busca':<16}{'p50 µs':>10}{'p99 µs':>10}{'itens':>8}{'varredura µs':>15}")
+    for nome, r in resultado.items():
+        if isinstance(r, dict):
+            print(f"{nome:<16}{r['p50_us']:>10}{r['p99_us']:>10}{r['media_encontrados']:>8}{r['varredura_us']:>15}")
+
+
+# ===== INGESTÃO DE PINGS (POST /driver/location + flusher) =====
+
+def _inserir_drivers(quantidade: int) -> list[tuple[int, str]]:
+    """(id, email) de drivers inseridos direto no banco, sem bcrypt"""
+    from sqlalchemy import insert
+    from app.config.database import engine
+    from app.models.driver import Driver
+
+    execucao = datetime.now().strftime("%Y%m%d%H%M%S")
+    linhas = [
+        {"nome": f"GPS {n}", "email": f"gps-{execucao}-{n}@bench.tmax", "cpf": f"g{execucao[-6:]}{n:07d}",
+         "phone": "(11) 90000-0000", "password": "x"}
+        for n in range(quantidade)
+    ]
+    with engine.begin() as conexao:
+        ids = conexao.execute(insert(Driver).returning(Driver.id, sort_by_parameter_order=True), linhas).scalars().all()
+    return [(id_, linha["email"]) for id_, linha in zip(ids, linhas)]
+
+
+def _criar_drivers_gps(quantidade: int) -> list[dict]:
+    """Headers com tokens que já trazem o id (sem SELECT na autenticação)"""
+    from datetime import timedelta
+    from app.auth import criar_access_token
+
+    return [
+        {"Authorization": f"Bearer {criar_access_token({'sub': email, 'id': id_}, timedelta(hours=1))}"}
+        for id_, email in _inserir_drivers(quantidade)
+    ]
+
+
+async def medir_localizacao(args) -> dict:
+    """Pings aceitos por segundo (requests com --pings-por-request pings, -c clientes) e
+    gravados por segundo até o flusher esvaziar os buffers"""
+    import random
+    from sqlalchemy import func, select
+    from app.config.database import engine
+    from app.models.driver import DriverLocation
+    from app.services import localizacao
+
+    app = _app_em_processo()
+    await app.router.startup()
+    headers = await asyncio.to_thread(_criar_drivers_gps, args.drivers_gps)
+    antes = await asyncio.to_thread(
+        lambda: engine.connect().execute(select(func.count()).select_from(DriverLocation)).scalar()
+    )
+    aleatorio = random.Random(7)
+    proximo = itertools.count()
+    latencias, estado = [], {"pings": 0, "erros": 0}
+    fim = time.perf_counter() + args.duracao
+
+    async def cliente(client):
+        while time.perf_counter() < fim:
+            i = next(proximo)
+            pings = [
+                {"lat": -23.5 + aleatorio.random() / 10, "lon": -46.6 + aleatorio.random() / 10,
+                 "speed": 8.0, "heading": 90.0, "accuracy": 5.0}
+                for _ in range(args.pings_por_request)
+            ]
+            inicio = time.perf_counter()
+            resposta = await client.post("/driver/location", json=pings, headers=headers[i % len(headers)])
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code in (200, 202):
+                estado["pings"] += args.pings_por_request
+            else:
+                estado["erros"] += 1
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=30) as client:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(client) for _ in range(args.concorrencia)))
+        ingestao = time.perf_counter() - inicio
+        while localizacao.estatisticas()["pendentes"]:
+            await asyncio.sleep(0.01)
+        drenado = time.perf_counter() - inicio
+    estatisticas = localizacao.estatisticas()
+    await app.router.shutdown()
+    gravados = await asyncio.to_thread(
+        lambda: engine.connect().execute(select(func.count()).select_from(DriverLocation)).scalar()
+    ) - antes
+
+    latencias.sort()
+    return {
+        "durabilidade": estatisticas["durabilidade"],
+        "flush_ms": localizacao.LOCALIZACAO_FLUSH_MS,
+        "drivers": args.drivers_gps,
+        "requests": len(latencias),
+        "erros": estado["erros"],
+        "pings_aceitos": estado["pings"],
+        "pings_gravados": gravados,
+        "pings_descartados": estatisticas["descartados"],
+        "aceitos_por_s": round(estado["pings"] / ingestao),
+        "gravados_por_s": round(gravados / drenado),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "flushes": estatisticas["flushes"],
+        "flush_medio_ms": round(estatisticas["flush_segundos"] / max(estatisticas["flushes"], 1) * 1000, 1),
+    }
+
+
+def imprimir_resumo(resultado: dict):
+    print()
+    for chave, valor in resultado.items():
+        print(f"{chave:<20}{valor:>12}")
+
+
+# ===== POSIÇÕES AO VIVO (GET /drivers/live) =====
+
+async def medir_transmissao(args) -> dict:
+    """Custo de publicar cada movimento para --assinantes conexões (metade por
+    retângulo, metade por lista de drivers; 10% lendo devagar) e atraso até o envio"""
+    import random
+    from app.services import metricas, transmissao
+    from app.services.posicoes import IndiceEspacial
+
+    aleatorio = random.Random(11)
+    (lat_min, lat_max), (lon_min, lon_max) = _REGIAO
+    indice = IndiceEspacial(ao_mover=transmissao.transmissor.publicar)
+    agora = datetime.utcnow()
+    for driver_id in range(1, args.drivers_gps + 1):
+        indice.atualizar(driver_id, aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lon_min, lon_max),
+                         "moto", agora)
+    recebidos = [0]
+
+    async def assinante(i: int):
+        if i % 2:
+            lat, lon = aleatorio.uniform(lat_min, lat_max - 0.05), aleatorio.uniform(lon_min, lon_max - 0.05)
+            drivers, bbox = None, (lat, lon, lat + 0.05, lon + 0.05)
+        else:
+            drivers, bbox = frozenset(aleatorio.sample(range(1, args.drivers_gps + 1), 5)), None
+        lento = i % 10 == 0
+        async for bloco in transmissao.transmitir(drivers, bbox, list):
+            recebidos[0] += len(bloco)
+            await asyncio.sleep(0.2 if lento else 0)
+
+    tarefas = [asyncio.create_task(assinante(i)) for i in range(args.assinantes)]
+    await asyncio.sleep(0.1)
+    metricas._atraso_live.clear()
+    inicial = transmissao.estatisticas()
+    por_tick = max(args.movimentos_por_s // 100, 1)
+    movimentos, publicando = 0, 0.0
+    fim = time.perf_counter() + args.duracao
+    while time.perf_counter() < fim:
+        t0 = time.perf_counter()
+        for _ in range(por_tick):
+            driver_id = aleatorio.randint(1, args.drivers_gps)
+            posicao = indice.obter(driver_id)
+            indice.atualizar(driver_id, posicao.lat + aleatorio.uniform(-5e-4, 5e-4),
+                             posicao.lon + aleatorio.uniform(-5e-4, 5e-4), None, datetime.utcnow())
+        publicando += time.perf_counter() - t0
+        movimentos += por_tick
+        await asyncio.sleep(max(0.01 - (time.perf_counter() - t0), 0))
+    await asyncio.sleep(0.5)
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+
+    final = transmissao.estatisticas()
+    delta = {chave: final[chave] - inicial[chave] for chave in ("enviados", "coalescidos", "descartados")}
+    atraso = metricas._atraso_live.get(())
+    p99 = None
+    if atraso is not None:
+        acumulado, alvo = 0, sum(atraso.contagens) * 0.99
+        for limite, contagem in zip((*atraso.limites, math.inf), atraso.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                p99 = limite
+                break
+    return {
+        "assinantes": args.assinantes,
+        "drivers": args.drivers_gps,
+        "movimentos_por_s": round(movimentos / args.duracao),
+        "us_por_movimento": round(publicando / movimentos * 1e6, 1),
+        "eventos_enviados_por_s": round(delta["enviados"] / args.duracao),
+        "coalescidos": delta["coalescidos"],
+        "descartados": delta["descartados"],
+        "mb_enviados": round(recebidos[0] / 1e6, 1),
+        "atraso_medio_ms": round(atraso.soma / max(sum(atraso.contagens), 1) * 1000, 2) if atraso else None,
+        "atraso_p99_ms_ate": None if p99 is None else p99 * 1000,
+    }
+
+
+# ===== DESPACHO EM LOTE (app/services/despacho.py) =====
+
+def _guloso(custos, limite: float) -> tuple[int, float]:
+    """Referência: cada entrega, em ordem, pega o driver livre mais próximo"""
+    import numpy as np
+
+    livres = np.ones(custos.shape[1], dtype=bool)
+    atribuidas, total = 0, 0.0
+    for linha in custos:
+        candidatos = np.where(livres, linha, np.inf)
+        coluna = int(candidatos.argmin())
+        if candidatos[coluna] <= limite:
+            livres[coluna] = False
+            atribuidas += 1
+            total += candidatos[coluna]
+    return atribuidas, total
+
+
+def _inserir_entregas(coletas):
+    from sqlalchemy import insert
+    from app.config.database import engine
+    from app.models.delivery import Delivery
+
+    agora = datetime.utcnow()
+    with engine.begin() as conexao:
+        conexao.execute(insert(Delivery), [
+            {"pickup_lat": lat, "pickup_lon": lon, "dropoff_lat": lat, "dropoff_lon": lon,
+             "status": "open", "created_at": agora}
+            for lat, lon in coletas
+        ])
+
+
+async def medir_despacho(args) -> dict:
+    """Matriz de distâncias e atribuição ótima de --entregas x --drivers-gps (CPU), comparadas
+    com a atribuição gulosa, e uma rodada completa com leitura e gravação no banco"""
+    import numpy as np
+
+    os.environ.setdefault("DESPACHO_JANELA_S", "0")  # só a rodada medida
+    app = _app_em_processo()
+    from app.services import despacho, posicoes
+
+    aleatorio = np.random.default_rng(3)
+    (lat_min, lat_max), (lon_min, lon_max) = _REGIAO
+    entregas = {
+        "id": np.arange(args.entregas), "lat": aleatorio.uniform(lat_min, lat_max, args.entregas),
+        "lon": aleatorio.uniform(lon_min, lon_max, args.entregas), "tipo": np.full(args.entregas, -1),
+    }
+    drivers = {
+        "id": np.arange(args.drivers_gps), "lat": aleatorio.uniform(lat_min, lat_max, args.drivers_gps),
+        "lon": aleatorio.uniform(lon_min, lon_max, args.drivers_gps), "tipo": np.zeros(args.drivers_gps, np.int64),
+    }
+    tempos = {"matriz": [], "atribuicao": [], "total": []}
+    for _ in range(5):
+        t0 = time.perf_counter()
+        custos = despacho.matriz_distancias(entregas["lat"], entregas["lon"], drivers["lat"], drivers["lon"])
+        t1 = time.perf_counter()
+        linhas, colunas = despacho.atribuir(custos, despacho.DESPACHO_RAIO_M)
+        t2 = time.perf_counter()
+        despacho.planejar(entregas, drivers)
+        tempos["matriz"].append(t1 - t0)
+        tempos["atribuicao"].append(t2 - t1)
+        tempos["total"].append(time.perf_counter() - t2)
+    gulosas, total_guloso = _guloso(custos, despacho.DESPACHO_RAIO_M)
+
+    await app.router.startup()
+    ids = [id_ for id_, _ in await asyncio.to_thread(_inserir_drivers, args.drivers_gps)]
+    agora = datetime.utcnow()
+    for id_, lat, lon in zip(ids, drivers["lat"].tolist(), drivers["lon"].tolist()):
+        posicoes.indice.atualizar(id_, lat, lon, "moto", agora, ativo=True)
+    await asyncio.to_thread(_inserir_entregas, zip(entregas["lat"].tolist(), entregas["lon"].tolist()))
+    rodada = await despacho.despachar()
+    await app.router.shutdown()
+
+    return {
+        "entregas": args.entregas,
+        "drivers": args.drivers_gps,
+        "matriz_ms": round(min(tempos["matriz"]) * 1000, 1),
+        "atribuicao_ms": round(min(tempos["atribuicao"]) * 1000, 1),
+        "planejar_ms": round(min(tempos["total"]) * 1000, 1),
+        "atribuidas": len(linhas),
+        "km_medio_otimo": round(float(custos[linhas, colunas].sum()) / max(len(linhas), 1) / 1000, 2),
+        "atribuidas_gulosa": gulosas,
+        "km_medio_guloso": round(total_guloso / max(gulosas, 1) / 1000, 2),
+        "rodada_banco_ms": round(rodada["seconds"] * 1000, 1),
+        "gravadas_rodada": len(rodada["assignments"]),
+    }
+
+
+# ===== SEQUENCIAMENTO DE PARADAS (POST /routes/optimize) =====
+
+def medir_rotas(paradas: int, repeticoes: int) -> dict:
+    """Vizinho mais próximo + 2-opt/Or-opt em rotas aleatórias de --paradas paradas
+    (pares coleta -> entrega) e custo da matriz com e sem o cache de linhas"""
+    import random
+    from app.services import rotas
+
+    aleatorio = random.Random(23)
+    (lat_min, lat_max), (lon_min, lon_max) = _REGIAO
+
+    def ponto():
+        return aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lon_min, lon_max)
+
+    latencias, ganhos, matriz_cheia, matriz_incremental = [], [], [], []
+    for _ in range(repeticoes):
+        pontos = [ponto() for _ in range(paradas + 1)]  # origem + paradas
+        antes = [[]] + [[] if n % 2 else [n - 1] for n in range(1, paradas + 1)]
+        cache = rotas.CacheDistancias()
+        t0 = time.perf_counter()
+        matriz = cache.matriz(pontos)
+        matriz_cheia.append(time.perf_counter() - t0)
+        pontos[aleatorio.randint(1, paradas)] = ponto()  # uma parada mudou
+        t0 = time.perf_counter()
+        cache.matriz(pontos)
+        matriz_incremental.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        resultado = rotas.sequenciar(matriz, antes, rotas.ROTAS_ORCAMENTO_MAX_MS / 1000)
+        latencias.append(time.perf_counter() - t0)
+        ganhos.append(1 - resultado["final"] / resultado["inicial"])
+    latencias.sort()
+    return {
+        "paradas": paradas,
+        "rotas": repeticoes,
+        "sequenciar_p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "sequenciar_p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "ganho_sobre_vizinho": f"{sum(ganhos) / len(ganhos):.1%}",
+        "matriz_ms": round(sum(matriz_cheia) / repeticoes * 1000, 2),
+        "matriz_1_mudanca_ms": round(sum(matriz_incremental) / repeticoes * 1000, 2),
+    }
+
+
+# ===== TEMPO DE VIAGEM (GET /eta) =====
+
+def _cidade_sintetica(nos: int, semente: int = 24) -> dict:
+    """Grade de ruas ~110 m com avenidas a cada 10 quadras, 30% das ruas em mão única
+    e 5% dos trechos faltando"""
+    import numpy as np
+
+    aleatorio = np.random.default_rng(semente)
+    lado = max(int(math.sqrt(nos)), 2)
+    linha, coluna = np.divmod(np.arange(lado * lado), lado)
+    lat = -23.6 + linha * 0.001 + aleatorio.normal(0, 0.0001, lado * lado)
+    lon = -46.7 + coluna * 0.001 + aleatorio.normal(0, 0.0001, lado * lado)
+    origens, destinos, kmh = [], [], []
+    for vizinho, avenida in ((1, coluna % 10 == 0), (lado, linha % 10 == 0)):
+        a = np.flatnonzero((coluna < lado - 1) if vizinho == 1 else (linha < lado - 1))
+        a = a[aleatorio.random(len(a)) > 0.05]
+        b = a + vizinho
+        velocidade = np.where(avenida[a] | avenida[b], 50.0, 25.0)
+        mao_unica = aleatorio.random(len(a)) < 0.3
+        for x, y, manter in ((a, b, np.ones(len(a), bool)), (b, a, ~mao_unica)):
+            origens.append(x[manter]), destinos.append(y[manter]), kmh.append(velocidade[manter])
+    from app.services import eta
+    origens, destinos, kmh = np.concatenate(origens), np.concatenate(destinos), np.concatenate(kmh)
+    segundos = eta._metros(lat[origens], lon[origens], lat[destinos], lon[destinos]) / kmh * 3.6
+    return {"lat": lat, "lon": lon, "origens": origens, "destinos": destinos, "segundos": segundos}
+
+
+def medir_eta(nos: int, repeticoes: int) -> dict:
+    """Grafo sintético de --nos nós: geração dos arrays, abertura com mmap, A* com
+    landmarks contra o Dijkstra completo e GET /eta sem e com cache"""
+    import numpy as np
+    from app.services import eta
+
+    cidade = _cidade_sintetica(nos)
+    with tempfile.TemporaryDirectory() as diretorio:
+        t0 = time.perf_counter()
+        meta = eta.construir(diretorio, cidade["lat"], cidade["lon"], cidade["origens"],
+                             cidade["destinos"], cidade["segundos"])
+        construir_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        grafo = eta.Grafo(diretorio)
+        grafo.ajustar([0.0], [0.0])
+        abrir_s = time.perf_counter() - t0
+
+        aleatorio = np.random.default_rng(1)
+        pares = aleatorio.integers(0, len(grafo), size=(repeticoes, 2)).tolist()
+        a_estrela, completo, erros = [], [], 0
+        for origem, destino in pares:
+            t0 = time.perf_counter()
+            segundos = grafo.a_estrela(origem, destino, math.inf)
+            a_estrela.append(time.perf_counter() - t0)
+            if len(completo) < 20:
+                t0 = time.perf_counter()
+                referencia = grafo.um_para_muitos(origem, [destino], math.inf)[0]
+                completo.append(time.perf_counter() - t0)
+                erros += abs(segundos - referencia) > 1e-3 * max(referencia, 1.0)
+        destinos = aleatorio.integers(0, len(grafo), size=50).tolist()
+        t0 = time.perf_counter()
+        grafo.um_para_muitos(pares[0][0], destinos, eta.ETA_MAX_S)
+        um_para_muitos_s = time.perf_counter() - t0
+
+        # Caminho do endpoint: pool de processos e cache de pares
+        eta.ETA_GRAFO_DIR, eta._grafo = diretorio, grafo
+        pontos = list(zip(cidade["lat"][::97].tolist(), cidade["lon"][::97].tolist()))
+        asyncio.run(eta.estimar(pontos[0], pontos[1:2]))  # sobe o pool
+        estimar = {"frio": [], "cache": []}
+        for i in range(1, min(len(pontos), 51)):
+            for chave in ("frio", "cache"):
+                estimar[chave].append(asyncio.run(eta.estimar(pontos[i], pontos[i + 1:i + 2] or pontos[:1]))["seconds"])
+        eta.encerrar()
+
+    a_estrela.sort()
+    return {
+        "nos": meta["nos"],
+        "arestas": meta["arestas"],
+        "construir_s": round(construir_s, 2),
+        "abrir_ms": round(abrir_s * 1000, 1),
+        "a_estrela_p50_ms": round(percentil(a_estrela, 50) * 1000, 2),
+        "a_estrela_p99_ms": round(percentil(a_estrela, 99) * 1000, 2),
+        "nos_explorados_medio": grafo.explorados // repeticoes,
+        "dijkstra_completo_ms": round(sum(completo) / len(completo) * 1000, 2),
+        "divergencias": erros,
+        "um_para_50_ms": round(um_para_muitos_s * 1000, 2),
+        "eta_sem_cache_ms": round(percentil(sorted(estimar["frio"]), 50) * 1000, 2),
+        "eta_com_cache_ms": round(percentil(sorted(estimar["cache"]), 50) * 1000, 3),
+    }
+
+
+# ===== CERCAS (app/services/cercas.py) =====
+
+def medir_cercas(entregas: int, passos: int = 120) -> dict:
+    """Um driver por entrega atravessando a zona de coleta com ruído de GPS (σ 8 m):
+    custo de cada avaliação pela grade contra testar todas as zonas, e eventos
+    enter/exit emitidos sem e com histerese (o ideal é um par por driver)"""
+    import random
+    from app.services.cercas import CERCAS_HISTERESE_M, METROS_POR_GRAU, MotorCercas, Zona
+
+    aleatorio = random.Random(25)
+    (lat_min, lat_max), (lon_min, lon_max) = _REGIAO
+    zonas, trajetos = [], []
+    for driver_id in range(1, entregas + 1):
+        lat, lon = aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lon_min, lon_max)
+        cos = math.cos(math.radians(lat))
+        zonas.append(Zona(2 * driver_id - 1, driver_id, driver_id, "pickup", "circle", lat, lon, 75.0))
+        zonas.append(Zona(2 * driver_id, driver_id, driver_id, "dropoff", "circle",
+                          lat + aleatorio.uniform(-0.03, 0.03), lon + aleatorio.uniform(-0.03, 0.03), 75.0))
+        # 400 m antes até 400 m depois do centro da coleta, com ruído
+        angulo = aleatorio.uniform(0, 2 * math.pi)
+        trajeto = []
+        for passo in range(passos):
+            metros = -400 + 800 * passo / (passos - 1)
+            dy = metros * math.sin(angulo) + aleatorio.gauss(0, 8)
+            dx = metros * math.cos(angulo) + aleatorio.gauss(0, 8)
+            trajeto.append((lat + dy / METROS_POR_GRAU, lon + dx / (METROS_POR_GRAU * cos)))
+        trajetos.append(trajeto)
+    # Bases sem entrega (hexágonos de ~150 m), valem para qualquer driver
+    for i in range(entregas // 10):
+        lat, lon = aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lon_min, lon_max)
+        graus = 150 / METROS_POR_GRAU
+        vertices = [(lat + graus * math.sin(k * math.pi / 3), lon + graus * math.cos(k * math.pi / 3))
+                    for k in range(6)]
+        zonas.append(Zona(10 * entregas + i, None, None, "custom", "polygon", vertices=vertices))
+
+    def rodar(histerese_m: float) -> tuple[MotorCercas, list[dict], float]:
+        eventos = []
+        motor = MotorCercas(histerese_m=histerese_m, ao_evento=eventos.append)
+        for zona in zonas:
+            motor.registrar(zona)
+        t0 = time.perf_counter()
+        for passo in range(passos):
+            for driver_id, trajeto in enumerate(trajetos, 1):
+                lat, lon = trajeto[passo]
+                motor.avaliar(driver_id, lat, lon, passo)
+        return motor, eventos, time.perf_counter() - t0
+
+    _, sem_histerese, _ = rodar(0.0)
+    motor, com_histerese, duracao = rodar(CERCAS_HISTERESE_M)
+    amostra = [ponto for trajeto in trajetos[:50] for ponto in trajeto]
+    t0 = time.perf_counter()
+    for lat, lon in amostra:
+        for zona in zonas:
+            zona.distancia_borda(lat, lon)
+    forca_bruta = time.perf_counter() - t0
+    posicoes = entregas * passos
+    return {
+        "zonas": len(zonas),
+        "posicoes": posicoes,
+        "avaliar_us": round(duracao / posicoes * 1e6, 2),
+        "avaliacoes_por_s": int(posicoes / duracao),
+        "testes_por_posicao": round(motor.testes / motor.avaliacoes, 2),
+        "todas_zonas_us": round(forca_bruta / len(amostra) * 1e6, 1),
+        "eventos_ideal": 2 * entregas,
+        "eventos_sem_hist": len(sem_histerese),
+        "eventos_com_hist": len(com_histerese),
+    }
+
+
+# ===== RELATÓRIO E BASELINE =====
+
+def imprimir(resultado: dict):
+    print(f"\n{'cenário':<18}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'erros':>8}")
+    for nome, r in resultado["cenarios"].items():
+        print(f"{nome:<18}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['taxa_erro']:>8.1%}")
+
+
+def comparar(resultado: dict, baseline: dict, tolerancia: float) -> list[str]:
+    """Regressões: p95/p99 acima, RPS abaixo do baseline (além da tolerância) ou mais erros"""
+    regressoes = []
+    for nome, atual in resultado["cenarios"].items():
+        base = baseline.get("cenarios", {}).get(nome)
+        if not base:
+            continue
+        for metrica in ("p95_ms", "p99_ms"):
+            if base[metrica] and atual[metrica] > base[metrica] * (1 + tolerancia):
+                regressoes.append(f"{nome}: {metrica} {base[metrica]} -> {atual[metrica]}")
+        if base["rps"] and atual["rps"] < base["rps"] * (1 - tolerancia):
+            regressoes.append(f"{nome}: rps {base['rps']} -> {atual['rps']}")
+        if atual["taxa_erro"] > base["taxa_erro"] + 0.01:
+            regressoes.append(f"{nome}: taxa_erro {base['taxa_erro']} -> {atual['taxa_erro']}")
+    return regressoes
+
+
+def _gravar(caminho: str, dados: dict):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "w") as f:
+        json.dump(dados, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de carga e latência da API")
+    parser.add_argument("--url", help="servidor já rodando (padrão: aplicação em processo)")
+    parser.add_argument("--cenarios", help=f"lista separada por vírgula (padrão: todos: {','.join(CENARIOS)})")
+    parser.add_argument("-c", "--concorrencia", type=int, default=20, help="clientes simultâneos")
+    parser.add_argument("-d", "--duracao", type=float, default=10, help="segundos por cenário")
+    parser.add_argument("--aquecimento", type=int, default=20, help="requests descartados antes de medir")
+    parser.add_argument("--drivers", type=int, default=10, help="drivers de teste criados no preparo")
+    parser.add_argument("--saida", help="arquivo JSON do resultado (padrão: benchmarks/resultado-<data>.json)")
+    parser.add_argument("--baseline", help="comparar com este resultado salvo")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="variação aceita antes de acusar regressão")
+    parser.add_argument("--salvar-baseline", nargs="?", const=BASELINE_PADRAO, help="gravar também como baseline")
+    parser.add_argument("--serializacao", action="store_true",
+                        help="só medir CPU e alocação da serialização de GET /driver/me")
+    parser.add_argument("--repeticoes", type=int, default=5000,
+                        help="respostas serializadas (--serializacao), buscas, até 2000 (--indice-espacial) "
+                             "rotas, até 500 (--rotas) ou pares origem/destino, até 2000 (--eta)")
+    parser.add_argument("--campo-kb", type=int, default=0,
+                        help="tamanho de um campo texto grande, como os base64 antigos (--serializacao)")
+    parser.add_argument("--indice-espacial", action="store_true",
+                        help="só medir as buscas do índice de posições (GET /drivers/nearby)")
+    parser.add_argument("--posicoes", type=int, default=100000, help="drivers no índice (--indice-espacial)")
+    parser.add_argument("--localizacao", action="store_true",
+                        help="só medir a ingestão de pings de GPS (POST /driver/location)")
+    parser.add_argument("--pings-por-request", type=int, default=20,
+                        help="pings em cada request, até LOCALIZACAO_RASTRO (--localizacao)")
+    parser.add_argument("--drivers-gps", type=int, default=2000,
+                        help="drivers enviando pings (--localizacao), se movendo (--transmissao) "
+                             "ou disponíveis (--despacho)")
+    parser.add_argument("--transmissao", action="store_true",
+                        help="só medir o fan-out de posições ao vivo (GET /drivers/live), sem HTTP")
+    parser.add_argument("--assinantes", type=int, default=2000, help="conexões ao vivo (--transmissao)")
+    parser.add_argument("--despacho", action="store_true",
+                        help="só medir o despacho em lote (matriz de distâncias + atribuição ótima)")
+    parser.add_argument("--entregas", type=int, default=1000,
+                        help="entregas abertas (--despacho) ou com zonas de coleta/destino (--cercas)")
+    parser.add_argument("--rotas", action="store_true",
+                        help="só medir o sequenciamento de paradas (POST /routes/optimize)")
+    parser.add_argument("--paradas", type=int, default=50, help="paradas por rota (--rotas)")
+    parser.add_argument("--eta", action="store_true",
+                        help="só medir o grafo de ruas e as buscas de tempo de viagem (GET /eta)")
+    parser.add_argument("--nos", type=int, default=250000, help="nós do grafo sintético (--eta)")
+    parser.add_argument("--cercas", action="store_true",
+                        help="só medir a avaliação de geofences a cada posição (enter/exit/dwell)")
+    parser.add_argument("--movimentos-por-s", type=int, default=5000,
+                        help="mudanças de posição publicadas por segundo (--transmissao)")
+    args = parser.parse_args()
+
+    if args.localizacao:
+        imprimir_resumo(asyncio.run(medir_localizacao(args)))
+        sys.exit(0)
+    if args.eta:
+        imprimir_resumo(medir_eta(args.nos, min(args.repeticoes, 2000)))
+        sys.exit(0)
+    if args.cercas:
+        imprimir_resumo(medir_cercas(args.entregas))
+        sys.exit(0)
+    if args.rotas:
+        imprimir_resumo(medir_rotas(args.paradas, min(args.repeticoes, 500)))
+        sys.exit(0)
+    if args.despacho:
+        imprimir_resumo(asyncio.run(medir_despacho(args)))
+        sys.exit(0)
+    if args.transmissao:
+        imprimir_resumo(asyncio.run(medir_transmissao(args)))
+        sys.exit(0)
+    if args.indice_espacial:
+        imprimir_indice_espacial(medir_indice_espacial(args.posicoes, min(args.repeticoes, 2000)))
+        sys.exit(0)
+    if args.serializacao:
+        imprimir_serializacao(asyncio.run(medir_serializacao(args.repeticoes, args.campo_kb)))
+        sys.exit(0)
+
+    resultado = asyncio.run(rodar(args))
+    imprimir(resultado)
+
+    saida = args.saida or os.path.join(DIRETORIO, f"resultado-{datetime.now():%Y%m%d-%H%M%S}.json")
+    _gravar(saida, resultado)
+    print(f"\nResultado gravado em {saida}")
+    if args.salvar_baseline:
+        _gravar(args.salvar_baseline, resultado)
+        print(f"Baseline gravado em {args.salvar_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressoes = comparar(resultado, json.load(f), args.tolerancia)
+        if regressoes:
+            print("\nRegressões em relação ao baseline:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            sys.exit(1)
+        print("\nSem regressões em relação ao baseline")
@@ -0,0 +1,19 @@
+"""
+TMAX Backend - Ambiente comum dos testes: banco e blobs num diretório temporário,
+definidos antes de qualquer import de app (as configurações são lidas no import)
+"""
+
+import os
+import sys
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="tmax-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/tmax.db"
+os.environ["BLOB_DIR"] = os.path.join(_TMP, "blobs")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# Toda rota exercitada nos testes precisa caber no orçamento de consultas
+os.environ["QUERY_ORCAMENTO"] = "erro"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Roteiro contra um servidor já rodando (python test_complete.py), não é um teste do pytest
+collect_ignore = ["test_complete.py"]
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Conversão de um extrato do OpenStreetMap no grafo de GET /eta
+
+Lê um arquivo OSM XML (.osm, .osm.gz ou .osm.bz2; um .pbf pode ser convertido antes
+com `osmium cat regiao.osm.pbf -o regiao.osm`), mantém as vias por onde uma moto
+pode andar, calcula o tempo de cada trecho (maxspeed ou a velocidade típica do tipo
+de via) e grava no diretório os arrays que o servidor abre com mmap. Apontar
+ETA_GRAFO_DIR para o diretório e reiniciar; gerar num diretório novo a cada
+atualização (os workers em execução continuam lendo os arquivos antigos).
+
+Uso: python converter_osm.py regiao.osm grafo/ [--landmarks 16]
+"""
+
+import argparse
+import bz2
+import gzip
+import re
+import time
+import xml.etree.ElementTree as ET
+from app.services import eta
+
+# km/h típicos de moto por tipo de via (highway=*); tipos fora da tabela são ignorados
+VELOCIDADES_KMH = {
+    "motorway": 90, "motorway_link": 60, "trunk": 80, "trunk_link": 50,
+    "primary": 60, "primary_link": 45, "secondary": 50, "secondary_link": 40,
+    "tertiary": 40, "tertiary_link": 35, "unclassified": 30, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25, "track": 10,
+}
+_PROIBIDO = {"no", "private"}
+
+
+def _abrir(caminho: str):
+    if caminho.endswith(".gz"):
+        return gzip.open(caminho, "rb")
+    if caminho.endswith(".bz2"):
+        return bz2.open(caminho, "rb")
+    return open(caminho, "rb")
+
+
+def _velocidade(tags: dict) -> float | None:
+    """km/h da via, ou None se moto não passa por ela"""
+    padrao = VELOCIDADES_KMH.get(tags.get("highway"))
+    if padrao is None or tags.get("area") == "yes":
+        return None
+    for chave in ("motorcycle", "motor_vehicle", "vehicle", "access"):
+        if chave in tags:
+            if tags[chave] in _PROIBIDO:
+                return None
+            break
+    encontrado = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", tags.get("maxspeed", ""))
+    if encontrado:
+        limite = float(encontrado.group(1)) * (1.609 if encontrado.group(2) else 1)
+        if limite > 0:
+            return limite
+    return padrao
+
+
+def _sentidos(tags: dict) -> tuple[bool, bool]:
+    """(ida, volta) ao longo da ordem dos nós da via"""
+    mao = tags.get("oneway", "")
+    if mao in ("yes", "true", "1"):
+        return True, False
+    if mao in ("-1", "reverse"):
+        return False, True
+    if mao == "no":
+        return True, True
+    implicito = tags.get("junction") in ("roundabout", "circular") or tags.get("highway") in ("motorway", "motorway_link")
+    return True, not implicito
+
+
+def ler_vias(caminho: str) -> tuple[list[int], list[int], list[float], set[int]]:
+    """Primeira passada: trechos dirigidos (ids OSM) das vias com moto e sua velocidade"""
+    de, para, kmh, usados = [], [], [], set()
+    with _abrir(caminho) as arquivo:
+        for _, elemento in ET.iterparse(arquivo, events=("end",)):
+            if elemento.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in elemento.iter("tag")}
+                velocidade = _velocidade(tags)
+                if velocidade is not None:
+                    nos = [int(nd.get("ref")) for nd in elemento.iter("nd")]
+                    ida, volta = _sentidos(tags)
+                    for a, b in zip(nos, nos[1:]):
+                        if ida:
+                            de.append(a), para.append(b), kmh.append(velocidade)
+                        if volta:
+                            de.append(b), para.append(a), kmh.append(velocidade)
+                    usados.update(nos)
+                elemento.clear()
+            elif elemento.tag in ("node", "relation"):
+                elemento.clear()
+    return de, para, kmh, usados
+
+
+def ler_nos(caminho: str, usados: set[int]) -> dict[int, tuple[float, float]]:
+    """Segunda passada: coordenadas só dos nós usados pelas vias"""
+    coordenadas = {}
+    with _abrir(caminho) as arquivo:
+        for _, elemento in ET.iterparse(arquivo, events=("end",)):
+            if elemento.tag == "node":
+                identificador = int(elemento.get("id"))
+                if identificador in usados:
+                    coordenadas[identificador] = (float(elemento.get("lat")), float(elemento.get("lon")))
+            if elemento.tag in ("node", "way", "relation"):
+                elemento.clear()
+    return coordenadas
+
+
+def converter(caminho: str, diretorio: str, landmarks: int = 16) -> dict:
+    inicio = time.perf_counter()
+    de, para, kmh, usados = ler_vias(caminho)
+    coordenadas = ler_nos(caminho, usados)
+    indices = {identificador: i for i, identificador in enumerate(coordenadas)}
+    lat = [coordenadas[identificador][0] for identificador in indices]
+    lon = [coordenadas[identificador][1] for identificador in indices]
+    # Trechos com nó fora do extrato (vias cortadas na borda) ficam de fora
+    trechos = [(indices[a], indices[b], v) for a, b, v in zip(de, para, kmh) if a in indices and b in indices]
+    origens = [a for a, _, _ in trechos]
+    destinos = [b for _, b, _ in trechos]
+    metros = eta._metros([lat[a] for a in origens], [lon[a] for a in origens],
+                         [lat[b] for b in destinos], [lon[b] for b in destinos])
+    segundos = metros / ([v for _, _, v in trechos] or [1.0]) * 3.6
+    meta = eta.construir(diretorio, lat, lon, origens, destinos, segundos, landmarks)
+    return {**meta, "nos_osm": len(lat), "trechos_osm": len(trechos), "segundos": round(time.perf_counter() - inicio, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerar o grafo de ETA a partir de um extrato OSM XML")
+    parser.add_argument("osm", help="arquivo .osm, .osm.gz ou .osm.bz2")
+    parser.add_argument("diretorio", help="onde gravar os arrays (ETA_GRAFO_DIR)")
+    parser.add_argument("--landmarks", type=int, default=16, help="landmarks da heurística do A*")
+    args = parser.parse_args()
+
+    resultado = converter(args.osm, args.diretorio, args.landmarks)
+    print(f"Grafo gravado em {args.diretorio}: {resultado['nos']} nós e {resultado['arestas']} arestas "
+          f"(de {resultado['nos_osm']} nós e {resultado['trechos_osm']} trechos do OSM) "
+          f"em {resultado['segundos']} s")
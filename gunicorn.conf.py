@@ -0,0 +1,56 @@
+"""
+TMAX Backend - Servidor com vários workers (gunicorn + uvicorn)
+
+O master importa e aquece a aplicação uma vez (preload) e só então faz o fork
+dos workers; a checagem de versão do esquema em main.py roda só no master.
+
+Uso: gunicorn -c gunicorn.conf.py main:app
+
+Sinais: HUP recarrega os workers um a um, TERM encerra aguardando os requests
+em andamento (GRACEFUL_TIMEOUT), TTIN/TTOU aumentam/diminuem os workers.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# WEB_CONCURRENCY é a variável padrão do Render/Heroku para o número de processos
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# Exportado para a aplicação (importada depois deste arquivo): os pools de processos
+# de cada worker dividem as CPUs entre os workers (app/services/processos.py)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# Reciclar cada worker depois de N requests (0 desativa), com jitter para não
+# reiniciar todos ao mesmo tempo
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "100"))
+
+accesslog = "-" if os.getenv("ACCESS_LOG", "0") == "1" else None
+errorlog = "-"
+
+
+def when_ready(server):
+    """App já importada no master (preload): aquecer antes do primeiro fork"""
+    import main
+    main.aquecer()
+    server.log.info("Aplicação aquecida; iniciando %s workers", server.cfg.workers)
+
+
+def post_fork(server, worker):
+    """Cada worker abre as próprias conexões (nunca herdar sockets do master)"""
+    from app.config.database import descartar_conexoes_herdadas
+    descartar_conexoes_herdadas()
+
+
+def worker_exit(server, worker):
+    """Tirar o worker da listagem de /health/workers mesmo se ele morrer sem shutdown"""
+    from app.services import workers as saude
+    try:
+        os.unlink(os.path.join(saude.WORKERS_DIR, f"{worker.pid}.json"))
+    except FileNotFoundError:
+        pass
@@ -1,19 +1,33 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.config.database import engine
-from app.models import Usuario, Driver, Motorcycle
-from app.routes import usuario_router, auth_router, driver_router
+from app.config.database import (
+    engine, read_engine, async_engine, async_read_engine,
+    dispose_async, estatisticas_pools, RegistroDuplicado
+)
+from app import migrations
+from app.respostas import RespostaJSON
+from app.routes import (
+    usuario_router, auth_router, driver_router, blob_router, drivers_router, deliveries_router, rotas_router,
+    eta_router,
+)
+from app.services import blobs, cercas, consultas, derivados, despacho, eta, hashing, imagens, localizacao, metricas, posicoes, rotas, transmissao, workers
+import asyncio
 import os
 
-# Criar tabelas no banco
-Usuario.metadata.create_all(bind=engine)
-Driver.metadata.create_all(bind=engine)
-Motorcycle.metadata.create_all(bind=engine)
+# Esquema do banco: em produção só conferir a versão (as migrações rodam no deploy,
+# `python migracoes.py upgrade`); em desenvolvimento aplicar o que estiver pendente
+if os.getenv("MIGRAR_AO_INICIAR", "0" if os.getenv("ENVIRONMENT") == "production" else "1") == "1":
+    migrations.migrar(engine)
+else:
+    migrations.verificar(engine)
 
 app = FastAPI(
     title="TMAX API",
     description="API de gerenciamento de usuários e drivers TMAX",
-    version="2.0.0"
+    version="2.0.0",
+    # Rotas serializadas pelo núcleo do pydantic, sem json.dumps da stdlib
+    default_response_class=RespostaJSON,
 )
 
 # Configurar CORS - permitir múltiplas origens
@@ -26,6 +40,8 @@ allowed_origins = [
     "https://tmax.onrender.com",  # Frontend em Render (quando estiver em deploy)
 ]
 
+# Corpo dos uploads limitado antes do parse do multipart (dentro do CORS: o 413 leva os cabeçalhos)
+app.add_middleware(imagens.LimiteUploads)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins if os.getenv("ENVIRONMENT") == "production" else ["*"],
@@ -35,11 +51,94 @@ app.add_middleware(
     expose_headers=["*"],
     max_age=3600,
 )
+app.add_middleware(workers.ContadorRequests)
+app.add_middleware(metricas.MetricasHTTP)
+app.add_middleware(consultas.InspecaoConsultas)
+consultas.instrumentar_engines(engine, read_engine, async_engine, async_read_engine)
 
 # Incluir rotas
 app.include_router(usuario_router)
 app.include_router(auth_router)
 app.include_router(driver_router)
+app.include_router(blob_router)
+app.include_router(drivers_router)
+app.include_router(deliveries_router)
+app.include_router(rotas_router)
+app.include_router(eta_router)
+
+# Violações de UNIQUE nas escritas viram os mesmos 400 das checagens antigas
+MENSAGENS_DUPLICADO = {
+    "email": "Email já registrado",
+    "cpf": "CPF já registrado",
+    "plate": "Placa já registrada",
+}
+
+@app.exception_handler(RegistroDuplicado)
+async def registro_duplicado(request: Request, exc: RegistroDuplicado):
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": MENSAGENS_DUPLICADO.get(exc.campo, f"{exc.campo} já registrado")},
+    )
+
+def aquecer():
+    """Preparar no master, antes do fork, o que todo worker usaria no primeiro request"""
+    from PIL import Image
+    app.openapi()
+    Image.init()
+    hashing.pwd_context.handler("bcrypt").get_backend()
+    eta.carregar()  # mmap e KD-tree dos nós do grafo de ruas, compartilhados com os workers
+
+def _dados_worker() -> dict:
+    return {
+        "pools": estatisticas_pools(),
+        "hashing": hashing.estatisticas(),
+        "localizacao": localizacao.estatisticas(),
+        "live": transmissao.estatisticas(),
+        "despacho": despacho.estatisticas(),
+        "rotas": rotas.estatisticas(),
+        "eta": eta.estatisticas(),
+        "cercas": cercas.estatisticas(),
+    }
+
+def _metricas_worker(dados: dict) -> dict:
+    # Só no event loop: é onde as métricas são escritas
+    return metricas.exportar(
+        workers.snapshot()["em_andamento"], dados["pools"], dados["hashing"],
+        dados["localizacao"], dados["live"], dados["despacho"], dados["cercas"],
+    )
+
+def _heartbeat() -> dict:
+    dados = _dados_worker()
+    return {**dados, "metricas": _metricas_worker(dados)}
+
+@app.on_event("startup")
+async def iniciar_worker():
+    """Registrar o heartbeat deste worker (ver /health/workers), carregar o índice de
+    posições (e o grafo de ruas, se o master não carregou) e iniciar o flusher dos
+    pings de GPS, o despacho em lote, as cercas e a limpeza de blobs órfãos"""
+    workers.iniciar(_heartbeat)
+    await posicoes.iniciar()
+    await asyncio.to_thread(eta.carregar)
+    await asyncio.to_thread(derivados.varrer_disco)
+    localizacao.iniciar()
+    despacho.iniciar()
+    cercas.iniciar()
+    blobs.iniciar()
+
+@app.on_event("shutdown")
+async def encerrar_pools():
+    """Encerrar pools de processos auxiliares e conexões async"""
+    workers.encerrar()
+    blobs.encerrar()
+    despacho.encerrar()
+    await cercas.encerrar()
+    posicoes.encerrar()
+    await localizacao.encerrar()
+    hashing.encerrar()
+    imagens.encerrar()
+    rotas.encerrar()
+    eta.encerrar()
+    await dispose_async()
 
 @app.get("/", tags=["root"])
 def read_root():
@@ -51,6 +150,8 @@ def read_root():
             "usuarios": "/usuarios/",
             "auth": "/auth/",
             "driver": "/driver/",
+            "drivers": "/drivers/",
+            "blobs": "/blobs/{hash}",
             "docs": "/docs"
         }
     }
@@ -59,3 +160,30 @@ def read_root():
 def health_check():
     """Verificar se a API está rodando"""
     return {"status": "ok", "version": "2.0.0"}
+
+@app.get("/health/worker", tags=["health"])
+def health_worker():
+    """Estado do worker que atendeu este request"""
+    return workers.snapshot(_dados_worker())
+
+@app.get("/health/workers", tags=["health"])
+def health_workers():
+    """Último heartbeat de todos os workers do servidor"""
+    return {"workers": workers.listar()}
+
+@app.get("/health/pools", tags=["health"])
+def health_pools():
+    """Ocupação e tempo de espera dos pools de conexão"""
+    return estatisticas_pools()
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics():
+    """Métricas de todos os workers no formato do Prometheus (este worker ao vivo,
+    os demais pelo último heartbeat)"""
+    estados = [_metricas_worker(_dados_worker())]
+    for worker in await asyncio.to_thread(workers.listar):
+        if worker["pid"] != os.getpid() and "metricas" in worker:
+            estados.append(worker["metricas"])
+    return PlainTextResponse(
+        metricas.renderizar(estados), media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Migrações de esquema versionadas
+
+As migrações ficam em app/migrations/vNNNN_<nome>.py e a versão aplicada
+na tabela schema_version. A aplicação só confere a versão ao iniciar.
+
+Uso:
+    python migracoes.py status
+    python migracoes.py upgrade [--alvo N]
+"""
+
+import argparse
+from app.config.database import engine
+from app import migrations
+
+
+def status():
+    atual = migrations.versao_atual(engine)
+    print(f"Versão do banco: {atual}")
+    for versao, modulo in migrations.migracoes():
+        marca = "x" if versao <= atual else " "
+        print(f"  [{marca}] {versao:04d} {modulo.DESCRICAO}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrações de esquema do banco")
+    parser.add_argument("comando", choices=["status", "upgrade"], nargs="?", default="status")
+    parser.add_argument("--alvo", type=int, default=None, help="versão final (padrão: a mais recente)")
+    args = parser.parse_args()
+
+    if args.comando == "upgrade":
+        aplicadas = migrations.migrar(engine, alvo=args.alvo)
+        print(f"Migrações aplicadas: {len(aplicadas)}")
+    status()
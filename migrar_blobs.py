@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Migração das imagens base64 para o blob store
+
+Move o conteúdo de drivers.profile_image, drivers.rg_images e
+motorcycles.image para BLOB_DIR e deixa nas linhas apenas o hash SHA-256.
+Pode ser executado mais de uma vez: linhas já migradas são ignoradas.
+
+Uso: python migrar_blobs.py [--lote 100]
+"""
+
+import argparse
+import base64
+import binascii
+import json
+from sqlalchemy.orm import undefer_group
+from app import migrations
+from app.config.database import SessionLocal, engine
+from app.models import Driver, Motorcycle
+from app.services import blobs
+
+
+def _para_blob(db, valor: str | None) -> str | None:
+    """Converter um valor base64 em hash; hashes e valores inválidos ficam como estão"""
+    if not valor or blobs.hash_valido(valor):
+        return valor
+    try:
+        conteudo = base64.b64decode(valor, validate=True)
+    except (binascii.Error, ValueError):
+        # Provavelmente uma URL externa; não há o que migrar
+        return valor
+    return blobs.salvar(db, conteudo)
+
+
+def _migrar_rg(db, valor: str | None) -> str | None:
+    if not valor:
+        return valor
+    try:
+        imagens = json.loads(valor)
+    except ValueError:
+        return valor
+    if not isinstance(imagens, list):
+        return valor
+    return json.dumps([_para_blob(db, imagem) for imagem in imagens])
+
+
+def migrar(tamanho_lote: int = 100) -> dict:
+    """Migrar todas as linhas, com commit a cada lote"""
+    migrations.migrar(engine)  # a tabela blobs vem das migrações de esquema
+    contagem = {"drivers": 0, "motorcycles": 0}
+
+    with SessionLocal() as db:
+        ultimo_id = 0
+        while True:
+            lote = (
+                db.query(Driver)
+                .options(undefer_group("imagens"))  # colunas adiadas: sem um SELECT por linha
+                .filter(Driver.id > ultimo_id)
+                .order_by(Driver.id)
+                .limit(tamanho_lote)
+                .all()
+            )
+            if not lote:
+                break
+            for driver in lote:
+                profile_image = _para_blob(db, driver.profile_image)
+                rg_images = _migrar_rg(db, driver.rg_images)
+                if profile_image != driver.profile_image or rg_images != driver.rg_images:
+                    driver.profile_image = profile_image
+                    driver.rg_images = rg_images
+                    contagem["drivers"] += 1
+            ultimo_id = lote[-1].id
+            db.commit()
+            db.expunge_all()
+
+        ultimo_id = 0
+        while True:
+            lote = (
+                db.query(Motorcycle)
+                .options(undefer_group("imagens"))  # colunas adiadas: sem um SELECT por linha
+                .filter(Motorcycle.id > ultimo_id)
+                .order_by(Motorcycle.id)
+                .limit(tamanho_lote)
+                .all()
+            )
+            if not lote:
+                break
+            for motorcycle in lote:
+                image = _para_blob(db, motorcycle.image)
+                if image != motorcycle.image:
+                    motorcycle.image = image
+                    contagem["motorcycles"] += 1
+            ultimo_id = lote[-1].id
+            db.commit()
+            db.expunge_all()
+
+    return contagem
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrar imagens base64 para o blob store")
+    parser.add_argument("--lote", type=int, default=100, help="linhas por transação")
+    args = parser.parse_args()
+
+    resultado = migrar(args.lote)
+    print(f"Drivers migrados: {resultado['drivers']}")
+    print(f"Motocicletas migradas: {resultado['motorcycles']}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Motor de cercas: entrada, saída com histerese e permanência
+
+Executar: python -m pytest -q test_cercas.py
+"""
+
+import math
+
+import pytest
+from app.services.cercas import METROS_POR_GRAU, MotorCercas, Zona
+
+LAT, LON = -23.5, -46.6
+
+
+def _ao_norte(metros: float) -> tuple[float, float]:
+    return LAT + metros / METROS_POR_GRAU, LON
+
+
+@pytest.fixture
+def eventos():
+    return []
+
+
+@pytest.fixture
+def motor(eventos):
+    motor = MotorCercas(histerese_m=30, permanencia_s=120, ao_evento=eventos.append)
+    motor.registrar(Zona(1, 10, 7, "pickup", "circle", LAT, LON, 100))
+    return motor
+
+
+def _tipos(eventos) -> list[str]:
+    return [evento["event"] for evento in eventos]
+
+
+def test_entrada_e_saida_com_histerese(motor, eventos):
+    motor.avaliar(7, *_ao_norte(150), 0)
+    assert eventos == []
+    motor.avaliar(7, *_ao_norte(90), 1)
+    assert _tipos(eventos) == ["enter"] and eventos[0]["delivery_id"] == 10
+    # Oscilando na borda, até CERCAS_HISTERESE_M fora: continua dentro
+    for instante, metros in enumerate((110, 95, 125, 101), start=2):
+        motor.avaliar(7, *_ao_norte(metros), instante)
+    assert _tipos(eventos) == ["enter"]
+    motor.avaliar(7, *_ao_norte(140), 10)
+    assert _tipos(eventos) == ["enter", "exit"]
+    motor.avaliar(7, *_ao_norte(50), 11)
+    assert _tipos(eventos) == ["enter", "exit", "enter"]
+
+
+def test_zona_da_entrega_so_vale_para_o_driver_atribuido(motor, eventos):
+    motor.avaliar(8, LAT, LON, 0)
+    assert eventos == []
+
+
+def test_permanencia_uma_vez_por_visita(motor, eventos):
+    motor.avaliar(7, LAT, LON, 1000)
+    posicao_de = {7: (LAT, LON)}.get
+    motor.verificar_permanencia(1000 + 119, posicao_de)
+    assert _tipos(eventos) == ["enter"]
+    motor.verificar_permanencia(1000 + 120, posicao_de)
+    motor.verificar_permanencia(1000 + 500, posicao_de)
+    assert _tipos(eventos) == ["enter", "dwell"]
+
+    motor.avaliar(7, *_ao_norte(500), 1600)
+    motor.avaliar(7, LAT, LON, 1700)
+    motor.verificar_permanencia(1700 + 120, posicao_de)
+    assert _tipos(eventos) == ["enter", "dwell", "exit", "enter", "dwell"]
+
+
+def test_zona_removida_nao_emite_saida_nem_permanencia(motor, eventos):
+    motor.avaliar(7, LAT, LON, 0)
+    motor.remover(1)
+    motor.verificar_permanencia(1000, lambda driver_id: None)
+    motor.avaliar(7, *_ao_norte(1000), 1000)
+    assert _tipos(eventos) == ["enter"]
+
+
+def test_restaurar_retoma_a_visita_sem_nova_entrada(motor, eventos):
+    motor.restaurar(1, 7, 0, False)
+    motor.avaliar(7, LAT, LON, 10)
+    motor.verificar_permanencia(120, lambda driver_id: None)
+    assert _tipos(eventos) == ["dwell"]
+
+
+def test_distancia_a_borda_do_poligono():
+    # Quadrado de 200 m de lado centrado em (LAT, LON)
+    meio = 100 / METROS_POR_GRAU
+    cos = math.cos(math.radians(LAT))
+    vertices = [(LAT - meio, LON - meio / cos), (LAT - meio, LON + meio / cos),
+                (LAT + meio, LON + meio / cos), (LAT + meio, LON - meio / cos)]
+    zona = Zona(2, None, None, "custom", "polygon", vertices=vertices)
+    assert zona.distancia_borda(LAT, LON) == pytest.approx(-100, abs=0.5)
+    assert zona.distancia_borda(*_ao_norte(60)) == pytest.approx(-40, abs=0.5)
+    assert zona.distancia_borda(*_ao_norte(130)) == pytest.approx(30, abs=0.5)
+    # Diagonal a partir do canto: distância ao vértice
+    assert zona.distancia_borda(LAT + 2 * meio, LON + 2 * meio / cos) == pytest.approx(100 * math.sqrt(2), rel=1e-3)
+
+
+def test_poligono_sem_driver_vale_para_todos():
+    eventos = []
+    motor = MotorCercas(histerese_m=30, permanencia_s=120, ao_evento=eventos.append)
+    meio = 100 / METROS_POR_GRAU
+    motor.registrar(Zona(3, None, None, "custom", "polygon",
+                         vertices=[(LAT - meio, LON - meio), (LAT - meio, LON + meio), (LAT + meio, LON)]))
+    motor.avaliar(1, LAT - meio / 2, LON, 0)
+    motor.avaliar(2, LAT - meio / 2, LON, 0)
+    motor.avaliar(3, *_ao_norte(300), 0)
+    assert sorted(evento["driver_id"] for evento in eventos) == [1, 2]
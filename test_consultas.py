@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Detector de full scans do inspetor de consultas
+
+Executar: python -m pytest -q test_consultas.py
+"""
+
+import sqlite3
+
+import pytest
+from app.services.consultas import _full_scans
+
+
+@pytest.fixture
+def cursor():
+    conexao = sqlite3.connect(":memory:")
+    conexao.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, a INTEGER, b INTEGER)")
+    conexao.execute("CREATE INDEX ix_t_a ON t (a)")
+    yield conexao.cursor()
+    conexao.close()
+
+
+def test_scan_pela_chave_com_limit_nao_e_avisado(cursor):
+    assert _full_scans(cursor, "SELECT id, b FROM t ORDER BY id LIMIT ?", (50,)) is None
+
+
+def test_consulta_por_indice_nao_e_avisada(cursor):
+    assert _full_scans(cursor, "SELECT id FROM t WHERE a = ? LIMIT ?", (1, 1)) is None
+
+
+def test_scan_filtrado_com_limit_continua_avisado(cursor):
+    plano = _full_scans(cursor, "SELECT id FROM t WHERE b = ? LIMIT ? OFFSET ?", (1, 1, 0))
+    assert plano is not None and plano[0].startswith("SCAN t")
+
+
+def test_scan_com_ordenacao_temporaria_e_avisado(cursor):
+    assert _full_scans(cursor, "SELECT id FROM t ORDER BY b LIMIT ?", (10,)) is not None
+
+
+def test_scan_sem_limit_e_avisado(cursor):
+    assert _full_scans(cursor, "SELECT b FROM t", ()) is not None
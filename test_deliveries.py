@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Entregas: despacho e ciclo de vida
+
+Executar: python -m pytest -q test_deliveries.py
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from app import auth
+from app.services import cercas
+from main import app
+
+# Longe das posições usadas pelos outros testes: só os drivers daqui ficam no raio
+LAT, LON = 10.0, 10.0
+
+
+def _registrar(client, email: str, cpf: str) -> tuple[int, dict]:
+    r = client.post("/auth/register", json={
+        "name": "Driver", "email": email, "cpf": cpf, "phone": "(11) 90000-0000",
+        "password": "senha123", "confirm_password": "senha123",
+    })
+    assert r.status_code == 200, r.text
+    driver_id = r.json()["id"]
+    r = client.post("/auth/login", json={"email": email, "password": "senha123"})
+    assert r.status_code == 200, r.text
+    return driver_id, {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", frozenset({
+        "operador-entregas@test.com", "operador-cancela@test.com", "operador-cercas@test.com",
+    }))
+    with TestClient(app) as client:
+        yield client
+
+
+def _abrir_e_despachar(client, operador: dict, lat: float = LAT, lon: float = LON) -> dict:
+    r = client.post("/deliveries", json={
+        "pickup_lat": lat, "pickup_lon": lon, "dropoff_lat": lat + 0.01, "dropoff_lon": lon,
+    }, headers=operador)
+    assert r.status_code == 201, r.text
+    assert client.post("/deliveries/dispatch", headers=operador).status_code == 200
+    # O despacho automático pode ter chegado antes: conferir pela entrega
+    return client.get(f"/deliveries/{r.json()['id']}", headers=operador).json()
+
+
+def test_despacho_atribui_e_driver_fica_livre_ao_entregar(client):
+    _, operador = _registrar(client, "operador-entregas@test.com", "900.000.001-01")
+    driver_id, driver = _registrar(client, "entregador@test.com", "900.000.001-02")
+    r = client.put("/driver/position", json={"lat": LAT, "lon": LON + 0.001}, headers=driver)
+    assert r.status_code == 200, r.text
+
+    entrega = _abrir_e_despachar(client, operador)
+    assert entrega["status"] == "assigned" and entrega["driver_id"] == driver_id
+    # Ocupado: a segunda entrega fica aberta
+    segunda = _abrir_e_despachar(client, operador)
+    assert segunda["status"] == "open"
+
+    r = client.post(f"/deliveries/{entrega['id']}/status", json={"status": "delivered"}, headers=driver)
+    assert r.status_code == 409, r.text
+    for novo in ("picked_up", "delivered"):
+        r = client.post(f"/deliveries/{entrega['id']}/status", json={"status": novo}, headers=driver)
+        assert r.status_code == 200 and r.json()["status"] == novo, r.text
+    assert r.json()["updated_at"] > entrega["created_at"]
+
+    # Entregue: o driver volta ao despacho e pega a entrega que esperava
+    assert client.post("/deliveries/dispatch", headers=operador).status_code == 200
+    segunda = client.get(f"/deliveries/{segunda['id']}", headers=operador).json()
+    assert segunda["status"] == "assigned" and segunda["driver_id"] == driver_id
+
+
+def test_entregas_e_despacho_restritos(client):
+    _, operador = _registrar(client, "operador-cancela@test.com", "900.000.001-03")
+    _, outro = _registrar(client, "curioso@test.com", "900.000.001-04")
+    dados = {"pickup_lat": -LAT, "pickup_lon": -LON, "dropoff_lat": -LAT, "dropoff_lon": -LON}
+    assert client.post("/deliveries", json=dados, headers=outro).status_code == 403
+    assert client.post("/deliveries/dispatch", headers=outro).status_code == 403
+
+    entrega = client.post("/deliveries", json=dados, headers=operador).json()
+    assert client.get(f"/deliveries/{entrega['id']}", headers=outro).status_code == 403
+    assert client.get(f"/deliveries/{entrega['id']}", headers=operador).status_code == 200
+    assert client.get("/deliveries/999999", headers=operador).status_code == 404
+    caminho = f"/deliveries/{entrega['id']}/status"
+    assert client.post(caminho, json={"status": "picked_up"}, headers=outro).status_code == 403
+    assert client.post(caminho, json={"status": "cancelled"}, headers=outro).status_code == 403
+    assert client.post(caminho, json={"status": "open"}, headers=operador).status_code == 422
+    r = client.post(caminho, json={"status": "cancelled"}, headers=operador)
+    assert r.status_code == 200 and r.json()["status"] == "cancelled", r.text
+    assert client.post(caminho, json={"status": "cancelled"}, headers=operador).status_code == 409
+    assert client.post("/deliveries/999999/status", json={"status": "cancelled"}, headers=operador).status_code == 404
+
+
+def test_cercas_da_entrega_restritas_e_saida_da_coleta_marca_coletada(client):
+    # Longe das entregas dos outros testes (fora do raio do despacho)
+    lat, lon = LAT + 1, LON
+    _, operador = _registrar(client, "operador-cercas@test.com", "900.000.001-05")
+    driver_id, driver = _registrar(client, "entregador-cercas@test.com", "900.000.001-06")
+    _, outro = _registrar(client, "curioso-cercas@test.com", "900.000.001-07")
+    assert client.put("/driver/position", json={"lat": lat, "lon": lon}, headers=driver).status_code == 200
+    entrega = _abrir_e_despachar(client, operador, lat, lon)
+    assert entrega["driver_id"] == driver_id
+
+    for caminho in (f"/deliveries/{entrega['id']}/geofences", f"/deliveries/{entrega['id']}/geofence-events"):
+        assert client.get(caminho, headers=outro).status_code == 403
+        assert client.get(caminho, headers=driver).status_code == 200
+        assert client.get(caminho, headers=operador).status_code == 200
+    assert client.get("/deliveries/999999/geofences", headers=operador).status_code == 404
+    zona = {"kind": "custom", "lat": lat, "lon": lon, "radius_m": 50}
+    assert client.post(f"/deliveries/{entrega['id']}/geofences", json=zona, headers=driver).status_code == 403
+
+    async def sair(kind: str):
+        cercas.coletar_ao_sair({"event": "exit", "kind": kind, "delivery_id": entrega["id"], "driver_id": driver_id})
+        await asyncio.gather(*cercas._tarefas_ganchos)
+
+    client.portal.call(sair, "dropoff")
+    assert client.get(f"/deliveries/{entrega['id']}", headers=driver).json()["status"] == "assigned"
+    client.portal.call(sair, "pickup")
+    assert client.get(f"/deliveries/{entrega['id']}", headers=driver).json()["status"] == "picked_up"
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Cache de derivados (miniaturas)
+
+Executar: python -m pytest -q test_derivados.py
+"""
+
+import asyncio
+import os
+import time
+
+from app.services import derivados, imagens
+
+
+def test_cancelar_o_primeiro_pedido_nao_cancela_os_coalescidos(monkeypatch, tmp_path):
+    monkeypatch.setattr(derivados, "DERIVADOS_DIR", str(tmp_path))
+    renderizacoes = []
+
+    async def gerar_derivado(caminho, largura, formato):
+        renderizacoes.append(largura)
+        await asyncio.sleep(0.05)
+        return b"miniatura"
+
+    monkeypatch.setattr(imagens, "gerar_derivado", gerar_derivado)
+
+    async def cenario():
+        primeiro = asyncio.ensure_future(derivados.obter("a" * 64, 128, "jpeg"))
+        await asyncio.sleep(0)
+        segundo = asyncio.ensure_future(derivados.obter("a" * 64, 128, "jpeg"))
+        await asyncio.sleep(0.01)
+        primeiro.cancel()
+        return await segundo
+
+    assert asyncio.run(cenario()) == b"miniatura"
+    assert renderizacoes == [128]
+
+
+def test_varredura_limita_o_diretorio_compartilhado(monkeypatch, tmp_path):
+    monkeypatch.setattr(derivados, "DERIVADOS_DIR", str(tmp_path))
+    monkeypatch.setattr(derivados, "DERIVADOS_DISCO_BYTES", 4000)
+    agora = time.time()
+    # Arquivos gravados por "outros workers": só o diretório sabe deles
+    for n in range(6):
+        chave = f"{n:02d}" + "b" * 62 + "-128.jpeg"
+        caminho = derivados._caminho_disco(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as f:
+            f.write(b"0" * 1000)
+        os.utime(caminho, (agora - 100 + n, agora - 100 + n))
+
+    derivados.varrer_disco()
+    restantes = sorted(nome for _, _, nomes in os.walk(tmp_path) for nome in nomes if not nome.startswith("."))
+    assert len(restantes) == 3 and restantes[0].startswith("03")
+    assert derivados.estatisticas()["bytes_disco"] == 3000
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Cadastro e atualização de drivers e motocicletas
+
+Executar: python -m pytest -q test_drivers.py
+"""
+
+import asyncio
+import io
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import func, select, update
+from app import auth
+from app.config.database import engine
+from app.controllers import PosicaoController
+from app.migrations import v0008_drivers_created_at
+from app.models.blob import Blob
+from app.models.driver import Driver, DriverLocation, DriverPosition
+from app.routes import drivers_routes
+from app.services import blobs, imagens, localizacao, posicoes
+from main import app
+
+
+def _jpeg(cor="red") -> bytes:
+    saida = io.BytesIO()
+    Image.new("RGB", (120, 80), cor).save(saida, "JPEG")
+    return saida.getvalue()
+
+
+def _registrar(client, email: str, cpf: str) -> tuple[int, dict]:
+    r = client.post("/auth/register", json={
+        "name": "Driver", "email": email, "cpf": cpf, "phone": "(11) 90000-0000",
+        "password": "senha123", "confirm_password": "senha123",
+    })
+    assert r.status_code == 200, r.text
+    driver_id = r.json()["id"]
+    r = client.post("/auth/login", json={"email": email, "password": "senha123"})
+    assert r.status_code == 200, r.text
+    return driver_id, {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_put_nao_altera_referencias_de_blob(client):
+    driver_id, headers = _registrar(client, "blob-put@test.com", "900.000.000-01")
+    r = client.post(f"/driver/upload/profile?driver_id={driver_id}",
+                    files={"file": ("p.jpg", _jpeg(), "image/jpeg")}, headers=headers)
+    assert r.status_code == 200, r.text
+    foto = r.json()["profile_image"]
+
+    r = client.put(f"/driver/{driver_id}", json={"profile_image": "0" * 64, "rg_images": "[]", "phone": "1"},
+                   headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["profile_image"] == foto and r.json()["phone"] == "1"
+
+    r = client.post("/driver/vehicle", files={"file": ("m.jpg", _jpeg("black"), "image/jpeg")}, headers=headers)
+    moto = r.json()
+    r = client.put(f"/driver/vehicle/{moto['motorcycle_id']}", json={"image": "0" * 64}, headers=headers)
+    assert r.status_code == 200 and r.json()["image"] == moto["image"], r.text
+
+
+def test_referencias_do_mesmo_conteudo_sao_somadas(client):
+    def refs(hash_blob):
+        with engine.connect() as conexao:
+            return conexao.execute(select(Blob.refs).where(Blob.hash == hash_blob)).scalar()
+
+    hashes = []
+    for n in (2, 3):
+        driver_id, headers = _registrar(client, f"blob-ref{n}@test.com", f"900.000.000-0{n}")
+        r = client.post(f"/driver/upload/profile?driver_id={driver_id}",
+                        files={"file": ("p.jpg", _jpeg("purple"), "image/jpeg")}, headers=headers)
+        assert r.status_code == 200, r.text
+        hashes.append(r.json()["profile_image"])
+    assert hashes[0] == hashes[1] and refs(hashes[0]) == 2
+
+    r = client.post(f"/driver/upload/profile?driver_id={driver_id}",
+                    files={"file": ("p.jpg", _jpeg("orange"), "image/jpeg")}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert refs(hashes[0]) == 1 and refs(r.json()["profile_image"]) == 1
+
+
+def test_limpeza_de_orfaos_respeita_a_carencia(client):
+    driver_id, headers = _registrar(client, "blob-orfao@test.com", "900.000.000-04")
+    enviados = []
+    for cor in ("navy", "olive"):
+        r = client.post(f"/driver/upload/profile?driver_id={driver_id}",
+                        files={"file": ("p.jpg", _jpeg(cor), "image/jpeg")}, headers=headers)
+        assert r.status_code == 200, r.text
+        enviados.append(r.json()["profile_image"])
+    orfao, atual = enviados
+    # O upload não apaga nada; dentro da carência a limpeza também não
+    assert os.path.exists(blobs.caminho(orfao))
+    assert client.portal.call(blobs.remover_orfaos_async, 3600) == 0
+    assert os.path.exists(blobs.caminho(orfao))
+
+    assert client.portal.call(blobs.remover_orfaos_async, 0) >= 1
+    assert not os.path.exists(blobs.caminho(orfao)) and os.path.exists(blobs.caminho(atual))
+    assert client.get(f"/blobs/{orfao}").status_code == 404
+
+
+def test_limpeza_devolve_arquivo_renovado_por_upload():
+    hash_blob = "f" * 64
+    blobs.gravar_atomico(blobs.caminho(hash_blob), b"conteudo")
+    # mtime renovado (upload do mesmo conteúdo) depois do corte da limpeza
+    assert blobs._apagar_arquivos([hash_blob], time.time() - 60) == 0
+    assert os.path.exists(blobs.caminho(hash_blob))
+    assert blobs._apagar_arquivos([hash_blob], time.time() + 60) == 1
+    assert not os.path.exists(blobs.caminho(hash_blob))
+
+
+def test_upload_acima_do_limite_e_rejeitado_antes_do_multipart(client, monkeypatch):
+    monkeypatch.setitem(imagens.LIMITES, "perfil", (1024, 1024))
+    driver_id, headers = _registrar(client, "upload-grande@test.com", "900.000.000-05")
+    r = client.post(f"/driver/upload/profile?driver_id={driver_id}",
+                    files={"file": ("p.jpg", b"\xff\xd8\xff" + b"0" * 200_000, "image/jpeg")}, headers=headers)
+    assert r.status_code == 413, r.text
+
+
+def test_corpo_sem_content_length_para_de_ser_lido_no_limite(monkeypatch):
+    monkeypatch.setitem(imagens.LIMITES, "perfil", (1024, 1024))
+    lidos, enviados = [], []
+
+    async def aplicacao(scope, receive, send):
+        while (await receive())["more_body"]:
+            lidos.append(1)
+
+    async def receive():
+        return {"type": "http.request", "body": b"0" * 16384, "more_body": True}
+
+    async def send(mensagem):
+        enviados.append(mensagem)
+
+    scope = {"type": "http", "method": "POST", "path": "/driver/upload/profile", "headers": []}
+    with pytest.raises(imagens.HTTPException) as erro:
+        asyncio.run(imagens.LimiteUploads(aplicacao)(scope, receive, send))
+    assert erro.value.status_code == 413 and len(lidos) <= 5
+
+
+def test_token_de_driver_desativado_deixa_de_valer(client):
+    driver_id, headers = _registrar(client, "desativado@test.com", "900.000.000-06")
+    assert client.get("/driver/me", headers=headers).status_code == 200
+    with engine.begin() as conexao:
+        conexao.execute(update(Driver).where(Driver.id == driver_id).values(is_active=False))
+    # Ainda vale até a identidade expirar do cache
+    assert client.get("/driver/me", headers=headers).status_code == 200
+    auth._cache_identidades._itens.clear()
+    assert client.get("/driver/me", headers=headers).status_code == 401
+    assert client.get("/drivers/nearby?lat=0&lon=0", headers=headers).status_code == 401
+
+
+def test_importacao_em_lote_restrita_e_limitada(client, monkeypatch):
+    _, headers = _registrar(client, "operador@test.com", "900.000.000-07")
+    linha = {"name": "Lote", "email": "lote1@test.com", "cpf": "900.000.000-08", "phone": "1",
+             "password": "senha123", "confirm_password": "senha123"}
+    ndjson = {**headers, "Content-Type": "application/x-ndjson"}
+    assert client.post("/drivers/bulk", json=[linha], headers=headers).status_code == 403
+
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", frozenset({"operador@test.com"}))
+    monkeypatch.setattr(drivers_routes, "BULK_MAX_BYTES", 1024)
+    r = client.post("/drivers/bulk", json=[linha] * 20, headers=headers)
+    assert r.status_code == 413, r.text
+    r = client.post("/drivers/bulk", content=json.dumps(linha) + "\n" + "x" * 20_000, headers=ndjson)
+    assert r.status_code == 413, r.text
+
+    r = client.post("/drivers/bulk", json=[linha], headers=headers)
+    assert r.status_code == 200 and r.json()["criados"] == 1, r.text
+
+
+def test_email_cpf_e_placa_duplicados_sao_400(client):
+    motos = []
+    for n in (9, 10):
+        driver_id, headers = _registrar(client, f"dup{n}@test.com", f"900.000.000-{n:02d}")
+        r = client.post("/driver/vehicle", files={"file": ("m.jpg", _jpeg("gray"), "image/jpeg")}, headers=headers)
+        assert r.status_code == 200, r.text
+        motos.append((r.json()["motorcycle_id"], headers))
+
+    cadastro = {"name": "Dup", "phone": "1", "password": "senha123", "confirm_password": "senha123"}
+    r = client.post("/auth/register", json={**cadastro, "email": "dup9@test.com", "cpf": "900.000.000-99"})
+    assert r.status_code == 400 and r.json()["detail"] == "Email já registrado", r.text
+    r = client.post("/auth/register", json={**cadastro, "email": "dup99@test.com", "cpf": "900.000.000-09"})
+    assert r.status_code == 400 and r.json()["detail"] == "CPF já registrado", r.text
+
+    (primeira, headers1), (segunda, headers2) = motos
+    assert client.put(f"/driver/vehicle/{primeira}", json={"plate": "DUP1A23"}, headers=headers1).status_code == 200
+    r = client.put(f"/driver/vehicle/{segunda}", json={"plate": "DUP1A23"}, headers=headers2)
+    assert r.status_code == 400 and r.json()["detail"] == "Placa já registrada", r.text
+
+    r = client.post("/usuarios/", json={"nome": "U", "email": "dup-usuario@test.com", "senha": "s"})
+    assert r.status_code == 200, r.text
+    r = client.post("/usuarios/", json={"nome": "U", "email": "dup-usuario@test.com", "senha": "s"})
+    assert r.status_code == 400 and r.json()["detail"] == "Email já registrado", r.text
+
+
+def test_etag_304_e_if_match_412(client):
+    driver_id, headers = _registrar(client, "etag@test.com", "900.000.000-11")
+    r = client.get("/driver/me", headers=headers)
+    etag = r.headers["ETag"]
+    assert r.status_code == 200 and r.headers["Last-Modified"]
+
+    r = client.get("/driver/me", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["ETag"] == etag and not r.content
+    r = client.get("/driver/me?fields=id,phone", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+
+    r = client.put(f"/driver/{driver_id}", json={"phone": "2"}, headers={**headers, "If-Match": etag})
+    assert r.status_code == 200, r.text
+    # A ETag antiga não vale mais: nem 304, nem para outra escrita
+    assert client.get("/driver/me", headers={**headers, "If-None-Match": etag}).status_code == 200
+    r = client.put(f"/driver/{driver_id}", json={"phone": "3"}, headers={**headers, "If-Match": etag})
+    assert r.status_code == 412, r.text
+    assert client.get("/driver/me", headers=headers).json()["phone"] == "2"
+
+
+def test_recorded_at_fora_do_intervalo_e_recusado_e_futuro_proximo_e_limitado(client):
+    driver_id, headers = _registrar(client, "relogio@test.com", "900.000.000-12")
+    agora = datetime.utcnow()
+
+    def ping(deslocamento: timedelta) -> dict:
+        return {"lat": -23.5, "lon": -46.6, "recorded_at": (agora + deslocamento).isoformat()}
+
+    for deslocamento in (timedelta(hours=1), timedelta(days=-2)):
+        r = client.post("/driver/location", json=[ping(timedelta()), ping(deslocamento)], headers=headers)
+        assert r.status_code == 422, r.text
+    assert localizacao.rastro(driver_id) == []
+
+    r = client.post("/driver/location", json=ping(timedelta(seconds=60)), headers=headers)
+    assert r.status_code in (200, 202), r.text
+    [(recorded_at, *_)] = localizacao.rastro(driver_id)
+    assert agora <= recorded_at <= datetime.utcnow()
+
+
+def test_live_recusa_token_desativado_e_assinaturas_de_outros(client):
+    driver_id, headers = _registrar(client, "live@test.com", "900.000.000-13")
+    token = headers["Authorization"].split()[1]
+    assert client.get(f"/drivers/live?driver_id={driver_id + 1}", headers=headers).status_code == 403
+    assert client.get("/drivers/live?bbox=-23.6,-46.7,-23.5,-46.6", headers=headers).status_code == 403
+    assert client.get(f"/drivers/live?driver_id={driver_id},{driver_id + 1}&token={token}").status_code == 403
+    # O TestClient só devolve a resposta quando o stream termina: o caminho feliz é
+    # conferido pela dependência
+    auth._cache_identidades._itens.clear()
+    principal = client.portal.call(auth.current_principal_stream_async, {"sub": "live@test.com", "id": driver_id})
+    assert principal.id == driver_id
+
+    with engine.begin() as conexao:
+        conexao.execute(update(Driver).where(Driver.id == driver_id).values(is_active=False))
+    auth._cache_identidades._itens.clear()
+    assert client.get(f"/drivers/live?driver_id={driver_id}", headers=headers).status_code == 401
+    assert client.get(f"/drivers/live?driver_id={driver_id}&token={token}").status_code == 401
+
+
+def test_pings_de_um_flush_que_falhou_sao_gravados_no_seguinte(client, monkeypatch):
+    driver_id, headers = _registrar(client, "reenvio@test.com", "900.000.000-14")
+    original = PosicaoController.gravar_pings_async
+    chamadas = []
+
+    async def falha_uma_vez(db, historico, posicoes):
+        chamadas.append(len(historico))
+        if len(chamadas) == 1:
+            raise RuntimeError("database is locked")
+        await original(db, historico, posicoes)
+
+    monkeypatch.setattr(PosicaoController, "gravar_pings_async", staticmethod(falha_uma_vez))
+    pings = [{"lat": -23.5 + n / 1000, "lon": -46.6} for n in range(3)]
+    r = client.post("/driver/location", json=pings, headers=headers)
+    assert r.status_code in (200, 202), r.text
+    # O flusher do worker também pode rodar: duas rodadas bastam, quem quer que as faça
+    client.portal.call(localizacao.flush)
+    client.portal.call(localizacao.flush)
+
+    with engine.connect() as conexao:
+        gravados = conexao.execute(
+            select(func.count()).select_from(DriverLocation).where(DriverLocation.driver_id == driver_id)
+        ).scalar()
+        lat = conexao.execute(select(DriverPosition.lat).where(DriverPosition.driver_id == driver_id)).scalar()
+    assert len(chamadas) >= 2 and gravados == 3 and lat == pytest.approx(-23.498)
+
+
+def test_is_active_nulo_continua_ativo_no_indice_de_posicoes(client):
+    driver_id, headers = _registrar(client, "legado@test.com", "900.000.000-15")
+    r = client.put("/driver/position", json={"lat": -30.0, "lon": -50.0}, headers=headers)
+    assert r.status_code == 200, r.text
+    antes = datetime.utcnow() - timedelta(seconds=5)
+    with engine.begin() as conexao:
+        conexao.execute(update(Driver).where(Driver.id == driver_id).values(is_active=None))
+    # Sincronização incremental de quem mudou (caminho do status e da posição)
+    client.portal.call(posicoes._sincronizar, antes)
+    assert posicoes.indice.obter(driver_id).ativo is True
+    r = client.get("/drivers/nearby?lat=-30.0&lon=-50.0&radius=100", headers=headers)
+    assert r.status_code == 200 and driver_id in [d["driver_id"] for d in r.json()["items"]], r.text
+    # Na API também aparece como ativo (o schema recusava o nulo)
+    r = client.get("/driver/me?fields=id,is_active", headers=headers)
+    assert r.status_code == 200 and r.json()["is_active"] is True, r.text
+    assert client.get("/driver/me", headers=headers).json()["is_active"] is True
+
+
+def test_cursor_passa_por_driver_antigo_sem_created_at(client):
+    ids = [_registrar(client, f"sem-data{n}@test.com", f"900.000.000-{n}")[0] for n in (16, 17)]
+    _, headers = _registrar(client, "sem-data18@test.com", "900.000.000-18")
+    with engine.begin() as conexao:
+        conexao.execute(update(Driver).where(Driver.id == ids[0]).values(created_at=None))
+        v0008_drivers_created_at.aplicar(conexao)
+
+    vistos, cursor = [], None
+    while True:
+        r = client.get("/driver/", params={"limit": 2, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert r.status_code == 200, r.text
+        vistos += [driver["id"] for driver in r.json()["items"]]
+        cursor = r.json()["next_cursor"]
+        if cursor is None:
+            break
+    assert len(vistos) == len(set(vistos)) and set(ids) <= set(vistos)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Grafo do ETA: A* com landmarks x Dijkstra
+
+Executar: python -m pytest -q test_eta.py
+"""
+
+import math
+import random
+
+import pytest
+from app.services import eta
+
+
+@pytest.fixture
+def grafo(tmp_path):
+    # Grade 8x8 de mão dupla com tempos diferentes em cada sentido e um nó solto,
+    # que construir() descarta (fora da maior componente fortemente conexa)
+    sorteio = random.Random(11)
+    lado = 8
+    lat = [-23.5 + 0.001 * (i // lado) for i in range(lado * lado)] + [-23.0]
+    lon = [-46.6 + 0.001 * (i % lado) for i in range(lado * lado)] + [-46.0]
+    origens, destinos, segundos = [], [], []
+    for no in range(lado * lado):
+        vizinhos = ([no + 1] if no % lado < lado - 1 else []) + ([no + lado] if no + lado < lado * lado else [])
+        for vizinho in vizinhos:
+            origens += [no, vizinho]
+            destinos += [vizinho, no]
+            segundos += [sorteio.uniform(5, 60), sorteio.uniform(5, 60)]
+    origens.append(lado * lado)
+    destinos.append(0)
+    segundos.append(10.0)
+    # Aresta paralela mais lenta: fica a mais rápida
+    origens.append(0)
+    destinos.append(1)
+    segundos.append(1000.0)
+    meta = eta.construir(str(tmp_path), lat, lon, origens, destinos, segundos, landmarks=4)
+    assert meta["nos"] == lado * lado
+    return eta.Grafo(str(tmp_path))
+
+
+def test_a_estrela_concorda_com_dijkstra(grafo):
+    todos = list(range(len(grafo)))
+    for origem in (0, 27, len(grafo) - 1):
+        dijkstra = grafo.um_para_muitos(origem, todos, eta.ETA_MAX_S)
+        for destino in todos:
+            assert grafo.a_estrela(origem, destino, eta.ETA_MAX_S) == pytest.approx(dijkstra[destino], rel=1e-6)
+
+
+def test_limite_vale_nas_duas_buscas(grafo):
+    destino = len(grafo) - 1
+    [tempo] = grafo.um_para_muitos(0, [destino], eta.ETA_MAX_S)
+    assert not math.isinf(tempo)
+    assert grafo.um_para_muitos(0, [destino], tempo / 2) == [None]
+    assert grafo.a_estrela(0, destino, tempo / 2) is None
+    assert grafo.a_estrela(0, destino, tempo * 2) == pytest.approx(tempo, rel=1e-6)
+
+
+def test_calcular_usa_a_estrela_ou_dijkstra_pelo_numero_de_destinos(grafo, tmp_path):
+    poucos = list(range(eta._A_ESTRELA_MAX))
+    muitos = list(range(eta._A_ESTRELA_MAX + 1, 4 * eta._A_ESTRELA_MAX))
+    esperado = grafo.um_para_muitos(5, poucos + muitos, eta.ETA_MAX_S)
+    obtido = eta.calcular(str(tmp_path), 5, poucos, eta.ETA_MAX_S) + eta.calcular(str(tmp_path), 5, muitos, eta.ETA_MAX_S)
+    assert obtido == pytest.approx(esperado, rel=1e-6)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Fila do pool de hashing
+
+Executar: python -m pytest -q test_hashing.py
+"""
+
+import asyncio
+import threading
+
+from app.services import hashing
+
+
+def test_cancelar_espera_na_fila_nao_perde_vaga(monkeypatch):
+    semaforo = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(hashing, "_semaforo", semaforo)
+    monkeypatch.setattr(hashing, "HASH_QUEUE_TIMEOUT", 5)
+
+    async def cenario():
+        assert semaforo.acquire(blocking=False)  # fila cheia
+        tarefa = asyncio.create_task(hashing.gerar_hash("senha"))
+        await asyncio.sleep(0.05)
+        tarefa.cancel()
+        semaforo.release()  # a vaga abre depois do cancelamento
+        await asyncio.sleep(0.2)
+        assert tarefa.cancelled()
+
+    asyncio.run(cenario())
+    # A thread que ficou esperando pegou a vaga e ela voltou para a fila
+    assert semaforo.acquire(timeout=1)
+    semaforo.release()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Métricas por worker e streams SSE
+
+Executar: python -m pytest -q test_metricas.py
+"""
+
+import asyncio
+
+from app.services import metricas, workers
+
+
+def _estado(pid: int, requests: int) -> dict:
+    return {"pid": pid, "valores": {"tmax_http_requests_total": [[["GET", "/x", "200"], requests]]}}
+
+
+def test_series_separadas_por_pid():
+    texto = metricas.renderizar([_estado(10, 3), _estado(11, 5)])
+    assert 'tmax_http_requests_total{pid="10",method="GET",route="/x",status="200"} 3' in texto
+    assert 'tmax_http_requests_total{pid="11",method="GET",route="/x",status="200"} 5' in texto
+
+
+def test_stream_sse_fica_fora_da_latencia_e_dos_em_andamento(monkeypatch):
+    monkeypatch.setattr(metricas, "_duracao", {})
+    monkeypatch.setattr(metricas, "_requests", {})
+    durante = []
+
+    async def aplicacao(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8")]})
+        durante.append(workers._estado["em_andamento"])
+        await send({"type": "http.response.body", "body": b"data: 1\n\n", "more_body": False})
+
+    async def send(mensagem):
+        pass
+
+    antes = workers._estado["em_andamento"]
+    pilha = workers.ContadorRequests(metricas.MetricasHTTP(aplicacao))
+    asyncio.run(pilha({"type": "http", "method": "GET", "path": "/drivers/live"}, None, send))
+    assert durante == [antes] and workers._estado["em_andamento"] == antes
+    assert metricas._duracao == {} and sum(metricas._requests.values()) == 1
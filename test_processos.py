@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Pools de processos dos serviços de CPU
+
+Executar: python -m pytest -q test_processos.py
+"""
+
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from app.services import processos
+
+
+def test_pool_quebrado_e_recriado():
+    pool = processos.PoolProcessos("teste", 1)
+
+    async def cenario():
+        with pytest.raises(BrokenProcessPool):
+            await pool.executar(os._exit, 1)  # processo filho morre
+        return await pool.executar(pow, 2, 10)
+
+    try:
+        assert asyncio.run(cenario()) == 1024
+        assert pool.recriacoes == 1
+        assert pool.executar_sync(pow, 3, 2) == 9
+    finally:
+        pool.encerrar()
+
+
+def test_workers_padrao_divide_as_cpus_entre_os_workers(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(processos, "WEB_CONCURRENCY", 4)
+    assert processos.workers_padrao() == 2 and processos.workers_padrao(0.5) == 1
+    monkeypatch.setattr(processos, "WEB_CONCURRENCY", 16)
+    assert processos.workers_padrao() == 1
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Sequenciamento de paradas (POST /routes/optimize)
+
+Executar: python -m pytest -q test_rotas.py
+"""
+
+import random
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from app.services import rotas
+from main import app
+
+
+def _matriz(pontos: list[tuple[float, float]]) -> list[list[float]]:
+    return [[((xa - xb) ** 2 + (ya - yb) ** 2) ** 0.5 for xb, yb in pontos] for xa, ya in pontos]
+
+
+def _respeita(ordem: list[int], antes: list[list[int]]) -> bool:
+    posicao = {no: i for i, no in enumerate(ordem)}
+    return all(posicao[p] < posicao[no] for no, predecessores in enumerate(antes) for p in predecessores if no)
+
+
+def _registrar(client, email: str, cpf: str) -> dict:
+    r = client.post("/auth/register", json={
+        "name": "Driver", "email": email, "cpf": cpf, "phone": "(11) 90000-0000",
+        "password": "senha123", "confirm_password": "senha123",
+    })
+    assert r.status_code == 200, r.text
+    r = client.post("/auth/login", json={"email": email, "password": "senha123"})
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_entrega_mais_proxima_espera_a_coleta():
+    # Origem em 0; a entrega (nó 1) está ao lado, a coleta (nó 2) longe
+    matriz = _matriz([(0, 0), (1, 0), (5, 0)])
+    resultado = rotas.sequenciar(matriz, [[], [2], []], 1.0)
+    assert resultado["ordem"] == [2, 1]
+
+
+def test_restricoes_valem_depois_das_melhorias():
+    sorteio = random.Random(7)
+    pontos = [(0.0, 0.0)] + [(sorteio.random(), sorteio.random()) for _ in range(40)]
+    # Pares coleta (ímpar) -> entrega (par seguinte)
+    antes = [[]] + [[no - 1] if no % 2 == 0 else [] for no in range(1, len(pontos))]
+    resultado = rotas.sequenciar(_matriz(pontos), antes, 1.0)
+    assert sorted(resultado["ordem"]) == list(range(1, len(pontos)))
+    assert _respeita([0] + resultado["ordem"], antes)
+    assert resultado["final"] <= resultado["inicial"]
+
+
+def test_orcamento_de_tempo_interrompe_as_melhorias():
+    sorteio = random.Random(3)
+    pontos = [(sorteio.random(), sorteio.random()) for _ in range(rotas.ROTAS_MAX_PARADAS + 1)]
+    matriz, antes = _matriz(pontos), [[] for _ in pontos]
+
+    assert rotas.sequenciar(matriz, antes, 0)["melhorias"] == 0
+    inicio = time.perf_counter()
+    resultado = rotas.sequenciar(matriz, antes, 0.02)
+    # Um passo de 2-opt/Or-opt em curso pode passar um pouco do prazo, não muito
+    assert time.perf_counter() - inicio < 0.5
+    assert sorted(resultado["ordem"]) == list(range(1, len(pontos)))
+
+
+def test_after_invalido_ou_parada_repetida_e_recusado():
+    with pytest.raises(rotas.RotaInvalida):
+        rotas._restricoes([{"id": "a", "after": "b"}])
+    with pytest.raises(rotas.RotaInvalida):
+        rotas._restricoes([{"id": "a", "after": "a"}])
+    with pytest.raises(rotas.RotaInvalida):
+        rotas._restricoes([{"id": "a", "after": None}, {"id": "a", "after": None}])
+    assert rotas._restricoes([{"id": "a", "after": "b"}, {"id": "b", "after": None}]) == [[], [2], []]
+
+
+def test_rota_otimizada_pela_api(client, monkeypatch):
+    headers = _registrar(client, "rotas@test.com", "900.000.002-01")
+    paradas = [
+        {"id": "dropoff-1", "lat": -23.5001, "lon": -46.6, "after": "pickup-1"},
+        {"id": "pickup-1", "lat": -23.55, "lon": -46.6},
+    ]
+    r = client.post("/routes/optimize", json={"start": {"lat": -23.5, "lon": -46.6}, "stops": paradas},
+                    headers=headers)
+    assert r.status_code == 200, r.text
+    assert [parada["id"] for parada in r.json()["stops"]] == ["pickup-1", "dropoff-1"]
+
+    r = client.post("/routes/optimize", json={"stops": [{**paradas[0], "after": "outra"}]}, headers=headers)
+    assert r.status_code == 422, r.text
+
+    # time_budget_ms acima do teto é limitado a ROTAS_ORCAMENTO_MAX_MS
+    orcamentos = []
+
+    async def otimizar(origem, paradas, orcamento_ms):
+        orcamentos.append(orcamento_ms)
+        return {"stops": [], "total_distance_m": 0, "initial_distance_m": 0, "improvements": 0, "seconds": 0}
+
+    monkeypatch.setattr(rotas, "otimizar", otimizar)
+    r = client.post("/routes/optimize", json={"stops": paradas, "time_budget_ms": 10**9}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert orcamentos == [rotas.ROTAS_ORCAMENTO_MAX_MS]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Fila das assinaturas de /drivers/live (coalescência e descarte)
+
+Executar: python -m pytest -q test_transmissao.py
+"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from app.services import transmissao
+
+
+def _posicao(driver_id: int, lat: float, lon: float = -46.6):
+    return SimpleNamespace(driver_id=driver_id, lat=lat, lon=lon, vehicle_type="moto", updated_at=datetime.utcnow())
+
+
+@pytest.fixture
+def transmissor(monkeypatch):
+    transmissor = transmissao.Transmissor()
+    monkeypatch.setattr(transmissao, "_estatisticas", dict.fromkeys(transmissao._estatisticas, 0))
+    return transmissor
+
+
+def test_posicoes_do_mesmo_driver_sao_coalescidas(transmissor):
+    assinatura = transmissor.assinar(drivers=frozenset({1, 2}))
+    transmissor.publicar(_posicao(1, -23.50), None)
+    transmissor.publicar(_posicao(2, -23.51), None)
+    transmissor.publicar(_posicao(1, -23.52), (-23.50, -46.6))
+    # Um evento por driver, com a posição mais nova, no fim da fila
+    assert list(assinatura.fila) == [2, 1]
+    assert assinatura.fila[1].dados["lat"] == -23.52
+    assert transmissao._estatisticas["coalescidos"] == 1
+
+
+def test_fila_cheia_descarta_o_driver_pendente_ha_mais_tempo(transmissor, monkeypatch):
+    monkeypatch.setattr(transmissao, "LIVE_FILA", 2)
+    assinatura = transmissor.assinar(bbox=(-23.6, -46.7, -23.4, -46.5))
+    for driver_id in (1, 2, 3):
+        transmissor.publicar(_posicao(driver_id, -23.5), None)
+    assert list(assinatura.fila) == [2, 3]
+    assert transmissao._estatisticas["descartados"] == 1
+
+
+def test_driver_que_sai_do_retangulo_gera_leave(transmissor):
+    assinatura = transmissor.assinar(bbox=(-23.6, -46.7, -23.4, -46.5))
+    transmissor.publicar(_posicao(1, -23.5), None)
+    assinatura.fila.clear()
+    transmissor.publicar(_posicao(1, -23.3), (-23.5, -46.6))
+    assert [evento.tipo for evento in assinatura.fila.values()] == ["leave"]
+    transmissor.cancelar(assinatura)
+    assert transmissor.conexoes == 0 and not transmissor._por_celula
+
+
+def test_proximos_acorda_na_entrega_ou_no_keepalive(transmissor):
+    assinatura = transmissor.assinar(drivers=frozenset({1}))
+
+    async def cenario():
+        assert await assinatura.proximos(0.01) == []
+        espera = asyncio.ensure_future(assinatura.proximos(5))
+        await asyncio.sleep(0)
+        transmissor.publicar(_posicao(1, -23.5), None)
+        return await asyncio.wait_for(espera, 1)
+
+    [evento] = asyncio.run(cenario())
+    assert evento.bytes().startswith(b"event: position\ndata: ")
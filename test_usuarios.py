@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+TMAX Backend - Listagem de usuários (lista + cursor no cabeçalho X-Next-Cursor)
+
+Executar: python -m pytest -q test_usuarios.py
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_cursor_percorre_todas_as_paginas(client):
+    criados = []
+    for n in range(5):
+        r = client.post("/usuarios/", json={"nome": f"U{n}", "email": f"pagina{n}@test.com", "senha": "s"})
+        assert r.status_code == 200, r.text
+        criados.append(r.json()["id"])
+
+    vistos, cursor = [], None
+    while True:
+        r = client.get("/usuarios/", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200, r.text
+        assert isinstance(r.json(), list) and len(r.json()) <= 2
+        vistos += [u["id"] for u in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert vistos == sorted(set(vistos)) and set(criados) <= set(vistos)
+
+    # Parâmetro antigo continua funcionando na primeira página
+    r = client.get("/usuarios/", params={"skip": 1, "limit": 1})
+    assert [u["id"] for u in r.json()] == vistos[1:2]
+
+
+def test_cursor_invalido_e_400(client):
+    for cursor in ("nao-e-base64!", "eyJ4IjogMX0"):
+        r = client.get("/usuarios/", params={"cursor": cursor})
+        assert r.status_code == 400 and r.json()["detail"] == "Cursor inválido"